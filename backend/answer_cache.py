@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Semantic Answer Cache
+======================
+Serves repeated and near-duplicate questions without retrieval or LLM calls.
+
+Entries are keyed on the (masked) query embedding. A lookup is one
+matrix-vector product against all cached query vectors; the best match is
+a hit if its cosine similarity clears the threshold. Entries expire after
+a TTL, the cache is LRU-bounded, and everything is dropped when the
+knowledge-base version changes.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from itertools import count
+
+import numpy as np
+
+from dotenv import load_dotenv
+load_dotenv()
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.93"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+
+
+class SemanticAnswerCache:
+    """Thread-safe LRU + TTL cache of answers keyed by query embedding similarity."""
+
+    def __init__(self, similarity_threshold: float = ANSWER_CACHE_THRESHOLD,
+                 ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+                 max_entries: int = ANSWER_CACHE_MAX_ENTRIES, kb_version: str = ""):
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.kb_version = kb_version
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (vector, value, expires_at), oldest first
+        self._keys = count()
+        self._matrix = None  # Stacked vectors of _entries, rebuilt lazily
+        self._matrix_keys = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def set_kb_version(self, kb_version: str):
+        """Invalidate everything if the knowledge base changed."""
+        with self._lock:
+            if kb_version != self.kb_version:
+                self.kb_version = kb_version
+                self._clear()
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def get(self, query_vector) -> dict | None:
+        """Return a copy of the cached answer for the most similar query, or None."""
+        vector = self._normalize(query_vector)
+        with self._lock:
+            if not self._entries:
+                self.misses += 1
+                return None
+
+            if self._matrix is None:
+                self._matrix_keys = list(self._entries)
+                self._matrix = np.stack([self._entries[key][0] for key in self._matrix_keys])
+
+            similarities = self._matrix @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                self.misses += 1
+                return None
+
+            key = self._matrix_keys[best]
+            if self._entries[key][2] <= time.monotonic():
+                # Expired entries are dropped lazily here and swept on put
+                del self._entries[key]
+                self._matrix = None
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(self._entries[key][1])
+
+    def put(self, query_vector, value: dict):
+        """Cache an answer for a query embedding."""
+        vector = self._normalize(query_vector)
+        with self._lock:
+            self._evict_expired(time.monotonic())
+            self._entries[next(self._keys)] = (vector, dict(value), time.monotonic() + self.ttl_seconds)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def _clear(self):
+        self._entries.clear()
+        self._matrix = None
+
+    def _evict_expired(self, now: float):
+        expired = [key for key, (_, _, expires_at) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
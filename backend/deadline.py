@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Request Deadlines
+==================
+End-to-end latency budget for a chat request.
+
+The chat endpoint starts a `Deadline` when the request arrives and passes
+it down through retrieval, reranking and answering. Each stage asks how
+much time is left and either fits into it (LLM calls get the remainder as
+their timeout), skips optional work, or degrades to a cheaper answer.
+"""
+
+import os
+import time
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Default end-to-end budget for /api/chat, and the largest budget a request may ask for
+CHAT_LATENCY_BUDGET_MS = float(os.getenv("CHAT_LATENCY_BUDGET_MS", "8000"))
+CHAT_MAX_LATENCY_BUDGET_MS = float(os.getenv("CHAT_MAX_LATENCY_BUDGET_MS", "30000"))
+
+
+class DeadlineExceeded(TimeoutError):
+    """A stage ran out of request budget. Not a provider failure."""
+
+
+class Deadline:
+    """A point in time a request must finish by. `Deadline(None)` never expires."""
+
+    def __init__(self, budget_ms: float | None, clock=time.monotonic):
+        self.clock = clock
+        self.budget_ms = budget_ms
+        self.started_at = clock()
+        self.expires_at = None if budget_ms is None else self.started_at + budget_ms / 1000
+
+    @classmethod
+    def for_request(cls, requested_ms: float | None = None) -> "Deadline":
+        """Deadline for a chat request: the configured budget, or the caller's, capped at the maximum."""
+        budget_ms = CHAT_LATENCY_BUDGET_MS if requested_ms is None else requested_ms
+        return cls(max(0.0, min(budget_ms, CHAT_MAX_LATENCY_BUDGET_MS)))
+
+    @property
+    def bounded(self) -> bool:
+        return self.expires_at is not None
+
+    def remaining(self) -> float:
+        """Seconds left (infinite for an unbounded deadline, never negative)."""
+        if self.expires_at is None:
+            return float("inf")
+        return max(0.0, self.expires_at - self.clock())
+
+    def remaining_ms(self) -> float:
+        return self.remaining() * 1000
+
+    def elapsed_ms(self) -> float:
+        return (self.clock() - self.started_at) * 1000
+
+    def timeout(self, reserve_ms: float = 0) -> float | None:
+        """Timeout for a call that must leave `reserve_ms` for later stages, or None if unbounded."""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.remaining() - reserve_ms / 1000)
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Embedding Micro-Batcher
+========================
+Shares one batched `encode` call between concurrent query embeddings.
+
+Under load every chat request embeds its own query, so the MiniLM model
+runs many batch-size-1 forward passes. `MicroBatchingEmbeddings` queues
+query embedding requests, embeds them together in one call and resolves
+each caller's future. Requests queued while the previous batch was
+encoding join the next one without any wait. The batch window is only
+spent under load, when queries arrive closer together than the window;
+a lone query at low load is embedded immediately. Parts of a profiled
+request encode on their own thread instead, so the profile includes it.
+
+After `close()` new queries are refused with a RuntimeError, and callers
+wait at most `EMBED_QUERY_TIMEOUT_S` for their vector, so nothing hangs
+on a batcher that is shutting down.
+"""
+
+import os
+import asyncio
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, InvalidStateError
+
+from langchain_core.embeddings import Embeddings
+
+from backend.profiling import profiling_active
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# How long the first request in a batch waits for company under load, and the batch cap
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "3"))
+EMBED_MAX_BATCH_SIZE = int(os.getenv("EMBED_MAX_BATCH_SIZE", "32"))
+EMBED_QUERY_TIMEOUT_S = float(os.getenv("EMBED_QUERY_TIMEOUT_S", "30"))
+# Recently embedded queries are remembered, so a request that embeds its query
+# for the answer cache and again for dense retrieval encodes it once
+RECENT_QUERY_CACHE_SIZE = 256
+
+_STOP = object()
+
+
+def _resolve(future: Future, result=None, error: Exception | None = None):
+    """Complete a caller's future unless the caller already gave up on it (timed out and cancelled)."""
+    try:
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        pass
+
+
+class MicroBatchingEmbeddings(Embeddings):
+    """
+    Wraps an Embeddings model and micro-batches `embed_query` calls.
+
+    Document embedding (index builds) is delegated directly. Batches are
+    embedded with the wrapped model's `embed_documents`, which for
+    sentence-transformers models is the same encode call as `embed_query`.
+    """
+
+    def __init__(self, embeddings: Embeddings, batch_window_ms: float = EMBED_BATCH_WINDOW_MS,
+                 max_batch_size: int = EMBED_MAX_BATCH_SIZE, timeout: float = EMBED_QUERY_TIMEOUT_S):
+        self.embeddings = embeddings
+        self.timeout = timeout
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch_size = max(1, max_batch_size)
+        self.batch_sizes = deque(maxlen=100)  # Recent batch sizes, for observability
+        self._recent = OrderedDict()
+        self._recent_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._closed = False
+        self._submit_lock = threading.Lock()  # Nothing is queued behind _STOP
+        self._last_arrival = float("-inf")  # Worker thread only
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        if profiling_active():
+            # The worker thread is not profiled; encode here so the profile shows it
+            return self.embeddings.embed_query(text)
+        return self.submit(text).result(timeout=self.timeout)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return await asyncio.wait_for(asyncio.wrap_future(self.submit(text)), self.timeout)
+
+    def submit(self, text: str) -> Future:
+        """Queue a query for the next batch and return a future for its vector."""
+        future = Future()
+        with self._recent_lock:
+            vector = self._recent.get(text)
+            if vector is not None:
+                self._recent.move_to_end(text)
+                future.set_result(vector)
+                return future
+        with self._submit_lock:
+            if self._closed:
+                raise RuntimeError("Embedding batcher is closed")
+            self._queue.put((text, future, time.monotonic()))
+        return future
+
+    def close(self):
+        """Stop the worker after it drains already queued requests; later queries are refused."""
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._worker.join(timeout=5)
+
+    def _collect_batch(self, first) -> tuple[list, bool]:
+        """Gather queued requests, and under load those arriving within the batch window, up to the size cap."""
+        batch = [first]
+        while len(batch) < self.max_batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        # Low load (a lone query, and the previous one arrived more than a window earlier): don't wait
+        under_load = len(batch) > 1 or first[2] - self._last_arrival < self.batch_window
+        self._last_arrival = batch[-1][2]
+        if not under_load:
+            return batch, False
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+            self._last_arrival = item[2]
+        return batch, False
+
+    def _run(self):
+        try:
+            self._serve()
+        finally:
+            self._fail_queued()
+
+    def _fail_queued(self):
+        """Resolve anything still queued when the worker exits, so no caller waits on it."""
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not _STOP:
+                _resolve(item[1], error=RuntimeError("Embedding batcher is closed"))
+
+    def _serve(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+            batch, stopping = self._collect_batch(first)
+
+            # Identical queries in the same window are embedded once
+            unique_texts = list(dict.fromkeys(text for text, _, _ in batch))
+            try:
+                vectors = dict(zip(unique_texts, self.embeddings.embed_documents(unique_texts)))
+            except Exception as e:
+                for _, future, _ in batch:
+                    _resolve(future, error=e)
+                continue
+
+            self.batch_sizes.append(len(batch))
+            with self._recent_lock:
+                self._recent.update(vectors)
+                while len(self._recent) > RECENT_QUERY_CACHE_SIZE:
+                    self._recent.popitem(last=False)
+            for text, future, _ in batch:
+                _resolve(future, vectors[text])
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Hybrid Fusion
+==============
+Concurrent dense + sparse retrieval fused with weighted reciprocal rank fusion.
+
+LangChain's EnsembleRetriever runs its retrievers one after the other and
+dedups by comparing page_content strings. `ParallelHybridRetriever` runs
+both legs at the same time on a thread pool (so hybrid latency approaches
+max(dense, sparse) instead of the sum) and fuses by chunk `id` with a
+vectorized RRF.
+"""
+
+import asyncio
+import contextvars
+from typing import Any, Optional
+
+import numpy as np
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from backend.metrics import observe_stage
+from backend.profiling import profile_leg
+
+RRF_C = 60  # Same smoothing constant as EnsembleRetriever
+
+
+def reciprocal_rank_fusion(
+    result_lists: list[list[Document]],
+    weights: list[float],
+    c: int = RRF_C,
+    id_key: str = "id"
+) -> list[Document]:
+    """
+    Fuse ranked lists with weighted RRF: score(d) = sum_i w_i / (c + rank_i(d)).
+
+    Documents are deduplicated by `metadata[id_key]`. Returned documents are
+    copies carrying the merged metadata of every list they appeared in plus
+    `fusion_score`, ordered best first (ties keep first-seen order).
+    """
+    if len(result_lists) != len(weights):
+        raise ValueError("Number of result lists must match number of weights")
+
+    slot_of: dict[str, int] = {}
+    merged_docs: list[Document] = []
+    slots, contributions = [], []
+
+    for docs, weight in zip(result_lists, weights):
+        if not docs:
+            continue
+        list_slots = np.empty(len(docs), dtype=np.int64)
+        for rank, doc in enumerate(docs):
+            doc_id = doc.metadata[id_key]
+            slot = slot_of.get(doc_id)
+            if slot is None:
+                slot = slot_of[doc_id] = len(merged_docs)
+                merged_docs.append(Document(page_content=doc.page_content, metadata=dict(doc.metadata)))
+            else:
+                merged_docs[slot].metadata.update(doc.metadata)
+            list_slots[rank] = slot
+        slots.append(list_slots)
+        contributions.append(weight / (c + np.arange(1, len(docs) + 1, dtype=np.float64)))
+
+    if not merged_docs:
+        return []
+
+    scores = np.bincount(np.concatenate(slots), weights=np.concatenate(contributions), minlength=len(merged_docs))
+    order = np.argsort(-scores, kind="stable")
+    fused = []
+    for slot in order:
+        doc = merged_docs[slot]
+        doc.metadata["fusion_score"] = float(scores[slot])
+        fused.append(doc)
+    return fused
+
+
+class ParallelHybridRetriever(BaseRetriever):
+    """Run several retrievers concurrently and fuse their results with weighted RRF."""
+
+    retrievers: list[Any]
+    weights: list[float]
+    c: int = RRF_C
+    executor: Optional[Any] = None  # concurrent.futures.Executor; a private pool is used if None
+    leg_stages: Optional[list[str]] = None  # Metrics stage name per retriever, e.g. ["dense_retrieval", "sparse_retrieval"]
+
+    def _run_leg(self, index: int, query: str) -> list[Document]:
+        if self.leg_stages is None:
+            return self.retrievers[index].invoke(query)
+        with observe_stage(self.leg_stages[index]):
+            return self.retrievers[index].invoke(query)
+
+    def _fuse(self, results: list[list[Document]]) -> list[Document]:
+        with observe_stage("fusion"):
+            return reciprocal_rank_fusion(results, self.weights, c=self.c)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        legs = range(len(self.retrievers))
+        if self.executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=len(self.retrievers)) as pool:
+                futures = [pool.submit(contextvars.copy_context().run, profile_leg, self._run_leg, i, query) for i in legs]
+                results = [future.result() for future in futures]
+        else:
+            # Each leg runs in a copy of the caller's context so request tracing and profiling follow it
+            futures = [self.executor.submit(contextvars.copy_context().run, profile_leg, self._run_leg, i, query) for i in legs]
+            results = [future.result() for future in futures]
+        return self._fuse(results)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> list[Document]:
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*[
+            loop.run_in_executor(self.executor, contextvars.copy_context().run, profile_leg, self._run_leg, i, query)
+            for i in range(len(self.retrievers))
+        ])
+        return self._fuse(list(results))
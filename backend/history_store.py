@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Chat History Store
+===================
+Per-session chat history, selected with `CHAT_HISTORY_BACKEND`:
+
+- `sqlite` (default): one row per message, keyed (session_id, seq) in a
+  clustered `WITHOUT ROWID` table, so appending to or reading a session
+  touches only that session's rows, never the rest of the history. WAL
+  mode with `synchronous=NORMAL`: commits only write to the WAL, and a
+  background thread checkpoints every `CHAT_HISTORY_SYNC_INTERVAL_MS`,
+  syncing all commits since the last checkpoint with one fsync (fsync
+  batching; an app crash loses nothing, a power loss at most that
+  interval). The same thread compacts the file when replaced histories
+  leave more than `CHAT_HISTORY_COMPACT_RATIO` of its pages free.
+  Sessions from the legacy `data/chat_history.json` are imported once.
+- `json`: the original single JSON file, rewritten on every save.
+"""
+
+import os
+import json
+import sqlite3
+import threading
+from pathlib import Path
+
+from dotenv import load_dotenv
+load_dotenv()
+
+PROJECT_ROOT = Path(__file__).parent.parent
+CHAT_HISTORY_BACKEND = os.getenv("CHAT_HISTORY_BACKEND", "sqlite")
+CHAT_HISTORY_DB_PATH = Path(os.getenv("CHAT_HISTORY_DB_PATH", str(PROJECT_ROOT / "data" / "chat_history.sqlite")))
+CHAT_HISTORY_JSON_PATH = PROJECT_ROOT / "data" / "chat_history.json"
+CHAT_HISTORY_SYNC_INTERVAL_MS = float(os.getenv("CHAT_HISTORY_SYNC_INTERVAL_MS", "1000"))
+CHAT_HISTORY_COMPACT_RATIO = float(os.getenv("CHAT_HISTORY_COMPACT_RATIO", "0.25"))
+
+MESSAGE_FIELDS = ("role", "content", "timestamp")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_messages (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS chat_history_meta (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class ChatHistoryStore:
+    """Interface for chat history storage. Messages are dicts with MESSAGE_FIELDS."""
+    name = "base"
+
+    def get(self, session_id: str) -> list[dict]:
+        raise NotImplementedError
+
+    def append(self, session_id: str, messages: list[dict]) -> int:
+        """Add messages to the end of a session. Returns the session's message count."""
+        raise NotImplementedError
+
+    def replace(self, session_id: str, messages: list[dict]):
+        """Replace a session's whole history."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class JsonChatHistoryStore(ChatHistoryStore):
+    """All sessions in one JSON object (the original storage)."""
+    name = "json"
+
+    def __init__(self, path: Path = CHAT_HISTORY_JSON_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict:
+        try:
+            return json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, history: dict):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps(history, indent=2), encoding="utf-8")
+
+    def get(self, session_id: str) -> list[dict]:
+        return self._load().get(session_id, [])
+
+    def append(self, session_id: str, messages: list[dict]) -> int:
+        with self._lock:
+            history = self._load()
+            session = history.setdefault(session_id, [])
+            session.extend(messages)
+            self._save(history)
+            return len(session)
+
+    def replace(self, session_id: str, messages: list[dict]):
+        with self._lock:
+            history = self._load()
+            history[session_id] = list(messages)
+            self._save(history)
+
+
+class SqliteChatHistoryStore(ChatHistoryStore):
+    """Messages in SQLite, clustered by session, safe for concurrent threads and processes."""
+    name = "sqlite"
+
+    def __init__(self, path: Path = CHAT_HISTORY_DB_PATH, legacy_json: Path | None = CHAT_HISTORY_JSON_PATH,
+                 sync_interval_ms: float = CHAT_HISTORY_SYNC_INTERVAL_MS,
+                 compact_ratio: float = CHAT_HISTORY_COMPACT_RATIO):
+        self.path = Path(path)
+        self.compact_ratio = compact_ratio
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection().executescript(SCHEMA)
+        if legacy_json is not None:
+            self.migrate_json(Path(legacy_json))
+        self._stop = threading.Event()
+        self._maintainer = None
+        if sync_interval_ms > 0:
+            self._maintainer = threading.Thread(target=self._maintain, args=(sync_interval_ms / 1000,),
+                                                name="chat-history-sync", daemon=True)
+            self._maintainer.start()
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared across threads; keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")  # Only takes effect on a new database, before WAL
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # No fsync per commit; see sync()
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _write(self, statements):
+        """Run `statements(conn)` in one write transaction."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = statements(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, session_id: str, messages: list[dict], first_seq: int):
+        conn.executemany(
+            "INSERT INTO chat_messages(session_id, seq, role, content, timestamp) VALUES (?, ?, ?, ?, ?)",
+            [(session_id, first_seq + i, *(message[field] for field in MESSAGE_FIELDS))
+             for i, message in enumerate(messages)]
+        )
+
+    def migrate_json(self, path: Path) -> int:
+        """Import sessions from the legacy JSON file, once per database. Returns the number imported."""
+        def migrate(conn):
+            if conn.execute("SELECT 1 FROM chat_history_meta WHERE name = 'migrated_json'").fetchone():
+                return 0
+            history = json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+            for session_id, messages in history.items():
+                conn.execute("DELETE FROM chat_messages WHERE session_id = ?", (session_id,))
+                self._insert(conn, session_id, messages, 0)
+            conn.execute("INSERT INTO chat_history_meta(name, value) VALUES ('migrated_json', ?)", (str(path),))
+            return len(history)
+
+        imported = self._write(migrate)
+        if imported:
+            print(f"Migrated {imported} chat sessions from {path} to {self.path}")
+        return imported
+
+    def get(self, session_id: str) -> list[dict]:
+        rows = self._connection().execute(
+            "SELECT role, content, timestamp FROM chat_messages WHERE session_id = ? ORDER BY seq", (session_id,)
+        )
+        return [dict(row) for row in rows]
+
+    def append(self, session_id: str, messages: list[dict]) -> int:
+        def append(conn):
+            next_seq = conn.execute(
+                "SELECT COALESCE(MAX(seq) + 1, 0) FROM chat_messages WHERE session_id = ?", (session_id,)
+            ).fetchone()[0]
+            self._insert(conn, session_id, messages, next_seq)
+            return next_seq + len(messages)
+
+        return self._write(append)
+
+    def replace(self, session_id: str, messages: list[dict]):
+        def replace(conn):
+            conn.execute("DELETE FROM chat_messages WHERE session_id = ?", (session_id,))
+            self._insert(conn, session_id, messages, 0)
+
+        self._write(replace)
+
+    def sync(self):
+        """Checkpoint the WAL: one fsync makes every commit since the last checkpoint durable."""
+        self._connection().execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def compact(self, force: bool = False) -> bool:
+        """Return free pages (left by replaced histories) to the filesystem once they pass the ratio."""
+        conn = self._connection()
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        total = conn.execute("PRAGMA page_count").fetchone()[0]
+        if not free or (not force and free < total * self.compact_ratio):
+            return False
+        conn.executescript("PRAGMA incremental_vacuum;")  # execute() would step it (free) only one page
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return True
+
+    def _maintain(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.sync()
+                self.compact()
+            except sqlite3.Error as e:
+                print(f"Chat history sync failed: {e}")
+
+    def close(self):
+        """Stop the sync thread, make everything durable and close all connections."""
+        self._stop.set()
+        if self._maintainer is not None:
+            self._maintainer.join()
+        self.sync()
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+
+def get_chat_history_store(name: str | None = None) -> ChatHistoryStore:
+    """Build the configured chat history store (`sqlite` or `json`)."""
+    name = name or CHAT_HISTORY_BACKEND
+    if name == "sqlite":
+        return SqliteChatHistoryStore(CHAT_HISTORY_DB_PATH, legacy_json=CHAT_HISTORY_JSON_PATH)
+    if name == "json":
+        return JsonChatHistoryStore(CHAT_HISTORY_JSON_PATH)
+    raise ValueError(f"Unknown chat history backend: {name}")
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+LLM HTTP Clients
+=================
+Shared, pooled HTTP clients for the Groq and OpenAI chat models.
+
+One `httpx.Client` (sync path) and one `httpx.AsyncClient` (async and
+streaming paths) are created per process and handed to both providers,
+so TLS connections are kept alive and reused across requests instead of
+being renegotiated. Both clients share the same configuration:
+
+- connection pool limits and keep-alive expiry,
+- connect / read / write / pool timeouts,
+- retries for 429 and 5xx responses and failed connects, with capped
+  exponential backoff and full jitter (honouring `Retry-After`).
+
+The SDKs' own retries are switched off so there is a single retry policy.
+Inside `call_deadline(timeout)` (set by `LLMClient` for a call with a
+budget) the retries share that budget: each attempt's timeouts are capped
+at the time left, and a retry whose backoff would overrun it is not made.
+With `LLM_TRANSPORT_MODE=record|replay` the retrying transport is wrapped
+by the cassette transport from `llm_cassette`.
+"""
+
+import os
+import asyncio
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import httpx
+
+from backend.llm_cassette import (
+    Cassette, RecordReplayTransport, AsyncRecordReplayTransport, LLM_TRANSPORT_MODE, TRANSPORT_MODES,
+)
+
+from dotenv import load_dotenv
+load_dotenv()
+
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "50"))
+LLM_HTTP_MAX_KEEPALIVE = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "20"))
+LLM_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "120"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "3"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "30"))
+LLM_WRITE_TIMEOUT = float(os.getenv("LLM_WRITE_TIMEOUT", "10"))
+LLM_POOL_TIMEOUT = float(os.getenv("LLM_POOL_TIMEOUT", "2"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_MS = float(os.getenv("LLM_RETRY_BASE_MS", "250"))
+LLM_RETRY_MAX_MS = float(os.getenv("LLM_RETRY_MAX_MS", "2000"))
+
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+# Failures where the request never reached the server, so retrying is always safe
+RETRY_EXCEPTIONS = (httpx.ConnectError, httpx.ConnectTimeout)
+
+# time.monotonic() by which the LLM call in progress must finish, None when unbounded
+_call_deadline: ContextVar[float | None] = ContextVar("llm_call_deadline", default=None)
+
+
+def llm_timeout() -> httpx.Timeout:
+    return httpx.Timeout(connect=LLM_CONNECT_TIMEOUT, read=LLM_READ_TIMEOUT,
+                         write=LLM_WRITE_TIMEOUT, pool=LLM_POOL_TIMEOUT)
+
+
+def llm_limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=LLM_HTTP_MAX_CONNECTIONS,
+                        max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+                        keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY)
+
+
+@contextmanager
+def call_deadline(timeout: float | None):
+    """Bound the HTTP requests made inside the block, retries and backoff included, to `timeout` seconds."""
+    if timeout is None:
+        yield
+        return
+    token = _call_deadline.set(time.monotonic() + timeout)
+    try:
+        yield
+    finally:
+        _call_deadline.reset(token)
+
+
+def _limit_timeouts(request: httpx.Request, deadline: float | None):
+    """Cap the request's connect/read/write/pool timeouts at the time left before the deadline."""
+    if deadline is None:
+        return
+    remaining = max(deadline - time.monotonic(), 0.0)
+    timeouts = request.extensions.get("timeout", {})
+    request.extensions["timeout"] = {
+        name: remaining if timeouts.get(name) is None else min(timeouts[name], remaining)
+        for name in ("connect", "read", "write", "pool")
+    }
+
+
+def _time_for_retry(deadline: float | None, wait: float) -> bool:
+    return deadline is None or time.monotonic() + wait < deadline
+
+
+class RetryPolicy:
+    """Which responses to retry and how long to wait before each retry."""
+
+    def __init__(self, max_retries: int = LLM_MAX_RETRIES, base_ms: float = LLM_RETRY_BASE_MS,
+                 max_ms: float = LLM_RETRY_MAX_MS, rng: random.Random | None = None):
+        self.max_retries = max_retries
+        self.base = base_ms / 1000
+        self.max = max_ms / 1000
+        self.rng = rng or random.Random()
+
+    def should_retry(self, response: httpx.Response) -> bool:
+        return response.status_code in RETRY_STATUS_CODES
+
+    def backoff(self, attempt: int, response: httpx.Response | None = None) -> float:
+        """Seconds to wait before retry number `attempt` (0-based): Retry-After if sent, else full jitter."""
+        retry_after = self.retry_after(response) if response is not None else None
+        if retry_after is not None:
+            return min(retry_after, self.max)
+        return self.rng.uniform(0, min(self.max, self.base * 2 ** attempt))
+
+    @staticmethod
+    def retry_after(response: httpx.Response) -> float | None:
+        headers = response.headers
+        try:
+            if "retry-after-ms" in headers:
+                return float(headers["retry-after-ms"]) / 1000
+            if "retry-after" in headers:
+                return float(headers["retry-after"])
+        except ValueError:
+            pass  # HTTP-date form: fall back to jittered backoff
+        return None
+
+
+class RetryTransport(httpx.BaseTransport):
+    """Sync transport that retries retryable responses and failed connects."""
+
+    def __init__(self, transport: httpx.BaseTransport, policy: RetryPolicy, sleep=time.sleep):
+        self.transport = transport
+        self.policy = policy
+        self.sleep = sleep
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        deadline = _call_deadline.get()
+        for attempt in range(self.policy.max_retries + 1):
+            last_attempt = attempt == self.policy.max_retries
+            _limit_timeouts(request, deadline)
+            try:
+                response = self.transport.handle_request(request)
+            except RETRY_EXCEPTIONS:
+                if last_attempt:
+                    raise
+                wait = self.policy.backoff(attempt)
+                if not _time_for_retry(deadline, wait):
+                    raise
+                self.sleep(wait)
+                continue
+            if last_attempt or not self.policy.should_retry(response):
+                return response
+            wait = self.policy.backoff(attempt, response)
+            if not _time_for_retry(deadline, wait):
+                return response
+            response.close()
+            print(f"LLM HTTP {response.status_code} from {request.url.host}, retry {attempt + 1}")
+            self.sleep(wait)
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncRetryTransport(httpx.AsyncBaseTransport):
+    """Async twin of RetryTransport, with the same policy."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, policy: RetryPolicy, sleep=asyncio.sleep):
+        self.transport = transport
+        self.policy = policy
+        self.sleep = sleep
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        deadline = _call_deadline.get()
+        for attempt in range(self.policy.max_retries + 1):
+            last_attempt = attempt == self.policy.max_retries
+            _limit_timeouts(request, deadline)
+            try:
+                response = await self.transport.handle_async_request(request)
+            except RETRY_EXCEPTIONS:
+                if last_attempt:
+                    raise
+                wait = self.policy.backoff(attempt)
+                if not _time_for_retry(deadline, wait):
+                    raise
+                await self.sleep(wait)
+                continue
+            if last_attempt or not self.policy.should_retry(response):
+                return response
+            wait = self.policy.backoff(attempt, response)
+            if not _time_for_retry(deadline, wait):
+                return response
+            await response.aclose()
+            print(f"LLM HTTP {response.status_code} from {request.url.host}, retry {attempt + 1}")
+            await self.sleep(wait)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+_lock = threading.Lock()
+_sync_client = None
+_async_client = None
+_cassette = None
+
+
+def _get_cassette() -> Cassette:
+    """One cassette shared by both clients (called under _lock)."""
+    global _cassette
+    if _cassette is None:
+        _cassette = Cassette()
+        print(f"LLM transport {LLM_TRANSPORT_MODE}: {_cassette.path} ({len(_cassette)} recorded calls)")
+    return _cassette
+
+
+def transport_mode() -> str:
+    if LLM_TRANSPORT_MODE not in TRANSPORT_MODES:
+        raise ValueError(f"LLM_TRANSPORT_MODE must be one of {', '.join(TRANSPORT_MODES)}, got {LLM_TRANSPORT_MODE!r}")
+    return LLM_TRANSPORT_MODE
+
+
+def get_http_client() -> httpx.Client:
+    """The process-wide pooled client for sync LLM calls."""
+    global _sync_client
+    with _lock:
+        if _sync_client is None:
+            transport = RetryTransport(httpx.HTTPTransport(limits=llm_limits()), RetryPolicy())
+            if transport_mode() != "off":
+                transport = RecordReplayTransport(transport, _get_cassette(), transport_mode())
+            _sync_client = httpx.Client(transport=transport, timeout=llm_timeout())
+        return _sync_client
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """The process-wide pooled client for async and streaming LLM calls."""
+    global _async_client
+    with _lock:
+        if _async_client is None:
+            transport = AsyncRetryTransport(httpx.AsyncHTTPTransport(limits=llm_limits()), RetryPolicy())
+            if transport_mode() != "off":
+                transport = AsyncRecordReplayTransport(transport, _get_cassette(), transport_mode())
+            _async_client = httpx.AsyncClient(transport=transport, timeout=llm_timeout())
+        return _async_client
+
+
+async def aclose_http_clients():
+    """Close both shared clients (on app shutdown)."""
+    global _sync_client, _async_client
+    with _lock:
+        sync_client, async_client = _sync_client, _async_client
+        _sync_client = _async_client = None
+    if sync_client is not None:
+        sync_client.close()
+    if async_client is not None:
+        await async_client.aclose()
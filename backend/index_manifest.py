@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Index Manifest
+===============
+Content-addressed fingerprint of the persisted vector index.
+
+The manifest records a hash of every chunk, the embedding model and the
+chunker settings that produced `knowledge.json`. On startup the RAG engine
+compares it against the manifest stored next to `chroma_db` and only
+re-embeds the knowledge base when something actually changed.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+
+MANIFEST_FILENAME = "index_manifest.json"
+MANIFEST_VERSION = 1
+
+# Chunk fields that influence what gets embedded or returned as metadata
+HASHED_CHUNK_FIELDS = ("id", "source_url", "category", "title", "content")
+
+
+def _sha256(payload) -> str:
+    """Stable SHA-256 of a JSON-serializable payload."""
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def hash_chunks(chunks: list[dict]) -> str:
+    """Hash the embedded content of all chunks, in order."""
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        fields = {field: chunk.get(field) for field in HASHED_CHUNK_FIELDS}
+        digest.update(json.dumps(fields, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def build_manifest(
+    chunks: list[dict],
+    embedding_model: str,
+    chunker_settings: dict | None = None,
+    collection_name: str = "company_knowledge"
+) -> dict:
+    """
+    Build the manifest describing an index built from `chunks`.
+
+    Args:
+        chunks: Knowledge base chunks as stored in knowledge.json
+        embedding_model: Name of the embedding model used for the index
+        chunker_settings: Settings the scraper used to chunk the pages
+        collection_name: Vector store collection the chunks live in
+
+    Returns:
+        Manifest dict with a combined `fingerprint`
+    """
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "collection_name": collection_name,
+        "embedding_model": embedding_model,
+        "chunker": chunker_settings or {},
+        "content_hash": hash_chunks(chunks),
+        "total_chunks": len(chunks),
+    }
+    manifest["fingerprint"] = _sha256(manifest)
+    return manifest
+
+
+def load_manifest(persist_dir: Path) -> dict | None:
+    """Load the stored manifest, or None if missing/corrupt."""
+    manifest_path = Path(persist_dir) / MANIFEST_FILENAME
+    if not manifest_path.exists():
+        return None
+    try:
+        return json.loads(manifest_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def save_manifest(persist_dir: Path, manifest: dict):
+    """Write the manifest atomically so a crash never leaves a half-written file."""
+    persist_dir = Path(persist_dir)
+    persist_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = persist_dir / MANIFEST_FILENAME
+    tmp_path = manifest_path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    tmp_path.replace(manifest_path)
+
+
+def manifest_matches(stored: dict | None, current: dict) -> bool:
+    """Check whether a stored manifest describes the same index as `current`."""
+    if not stored:
+        return False
+    return stored.get("fingerprint") == current.get("fingerprint")
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Intent Router
+==============
+Answers small talk and canned FAQ questions without retrieval or LLM calls.
+
+Each intent is a compiled, anchored regular expression over the normalized
+message, so only messages that are *entirely* a greeting or one of the
+canned FAQ questions match ("hi" does, "hi, how do R&D tax credits work?"
+does not). Anything else goes through the full RAG pipeline.
+"""
+
+import os
+import re
+
+from backend.fallback import FALLBACK_RESPONSES, SIMPLE_FAQ
+
+from dotenv import load_dotenv
+load_dotenv()
+
+COMPANY_NAME = os.getenv("COMPANY_NAME")
+INTENT_ROUTER_ENABLED = os.getenv("INTENT_ROUTER_ENABLED", "true").lower() == "true"
+# Longer messages always go to RAG, whatever they start with
+MAX_INTENT_CHARS = 80
+
+SMALL_TALK_RESPONSES = {
+    "thanks": (
+        "You're welcome! Let me know if there's anything else you'd like to know "
+        f"about {COMPANY_NAME}."
+    ),
+    "goodbye": (
+        f"Thanks for chatting with {COMPANY_NAME}. Have a great day!"
+    ),
+}
+
+# Ways users refer to the company in FAQ questions
+_COMPANY = r"(?:you|you guys|your (?:company|firm)|the (?:company|firm)"
+if COMPANY_NAME:
+    _COMPANY += "|" + re.escape(COMPANY_NAME.lower())
+_COMPANY += ")"
+
+INTENT_PATTERNS = {
+    "greeting": (
+        r"(?:hi|hii+|hello|hey|hey there|hiya|howdy|greetings|yo"
+        r"|good (?:morning|afternoon|evening))"
+        r"(?: there| team| all| everyone)?"
+    ),
+    "thanks": r"(?:thanks|thank you|thx|ty|much appreciated)(?: (?:so|very) much| a lot)?",
+    "goodbye": r"(?:bye|goodbye|bye bye|see you|see ya|have a (?:good|great|nice) day)",
+    "services": (
+        r"(?:(?:what|which) (?:services|products) (?:do|does) " + _COMPANY + r" (?:offer|provide|have)"
+        r"|what (?:are|is) (?:your|their) (?:services|offerings)"
+        r"|(?:list|show me) (?:your|the) services"
+        r"|services)"
+    ),
+    "about": (
+        r"(?:who (?:are|is) " + _COMPANY +
+        r"|what (?:is|does) " + _COMPANY + r"(?: do)?"
+        r"|tell me about " + _COMPANY + r")"
+    ),
+    "contact": (
+        r"(?:how (?:can|do) i (?:contact|reach|get in touch with) " + _COMPANY +
+        r"|(?:what is|what's) your (?:phone number|email|contact (?:info|information|details))"
+        r"|contact (?:info|information|details))"
+    ),
+}
+
+INTENT_RESPONSES = {
+    "greeting": FALLBACK_RESPONSES["greeting"],
+    "thanks": SMALL_TALK_RESPONSES["thanks"],
+    "goodbye": SMALL_TALK_RESPONSES["goodbye"],
+    "services": SIMPLE_FAQ["services"],
+    "about": SIMPLE_FAQ["about"],
+    "contact": SIMPLE_FAQ["contact"],
+}
+
+
+def normalize_message(message: str) -> str:
+    """Lowercase, collapse whitespace and drop surrounding punctuation."""
+    message = re.sub(r"\s+", " ", message.lower())
+    return message.strip(" \t\n!?.,:;)(-~*'\"")
+
+
+class IntentRouter:
+    """Matches whole messages against compiled intent patterns."""
+
+    def __init__(self, patterns: dict = INTENT_PATTERNS, responses: dict = INTENT_RESPONSES):
+        self.responses = responses
+        self.patterns = {intent: re.compile(pattern) for intent, pattern in patterns.items()}
+
+    def match(self, message: str) -> str | None:
+        """Return the intent a message is entirely made of, or None."""
+        if len(message) > MAX_INTENT_CHARS:
+            return None
+        normalized = normalize_message(message)
+        for intent, pattern in self.patterns.items():
+            if pattern.fullmatch(normalized):
+                return intent
+        return None
+
+    def route(self, message: str) -> tuple[str, str] | None:
+        """Return (intent, canned response) for a matching message, or None."""
+        intent = self.match(message)
+        if intent is None:
+            return None
+        return intent, self.responses[intent]
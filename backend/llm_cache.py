@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+LLM Call Cache
+===============
+Persistent exact-match cache for rerank and answer LLM calls.
+
+Entries are keyed on model name, temperature and a SHA-256 of the fully
+rendered prompt, and live in a SQLite database under `data/` so they are
+shared by every uvicorn worker and survive restarts. SQLite runs in WAL
+mode with a busy timeout, writes use `BEGIN IMMEDIATE`, and the cache is
+bounded by total response size with least-recently-used eviction. Hit and
+miss counters are stored in the same database.
+
+Lookups are a plain SELECT and never take the write lock. Hits, misses
+and access times are collected in memory and written with the next `put`
+(before its eviction pass), or on their own once `ACCESS_FLUSH_BATCH`
+lookups or `ACCESS_FLUSH_SECONDS` have accumulated, and on `flush()`.
+"""
+
+import os
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+load_dotenv()
+
+PROJECT_ROOT = Path(__file__).parent.parent
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_PATH = Path(os.getenv("LLM_CACHE_PATH", str(PROJECT_ROOT / "data" / "llm_cache.sqlite")))
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "256"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache(last_access);
+CREATE TABLE IF NOT EXISTS llm_cache_stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+EVICTION_BATCH = 64
+ACCESS_FLUSH_BATCH = 256
+ACCESS_FLUSH_SECONDS = 5.0
+
+
+def make_cache_key(model: str, temperature, prompt: str) -> str:
+    """Cache key for one LLM call: model, temperature and the rendered prompt."""
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    return hashlib.sha256(json.dumps([model, temperature, prompt_hash]).encode("utf-8")).hexdigest()
+
+
+class LLMCallCache:
+    """SQLite-backed LLM response cache, safe for concurrent threads and processes."""
+
+    def __init__(self, path: Path = LLM_CACHE_PATH, max_bytes: int = int(LLM_CACHE_MAX_MB * 1024 * 1024)):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        # Every thread's connection, so close() can close them all
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        # Lookups not yet written: key -> last access time, and hit / miss counts
+        self._accessed = {}
+        self._hits = 0
+        self._misses = 0
+        self._last_access_flush = time.monotonic()
+        self._access_lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared across threads; keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    @staticmethod
+    def _bump(conn: sqlite3.Connection, name: str, delta: int):
+        conn.execute(
+            "INSERT INTO llm_cache_stats(name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, delta)
+        )
+
+    def get(self, key: str) -> str | None:
+        """Return the cached response for a key, or None. Read-only; the access is recorded later."""
+        row = self._connection().execute("SELECT response FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        with self._access_lock:
+            if row is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+                self._accessed[key] = time.time()
+            due = (len(self._accessed) + self._misses >= ACCESS_FLUSH_BATCH
+                   or time.monotonic() - self._last_access_flush >= ACCESS_FLUSH_SECONDS)
+        if due:
+            self.flush()
+        return row[0] if row else None
+
+    def _write_accesses(self, conn: sqlite3.Connection):
+        """Write buffered access times and counters (inside the caller's transaction)."""
+        with self._access_lock:
+            accessed, hits, misses = self._accessed, self._hits, self._misses
+            self._accessed, self._hits, self._misses = {}, 0, 0
+            self._last_access_flush = time.monotonic()
+        if accessed:
+            conn.executemany("UPDATE llm_cache SET last_access = MAX(last_access, ?) WHERE key = ?",
+                             [(accessed_at, key) for key, accessed_at in accessed.items()])
+        if hits:
+            self._bump(conn, "hits", hits)
+        if misses:
+            self._bump(conn, "misses", misses)
+
+    def flush(self):
+        """Write buffered hits, misses and access times now."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._write_accesses(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def put(self, key: str, model: str, response: str):
+        """Store a response, evicting least recently used entries beyond the size bound."""
+        size = len(response.encode("utf-8"))
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            old = conn.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache(key, model, response, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, size, now, now)
+            )
+            self._bump(conn, "bytes", size - (old[0] if old else 0))
+            self._write_accesses(conn)  # Recent hits count for LRU before evicting
+            self._evict(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Drop least recently used entries until the total size fits (inside the caller's transaction)."""
+        total = self._stat(conn, "bytes")
+        while total > self.max_bytes:
+            victims = conn.execute(
+                "SELECT key, size FROM llm_cache ORDER BY last_access LIMIT ?", (EVICTION_BATCH,)
+            ).fetchall()
+            if not victims:
+                break
+            for key, size in victims:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                total -= size
+                self._bump(conn, "bytes", -size)
+                self._bump(conn, "evictions", 1)
+                if total <= self.max_bytes:
+                    break
+
+    @staticmethod
+    def _stat(conn: sqlite3.Connection, name: str) -> int:
+        row = conn.execute("SELECT value FROM llm_cache_stats WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def stats(self) -> dict:
+        """Hit/miss/eviction counters and current size, shared across workers."""
+        self.flush()
+        conn = self._connection()
+        counters = dict(conn.execute("SELECT name, value FROM llm_cache_stats").fetchall())
+        entries = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        return {
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "evictions": counters.get("evictions", 0),
+            "bytes": counters.get("bytes", 0),
+            "entries": entries,
+        }
+
+    def close(self):
+        """Write buffered counters and close every thread's connection (app shutdown)."""
+        self.flush()
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+LLM Record / Replay
+====================
+HTTP transports that record the Groq and OpenAI calls made by the RAG
+engine to a cassette file, and serve them back without the network.
+
+`LLM_TRANSPORT_MODE`:
+
+- `off` (default): normal network calls.
+- `record`: every LLM HTTP exchange is passed through and appended to
+  `LLM_CASSETTE_PATH` (JSONL): the request body, the response status and
+  headers, and each body chunk with its offset from the start of the
+  call, so streamed answers keep their time to first token.
+- `replay`: requests are answered from the cassette, chunk by chunk at
+  the recorded offsets multiplied by `LLM_REPLAY_LATENCY_SCALE` (1 keeps
+  the original latency, 0 replays instantly). No network and no real API
+  keys are needed. A request missing from the cassette fails with
+  `CassetteMiss`.
+
+Requests are matched on method, URL and a hash of the body (model,
+prompt, temperature, stream flag ...), not on headers. Identical requests
+recorded several times are replayed in recorded order, round robin.
+The transports sit outside the retry transport, so a recording holds the
+final response of a call and replays never sleep through retries.
+"""
+
+import os
+import asyncio
+import base64
+import hashlib
+import json
+import threading
+import time
+from pathlib import Path
+
+import httpx
+
+from dotenv import load_dotenv
+load_dotenv()
+
+PROJECT_ROOT = Path(__file__).parent.parent
+LLM_TRANSPORT_MODE = os.getenv("LLM_TRANSPORT_MODE", "off").lower()
+LLM_CASSETTE_PATH = Path(os.getenv("LLM_CASSETTE_PATH", str(PROJECT_ROOT / "data" / "llm_cassette.jsonl")))
+LLM_REPLAY_LATENCY_SCALE = float(os.getenv("LLM_REPLAY_LATENCY_SCALE", "1.0"))
+TRANSPORT_MODES = ("off", "record", "replay")
+# Response headers worth keeping; the rest (dates, request ids, cookies) only add noise
+RECORDED_HEADERS = ("content-type", "content-encoding", "retry-after", "retry-after-ms")
+
+
+class CassetteMiss(httpx.TransportError):
+    """Replay was asked for a request that was never recorded."""
+
+
+def request_key(method: str, url: str, body: bytes) -> str:
+    return hashlib.sha256(f"{method} {url}\n".encode() + body).hexdigest()
+
+
+class Cassette:
+    """Recorded LLM exchanges in a JSONL file. Thread-safe."""
+
+    def __init__(self, path: Path = LLM_CASSETTE_PATH):
+        self.path = Path(path)
+        self.entries = {}  # key -> [entries]
+        self._next = {}  # key -> index of the next entry to replay
+        self._lock = threading.Lock()
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries.setdefault(entry["key"], []).append(entry)
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self.entries.values())
+
+    def append(self, entry: dict):
+        with self._lock:
+            self.entries.setdefault(entry["key"], []).append(entry)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def next(self, request: httpx.Request) -> dict:
+        key = request_key(request.method, str(request.url), request.content)
+        with self._lock:
+            entries = self.entries.get(key)
+            if not entries:
+                raise CassetteMiss(f"No recording for {request.method} {request.url} in {self.path}", request=request)
+            index = self._next.get(key, 0)
+            self._next[key] = index + 1
+            return entries[index % len(entries)]
+
+
+def new_entry(request: httpx.Request, response: httpx.Response) -> dict:
+    body = request.content
+    try:
+        request_body = json.loads(body)
+    except ValueError:
+        request_body = body.decode("utf-8", "replace")
+    return {
+        "key": request_key(request.method, str(request.url), body),
+        "method": request.method,
+        "url": str(request.url),
+        "request": request_body,
+        "status": response.status_code,
+        "headers": {name: response.headers[name] for name in RECORDED_HEADERS if name in response.headers},
+        "chunks": [],  # [offset_ms, base64 bytes]
+    }
+
+
+def replay_response(entry: dict, stream) -> httpx.Response:
+    return httpx.Response(entry["status"], headers=entry["headers"], stream=stream)
+
+
+def chunk_schedule(entry: dict, scale: float) -> list[tuple[float, bytes]]:
+    return [(offset_ms * scale / 1000, base64.b64decode(data)) for offset_ms, data in entry["chunks"]]
+
+
+class RecordingStream(httpx.SyncByteStream):
+    """Passes a response body through, noting each chunk; saves the entry when the body is closed."""
+
+    def __init__(self, stream, entry: dict, cassette: Cassette, started: float):
+        self.stream = stream
+        self.entry = entry
+        self.cassette = cassette
+        self.started = started
+
+    def __iter__(self):
+        for chunk in self.stream:
+            self.entry["chunks"].append([round((time.perf_counter() - self.started) * 1000, 1),
+                                         base64.b64encode(chunk).decode()])
+            yield chunk
+
+    def close(self):
+        self.stream.close()
+        self.cassette.append(self.entry)
+
+
+class AsyncRecordingStream(httpx.AsyncByteStream):
+    def __init__(self, stream, entry: dict, cassette: Cassette, started: float):
+        self.stream = stream
+        self.entry = entry
+        self.cassette = cassette
+        self.started = started
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            self.entry["chunks"].append([round((time.perf_counter() - self.started) * 1000, 1),
+                                         base64.b64encode(chunk).decode()])
+            yield chunk
+
+    async def aclose(self):
+        await self.stream.aclose()
+        self.cassette.append(self.entry)
+
+
+class ReplayStream(httpx.SyncByteStream):
+    """Yields recorded chunks at their (scaled) offsets from the start of the call."""
+
+    def __init__(self, schedule: list[tuple[float, bytes]], started: float, sleep=time.sleep):
+        self.schedule = schedule
+        self.started = started
+        self.sleep = sleep
+
+    def __iter__(self):
+        for offset, chunk in self.schedule:
+            wait = offset - (time.perf_counter() - self.started)
+            if wait > 0:
+                self.sleep(wait)
+            yield chunk
+
+
+class AsyncReplayStream(httpx.AsyncByteStream):
+    def __init__(self, schedule: list[tuple[float, bytes]], started: float, sleep=asyncio.sleep):
+        self.schedule = schedule
+        self.started = started
+        self.sleep = sleep
+
+    async def __aiter__(self):
+        for offset, chunk in self.schedule:
+            wait = offset - (time.perf_counter() - self.started)
+            if wait > 0:
+                await self.sleep(wait)
+            yield chunk
+
+
+class RecordReplayTransport(httpx.BaseTransport):
+    """Sync transport recording to, or replaying from, a cassette."""
+
+    def __init__(self, transport: httpx.BaseTransport, cassette: Cassette, mode: str,
+                 latency_scale: float = LLM_REPLAY_LATENCY_SCALE, sleep=time.sleep):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown transport mode: {mode}")
+        self.transport = transport
+        self.cassette = cassette
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.sleep = sleep
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        request.read()
+        if self.mode == "replay":
+            entry = self.cassette.next(request)
+            return replay_response(entry, ReplayStream(chunk_schedule(entry, self.latency_scale), started, self.sleep))
+        response = self.transport.handle_request(request)
+        stream = RecordingStream(response.stream, new_entry(request, response), self.cassette, started)
+        return httpx.Response(response.status_code, headers=response.headers, stream=stream,
+                              extensions=response.extensions)
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncRecordReplayTransport(httpx.AsyncBaseTransport):
+    """Async twin of RecordReplayTransport."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, cassette: Cassette, mode: str,
+                 latency_scale: float = LLM_REPLAY_LATENCY_SCALE, sleep=asyncio.sleep):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown transport mode: {mode}")
+        self.transport = transport
+        self.cassette = cassette
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.sleep = sleep
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        await request.aread()
+        if self.mode == "replay":
+            entry = self.cassette.next(request)
+            stream = AsyncReplayStream(chunk_schedule(entry, self.latency_scale), started, self.sleep)
+            return replay_response(entry, stream)
+        response = await self.transport.handle_async_request(request)
+        stream = AsyncRecordingStream(response.stream, new_entry(request, response), self.cassette, started)
+        return httpx.Response(response.status_code, headers=response.headers, stream=stream,
+                              extensions=response.extensions)
+
+    async def aclose(self):
+        await self.transport.aclose()
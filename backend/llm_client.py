@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+LLM Client
+===========
+Single call path for the rerank and answer LLMs.
+
+`LLMClient` takes a fully rendered prompt string, returns plain text and
+owns the cross-cutting concerns of an LLM call (the persistent exact-match
+cache, then the provider's circuit breaker and bulkhead), so the sync,
+async and streaming paths in the RAG engine behave the same way.
+
+Calls take an optional `timeout` (seconds left in the request's budget);
+running out of it raises `DeadlineExceeded`. The timeout covers the
+whole call, including the HTTP transport's retries and backoff. For
+streams it bounds the wait for the first chunk, and a stream that times
+out is closed.
+
+Provider latency, errors and reported token usage are recorded in the
+`llm_*` metrics; cache hits are counted but never reach the provider.
+"""
+
+import asyncio
+import time
+
+from langchain_core.output_parsers import StrOutputParser
+
+from backend.llm_cache import LLMCallCache, make_cache_key
+from backend.resilience import ProviderGuard
+from backend.deadline import DeadlineExceeded
+from backend.http_clients import call_deadline
+from backend.metrics import CACHE_LOOKUPS, LLM_SECONDS, LLM_ERRORS, LLM_TOKENS
+from backend.slow_query_log import trace_llm_call
+
+
+def is_timeout_error(error: Exception) -> bool:
+    """True for asyncio/builtin timeouts and provider SDK timeouts (APITimeoutError, ReadTimeout, ...)."""
+    return isinstance(error, TimeoutError) or "timeout" in type(error).__name__.lower()
+
+
+class LLMClient:
+    """Wraps a LangChain chat model for prompt-in, text-out calls."""
+
+    def __init__(self, llm, provider: str, model: str, temperature: float = 0, cache: LLMCallCache | None = None,
+                 guard: ProviderGuard | None = None):
+        self.llm = llm
+        self.provider = provider
+        self.model = model
+        self.temperature = temperature
+        self.cache = cache
+        self.guard = guard
+        self.parser = StrOutputParser()
+
+    def check_available(self):
+        """Raise ProviderUnavailableError if the provider's circuit is open."""
+        if self.guard is not None:
+            self.guard.check()
+
+    def cache_key(self, prompt: str) -> str:
+        return make_cache_key(self.model, self.temperature, prompt)
+
+    def _cache_get(self, prompt: str) -> str | None:
+        if self.cache is None:
+            return None
+        try:
+            cached = self.cache.get(self.cache_key(prompt))
+        except Exception as e:
+            # A broken cache must never break chat
+            print(f"LLM cache read error: {e}")
+            return None
+        CACHE_LOOKUPS.inc(cache="llm", result="miss" if cached is None else "hit")
+        if cached is not None:
+            trace_llm_call(self.provider, self.model, prompt, cached=True)
+        return cached
+
+    def _cache_put(self, prompt: str, response: str):
+        if self.cache is None:
+            return
+        try:
+            self.cache.put(self.cache_key(prompt), self.model, response)
+        except Exception as e:
+            print(f"LLM cache write error: {e}")
+
+    def _record_call(self, prompt: str, started: float, usage: dict | None):
+        trace_llm_call(self.provider, self.model, prompt, usage)
+        LLM_SECONDS.observe(time.perf_counter() - started, provider=self.provider, model=self.model)
+        if usage:
+            for direction in ("input", "output"):
+                tokens = usage.get(f"{direction}_tokens") or 0
+                if tokens:
+                    LLM_TOKENS.inc(tokens, provider=self.provider, model=self.model, direction=direction)
+
+    def _record_error(self, error: Exception):
+        LLM_ERRORS.inc(provider=self.provider, error=type(error).__name__)
+
+    def _invoke_llm(self, prompt: str, timeout: float | None):
+        try:
+            if timeout is None:
+                return self.llm.invoke(prompt)
+            # Forwarded to the provider SDK as its per-request timeout; call_deadline
+            # makes the transport's retries share it instead of each getting the full timeout
+            with call_deadline(timeout):
+                return self.llm.invoke(prompt, timeout=timeout)
+        except Exception as e:
+            if timeout is not None and is_timeout_error(e):
+                raise DeadlineExceeded(f"{self.provider} call exceeded {timeout:.2f}s") from e
+            raise
+
+    async def _ainvoke_llm(self, prompt: str, timeout: float | None):
+        try:
+            if timeout is None:
+                return await self.llm.ainvoke(prompt)
+            with call_deadline(timeout):
+                return await asyncio.wait_for(self.llm.ainvoke(prompt, timeout=timeout), timeout)
+        except Exception as e:
+            if timeout is not None and is_timeout_error(e):
+                raise DeadlineExceeded(f"{self.provider} call exceeded {timeout:.2f}s") from e
+            raise
+
+    async def _astream_llm(self, prompt: str, timeout: float | None):
+        chunks = self.llm.astream(prompt)
+        try:
+            try:
+                first = await asyncio.wait_for(anext(chunks), timeout)
+            except StopAsyncIteration:
+                return
+            except TimeoutError as e:
+                raise DeadlineExceeded(f"{self.provider} sent no tokens within {timeout:.2f}s") from e
+            yield first
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            # Releases the provider's HTTP stream on a timeout, an error or an abandoned stream
+            await chunks.aclose()
+
+    def invoke(self, prompt: str, timeout: float | None = None) -> str:
+        """Call the model (or the cache) with a rendered prompt."""
+        cached = self._cache_get(prompt)
+        if cached is not None:
+            return cached
+        started = time.perf_counter()
+        try:
+            if self.guard is None:
+                message = self._invoke_llm(prompt, timeout)
+            else:
+                message = self.guard.call(self._invoke_llm, prompt, timeout)
+        except Exception as e:
+            self._record_error(e)
+            raise
+        self._record_call(prompt, started, getattr(message, "usage_metadata", None))
+        response = self.parser.invoke(message)
+        self._cache_put(prompt, response)
+        return response
+
+    async def ainvoke(self, prompt: str, timeout: float | None = None) -> str:
+        """Async variant of invoke. Cache I/O runs off the event loop."""
+        cached = await asyncio.to_thread(self._cache_get, prompt)
+        if cached is not None:
+            return cached
+        started = time.perf_counter()
+        try:
+            if self.guard is None:
+                message = await self._ainvoke_llm(prompt, timeout)
+            else:
+                message = await self.guard.acall(self._ainvoke_llm, prompt, timeout)
+        except Exception as e:
+            self._record_error(e)
+            raise
+        self._record_call(prompt, started, getattr(message, "usage_metadata", None))
+        response = self.parser.invoke(message)
+        await asyncio.to_thread(self._cache_put, prompt, response)
+        return response
+
+    async def astream(self, prompt: str, timeout: float | None = None):
+        """Stream text chunks. A cache hit is yielded as a single chunk."""
+        cached = await asyncio.to_thread(self._cache_get, prompt)
+        if cached is not None:
+            yield cached
+            return
+        chunks = []
+        usage = {"input_tokens": 0, "output_tokens": 0}
+        started = time.perf_counter()
+        if self.guard is None:
+            stream = self._astream_llm(prompt, timeout)
+        else:
+            stream = self.guard.astream(self._astream_llm, prompt, timeout)
+        try:
+            async for chunk in stream:
+                # Providers report usage on one (usually the last) chunk
+                for direction, tokens in (getattr(chunk, "usage_metadata", None) or {}).items():
+                    if direction in usage:
+                        usage[direction] += tokens or 0
+                text = self.parser.invoke(chunk)
+                if text:
+                    chunks.append(text)
+                    yield text
+        except Exception as e:
+            self._record_error(e)
+            raise
+        finally:
+            await stream.aclose()
+        self._record_call(prompt, started, usage)
+        await asyncio.to_thread(self._cache_put, prompt, "".join(chunks))
@@ -1,13 +1,20 @@
 import os
+import asyncio
 from pathlib import Path
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import uvicorn
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 
-from backend.rag import RAGEngine
+from backend.rag import RAGEngine, RAG_BACKGROUND_WARMUP
+from backend.http_clients import aclose_http_clients
+from backend.metrics import REGISTRY, CONTENT_TYPE
+from backend.slow_query_log import SlowQueryLog, SLOW_QUERY_LOG_ENABLED
+from backend.user_store import get_user_repository
+from backend.history_store import get_chat_history_store
+from backend.write_behind import WriteBehindWriter
 from backend.routers.chat import router as chat_router
 from backend.routers.onboard import router as onboard_router
 from dotenv import load_dotenv
@@ -25,15 +32,36 @@ app = FastAPI()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Initialize RAG engine on startup."""
+    """Initialize RAG engine on startup. Models and indexes load in the background unless disabled."""
     print("Initializing RAG engine...")
     rag_engine = RAGEngine(KNOWLEDGE_FILE, CHROMA_DIR)
-    rag_engine.initialize()
     app.state.rag_engine = rag_engine
+    app.state.slow_query_log = SlowQueryLog() if SLOW_QUERY_LOG_ENABLED else None
+    app.state.user_repository = get_user_repository()
+    app.state.chat_history = get_chat_history_store()
+    app.state.writer = WriteBehindWriter(app.state.user_repository, app.state.chat_history)
 
-    print("RAG engine ready")
+    app.state.warmup_task = None
+    if RAG_BACKGROUND_WARMUP:
+        # Start serving (health, static files, readiness) while models load; see /api/ready
+        app.state.warmup_task = asyncio.create_task(asyncio.to_thread(rag_engine.warm_up))
+    else:
+        rag_engine.warm_up()
+        print("RAG engine ready")
     yield
     print("Shutting down...")
+    if app.state.warmup_task is not None:
+        # The warm-up thread cannot be cancelled: ask it to stop and wait, so shutdown
+        # does not tear down executors and models it is still building
+        rag_engine.stopping.set()
+        await app.state.warmup_task
+    rag_engine.shutdown()
+    if app.state.slow_query_log is not None:
+        app.state.slow_query_log.close()
+    await app.state.writer.close()  # Drain buffered writes before closing the stores
+    app.state.user_repository.close()
+    app.state.chat_history.close()
+    await aclose_http_clients()
 
 app.router.lifespan_context = lifespan
 
@@ -66,6 +94,20 @@ async def health_check():
         "service": "onboard-first-assistant"
     }
 
+@app.get("/api/ready")
+async def readiness_check(request: Request):
+    """Readiness probe: 200 once models and indexes are warm, 503 with per-component status before."""
+    rag_engine = getattr(request.app.state, "rag_engine", None)
+    if rag_engine is None:
+        return JSONResponse(status_code=503, content={"ready": False, "components": {}})
+    status = rag_engine.readiness()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint: stage latencies, request/fallback/cache counters, LLM usage."""
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
+
 # Serve static frontend files
 app.mount("/static", StaticFiles(directory=FRONTEND_DIR), name="static")
 
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Metrics
+========
+In-process counters and histograms exposed in the Prometheus text format.
+
+No client library or external service is needed: metrics live in this
+process and `GET /metrics` renders them (text exposition format 0.0.4)
+for a Prometheus server or anything else that scrapes it. With several
+uvicorn workers each worker reports its own values; scrape per worker or
+aggregate with `sum()` as usual.
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from backend.slow_query_log import trace_stage
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Seconds; spans in-memory retrieval (ms) to slow LLM answers (tens of seconds)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+
+def escape_label_value(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{escape_label_value(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        return lines + self._samples()
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """Monotonic counter with optional labels."""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}" for key, value in items]
+
+
+class Histogram(Metric):
+    """Cumulative histogram with fixed buckets and optional labels."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall-clock duration of a block, also when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return series[-1] if series else 0
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        lines = []
+        for key, series in items:
+            for bound, cumulative in zip(self.buckets, series):
+                le = f'le="{format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{format_labels(self.labelnames, key, le)} {cumulative}")
+            inf_labels = format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{inf_labels} {series[-1]}")
+            lines.append(f"{self.name}_sum{format_labels(self.labelnames, key)} {format_value(series[-2])}")
+            lines.append(f"{self.name}_count{format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds metrics and renders them for /metrics."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "rag_stage_duration_seconds",
+    "Duration of chat pipeline stages (pii_masking, cache_lookup, retrieval, dense_retrieval, "
+    "sparse_retrieval, fusion, rerank, answer, answer_first_token).",
+    ("stage",)
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "chat_request_duration_seconds",
+    "End-to-end chat request time by endpoint and the path that served it.",
+    ("endpoint", "route")
+)
+REQUESTS = REGISTRY.counter(
+    "chat_requests_total",
+    "Chat requests by endpoint and the path that served them.",
+    ("endpoint", "route")
+)
+FALLBACKS = REGISTRY.counter(
+    "chat_fallbacks_total",
+    "Degraded answers: canned fallbacks by type, extractive answers, answer errors.",
+    ("type",)
+)
+CACHE_LOOKUPS = REGISTRY.counter(
+    "rag_cache_lookups_total",
+    "Semantic answer cache and LLM call cache lookups by result.",
+    ("cache", "result")
+)
+RERANK_DECISIONS = REGISTRY.counter(
+    "rag_rerank_decisions_total",
+    "Rerank decisions: reranked, skipped (decisive retrieval), skipped_budget.",
+    ("decision",)
+)
+LLM_SECONDS = REGISTRY.histogram(
+    "llm_request_duration_seconds",
+    "LLM provider call time (streams: until the last chunk).",
+    ("provider", "model")
+)
+LLM_ERRORS = REGISTRY.counter(
+    "llm_errors_total",
+    "Failed or rejected LLM calls by provider and error type.",
+    ("provider", "error")
+)
+LLM_TOKENS = REGISTRY.counter(
+    "llm_tokens_total",
+    "Tokens reported by the providers, by direction (input/output). Cache hits use none.",
+    ("provider", "model", "direction")
+)
+
+
+def record_stage(stage: str, seconds: float):
+    """Record one pipeline stage's duration (also in the request's slow-query trace, if any)."""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    trace_stage(stage, seconds)
+
+
+@contextmanager
+def observe_stage(stage: str):
+    """Context manager timing one pipeline stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Request Profiling
+==================
+On-demand cProfile capture of a single /api/chat request.
+
+Off unless `PROFILING_ENABLED=true` and `PROFILING_TOKEN` is set. A request
+sending the token in the `X-Profile-Token` header is then answered through
+the engine's synchronous path on a worker thread under cProfile, so the
+profile covers PII masking, retrieval, reranking and answer generation
+(including the LangChain and provider SDK layers) without picking up other
+requests running on the event loop. Retrieval legs that run on the
+retrieval pool are profiled on their own threads and merged in. Query
+embeddings skip the micro-batcher's worker thread while profiled and are
+encoded on the profiled thread instead (see `profiling_active`).
+
+Each profile is stored under `PROFILE_DIR` as `<id>.prof` (pstats, for
+snakeviz / `python -m pstats`) and `<id>.txt` (top functions by cumulative
+time), written from a worker thread; the id is returned in the
+`X-Profile-Id` response header. Only one request is profiled at a time.
+Normal requests pay a flag check, plus a context-variable lookup per
+retrieval leg.
+"""
+
+import os
+import io
+import asyncio
+import cProfile
+import hmac
+import pstats
+import threading
+import uuid
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+
+from dotenv import load_dotenv
+load_dotenv()
+
+PROJECT_ROOT = Path(__file__).parent.parent
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", str(PROJECT_ROOT / "data" / "profiles")))
+PROFILE_HEADER = "X-Profile-Token"
+PROFILE_ID_HEADER = "X-Profile-Id"
+PROFILE_SUMMARY_LINES = 60
+
+_active_profiler: ContextVar["RequestProfiler | None"] = ContextVar("request_profiler", default=None)
+_profile_lock = threading.Lock()  # cProfile profilers must not overlap on one thread; keep it to one request
+
+
+def profiling_requested(headers) -> bool:
+    """True if profiling is on and the request carries the admin token."""
+    if not PROFILING_ENABLED or not PROFILING_TOKEN:
+        return False
+    supplied = headers.get(PROFILE_HEADER)
+    return supplied is not None and hmac.compare_digest(supplied.encode(), PROFILING_TOKEN.encode())
+
+
+class RequestProfiler:
+    """Collects cProfile runs from the request thread and any worker threads it fans out to."""
+
+    def __init__(self):
+        self.profile_id = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+        self.profiles = []
+        self._lock = threading.Lock()
+
+    def run(self, func, *args):
+        """Call func under a fresh profiler on the current thread."""
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already active here (e.g. nested or an external tool)
+            return func(*args)
+        token = _active_profiler.set(self)
+        try:
+            return func(*args)
+        finally:
+            profile.disable()
+            _active_profiler.reset(token)
+            with self._lock:
+                self.profiles.append(profile)
+
+    def stats(self) -> pstats.Stats:
+        with self._lock:
+            profiles = list(self.profiles)
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        return stats
+
+    def summary(self, lines: int = PROFILE_SUMMARY_LINES) -> str:
+        out = io.StringIO()
+        stats = self.stats()
+        stats.stream = out
+        stats.sort_stats("cumulative").print_stats(lines)
+        return out.getvalue()
+
+    def save(self, directory: Path = PROFILE_DIR) -> Path:
+        """Write <id>.prof and <id>.txt; returns the .prof path."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{self.profile_id}.prof"
+        self.stats().dump_stats(path)
+        (directory / f"{self.profile_id}.txt").write_text(self.summary())
+        return path
+
+
+def profiling_active() -> bool:
+    """True on a thread that is running part of a profiled request."""
+    return _active_profiler.get() is not None
+
+
+def profile_leg(func, *args):
+    """Run a fanned-out piece of work, profiled if the request that started it is being profiled."""
+    profiler = _active_profiler.get()
+    if profiler is None:
+        return func(*args)
+    return profiler.run(func, *args)
+
+
+@asynccontextmanager
+async def profile_request(headers):
+    """
+    Yield a RequestProfiler if this request asked to be profiled (and no
+    other request is being profiled), else None. The profile is stored
+    in a worker thread when the block exits.
+    """
+    if not profiling_requested(headers):
+        yield None
+        return
+    if not _profile_lock.acquire(blocking=False):
+        print("Profiling skipped: another request is being profiled")
+        yield None
+        return
+    profiler = RequestProfiler()
+    try:
+        yield profiler
+    finally:
+        try:
+            if profiler.profiles:
+                path = await asyncio.to_thread(profiler.save, PROFILE_DIR)
+                print(f"Profile {profiler.profile_id} written to {path}")
+        except Exception as e:
+            print(f"Profile write error: {e}")
+        finally:
+            _profile_lock.release()
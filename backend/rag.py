@@ -1,45 +1,204 @@
 import os
+import asyncio
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
 import json
 # from langchain.schema import Document --- IGNORE --- not working
 from langchain_core.documents import Document
-from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.retrievers import BM25Retriever
-# from langchain.retrievers import EnsembleRetriever --- IGNORE --- not working
-# from langchain_community.retrievers import EnsembleRetriever --- IGNORE --- not working
-from langchain_classic.retrievers import EnsembleRetriever
 from langchain_core.prompts import PromptTemplate
-from langchain_groq import ChatGroq
-from langchain_openai import ChatOpenAI
-from langchain_core.output_parsers import StrOutputParser 
+# Chroma, HuggingFace, BM25, EnsembleRetriever and the chat model stacks are
+# imported where they are first used: they dominate cold-start time
+
+from backend.index_manifest import build_manifest, load_manifest, save_manifest, manifest_matches
+from backend.rerankers import get_reranker, should_skip_rerank, truncate_snippet, CrossEncoderReranker, RERANKER, RERANK_MODE
+from backend.vector_index import NumpyVectorIndex, NumpyRetriever, INDEX_FILENAME as NUMPY_INDEX_FILENAME
+from backend.fusion import ParallelHybridRetriever
+from backend.embedding_batcher import MicroBatchingEmbeddings, EMBED_BATCH_WINDOW_MS
+from backend.answer_cache import SemanticAnswerCache, ANSWER_CACHE_ENABLED
+from backend.llm_cache import LLMCallCache, LLM_CACHE_ENABLED
+from backend.llm_client import LLMClient
+from backend.intent_router import IntentRouter, INTENT_ROUTER_ENABLED
+from backend.resilience import ProviderGuard, ProviderUnavailableError, LLM_BREAKER_ENABLED
+from backend.deadline import Deadline, DeadlineExceeded
+from backend.http_clients import get_http_client, get_async_http_client, llm_timeout, transport_mode
+from backend.metrics import observe_stage, record_stage, CACHE_LOOKUPS, RERANK_DECISIONS
+from backend.slow_query_log import trace_documents, trace_rerank_decision
+from backend.sparse_index import InvertedBM25Index, InvertedBM25Retriever, INDEX_FILENAME as BM25_INDEX_FILENAME
 
 from dotenv import load_dotenv
 load_dotenv()
 COMPANY_NAME = os.getenv("COMPANY_NAME")
+COLLECTION_NAME = "company_knowledge"
+RERANK_MODEL = "llama-3.1-8b-instant"
+ANSWER_MODEL = "gpt-4o-mini"
+# Bounded pool for CPU-bound retrieval work (embedding, BM25) from async endpoints
+RAG_WORKER_THREADS = int(os.getenv("RAG_WORKER_THREADS", "4"))
+# Dense retrieval backend: "chroma" (persistent vector DB) or "numpy" (exact in-memory index)
+DENSE_BACKEND = os.getenv("DENSE_BACKEND", "chroma")
+DENSE_BACKENDS = ("chroma", "numpy")
+DENSE_K = 5
+# Sparse retrieval backend: "inverted" (persisted inverted index) or "rank_bm25" (linear scan)
+SPARSE_BACKEND = os.getenv("SPARSE_BACKEND", "inverted")
+SPARSE_K = 10
+# Hybrid mode: "parallel" (dense and sparse legs run concurrently, RRF by chunk id) or "ensemble"
+HYBRID_MODE = os.getenv("HYBRID_MODE", "parallel")
+HYBRID_WEIGHTS = [float(w) for w in os.getenv("HYBRID_WEIGHTS", "0.7,0.3").split(",")]
+# Request budget needed to start a rerank call, and kept back for the answer call (milliseconds).
+# With less left than ANSWER_MIN_BUDGET_MS the request degrades to an extractive answer.
+RERANK_MIN_BUDGET_MS = float(os.getenv("RERANK_MIN_BUDGET_MS", "3000"))
+ANSWER_MIN_BUDGET_MS = float(os.getenv("ANSWER_MIN_BUDGET_MS", "1500"))
+EXTRACTIVE_ANSWER_CHARS = 600
+# Load models and indexes in a background task after startup instead of blocking it
+RAG_BACKGROUND_WARMUP = os.getenv("RAG_BACKGROUND_WARMUP", "true").lower() == "true"
+WARMUP_QUERY = "What services do you offer?"
+# Readiness components, in warm-up order
+READINESS_COMPONENTS = ("llm_clients", "embeddings", "knowledge_base", "dense_index", "sparse_index", "warmup_query", "reranker")
+
+ANSWER_PROMPT = PromptTemplate.from_template("""
+    You are a helpful assistant for {company_name}. Answer the user's question using ONLY the provided context.
+    ### Rules:
+    1. If the context contains the answer, be concise and professional.
+    2. If the context DOES NOT contain the answer, say exactly: "I'm sorry, I don't have specific information about that in my knowledge base."
+    3. DO NOT use outside knowledge or hallucinate.
+    4. If the user greets you, respond politely and mention you can help with {company_name} services.
+
+    ### Context:
+    {context}
+
+    ### User Question:
+    "{question}"
+
+    ### Answer:
+""")
+
+
+def build_context(docs: list[Document]) -> str:
+    """Render the answer prompt context from the top documents."""
+    return "\n\n".join([f"Source: {doc.metadata['source_url']}\n{doc.page_content}" for doc in docs])
+
+
+def render_answer_prompt(query: str, docs: list[Document]) -> str:
+    """Render the grounded answer prompt for a question and its context documents."""
+    return ANSWER_PROMPT.format(question=query, context=build_context(docs), company_name=COMPANY_NAME)
+
+
+def collect_sources(docs: list[Document]) -> list[str]:
+    """Unique source URLs of the documents used for an answer."""
+    return list(set([doc.metadata["source_url"] for doc in docs]))
+
+
+def extractive_answer(docs: list[Document]) -> str:
+    """Answer without the LLM: the leading text of the top-ranked chunk."""
+    if not docs:
+        return "I'm sorry, I couldn't find an answer to that in time. Please try again."
+    snippet = truncate_snippet(docs[0].page_content, EXTRACTIVE_ANSWER_CHARS)
+    return f"Here's the most relevant information I found:\n\n{snippet}"
+
+
+class WarmupCancelled(Exception):
+    """Raised inside warm-up once the app has started shutting down."""
+
 
 class RAGEngine:
-    def __init__(self, knowledge_file: Path, persist_dir: Path, embedding_model="all-MiniLM-L6-v2"):
+    def __init__(self, knowledge_file: Path, persist_dir: Path, embedding_model="all-MiniLM-L6-v2",
+                 dense_backend=DENSE_BACKEND, sparse_backend=SPARSE_BACKEND):
+        if dense_backend not in DENSE_BACKENDS:
+            raise ValueError(f"Unknown dense backend: {dense_backend}")
         self.knowledge_file = knowledge_file
         self.persist_dir = persist_dir
         self.embedding_model = embedding_model
+        self.dense_backend = dense_backend
+        self.sparse_backend = sparse_backend
+        self.documents = []
         self.dense_vectorstore = None
         self.dense_retriever = None
+        self.dense_retrievers = {}
         self.sparse_retriever= None
         self.hybrid_retriever = None
-        
-        self.embeddings = HuggingFaceEmbeddings(model_name=embedding_model)
-        
-        # Lightweight LLM for reranking, cheap and appropriate for the task
-        self.rerank_llm = ChatGroq(
-            model="llama-3.1-8b-instant",
-            temperature=0
-        )
-        # Stronger proprietary model for final answering
-        self.answer_llm = ChatOpenAI(
-            model="gpt-4o-mini",
-            temperature=0
+        self.index_manifest = None
+        self.kb_version = ""
+        self.answer_cache = SemanticAnswerCache() if ANSWER_CACHE_ENABLED else None
+        # Greetings and canned FAQ questions are answered without retrieval or LLM calls
+        self.intent_router = IntentRouter() if INTENT_ROUTER_ENABLED else None
+        self.route_counts = Counter()  # Which path served each answer: intent:<name>, cache, rag, ...
+        self.rerank_mode = RERANK_MODE
+        self.rerank_decisions = Counter()  # Adaptive rerank outcomes: skipped / reranked
+        self.executor = ThreadPoolExecutor(max_workers=RAG_WORKER_THREADS, thread_name_prefix="rag")
+        # Separate pool for the hybrid retrieval legs so a leg never waits on its own caller's pool
+        self.retrieval_executor = ThreadPoolExecutor(max_workers=2 * RAG_WORKER_THREADS, thread_name_prefix="rag-retrieval")
+        # Models and LLM clients are created by load_models(), not here, so constructing the engine is cheap
+        self.embeddings = None
+        self.rerank_llm = None
+        self.answer_llm = None
+        self.llm_cache = None
+        self.rerank_client = None
+        self.answer_client = None
+        self.reranker = None
+        self.components = {name: "pending" for name in READINESS_COMPONENTS}
+        self.ready = False
+        self.warmup_seconds = None
+        self.stopping = threading.Event()  # Set on shutdown; warm-up stops at its next stage
+
+    def check_stopping(self):
+        if self.stopping.is_set():
+            raise WarmupCancelled()
+
+    def load_models(self, llms: bool = True):
+        """Import and construct the embedding model and (unless llms=False) the LLM clients."""
+        if llms and self.answer_client is None:
+            from langchain_groq import ChatGroq
+            from langchain_openai import ChatOpenAI
+
+            # Both providers share the pooled keep-alive HTTP clients; retries happen there, not in the SDKs
+            http_settings = dict(
+                http_client=get_http_client(),
+                http_async_client=get_async_http_client(),
+                timeout=llm_timeout(),
+                max_retries=0
+            )
+            replaying = transport_mode() == "replay"
+            # Lightweight LLM for reranking, cheap and appropriate for the task
+            self.rerank_llm = ChatGroq(
+                model=RERANK_MODEL,
+                temperature=0,
+                # Replayed calls never leave the process, so no real key is needed
+                api_key=os.getenv("GROQ_API_KEY") or ("replay" if replaying else None),
+                **http_settings
             )
+            # Stronger proprietary model for final answering
+            self.answer_llm = ChatOpenAI(
+                model=ANSWER_MODEL,
+                temperature=0,
+                stream_usage=True,  # Token counts for streamed answers too
+                api_key=os.getenv("OPENAI_API_KEY") or ("replay" if replaying else None),
+                **http_settings
+                )
+            # Persistent exact-match cache shared by both LLMs (and all workers). Off while recording or
+            # replaying: a hit would hide the call from the cassette and make runs depend on the cache file
+            self.llm_cache = LLMCallCache() if LLM_CACHE_ENABLED and transport_mode() == "off" else None
+            # Per-provider circuit breaker and concurrency cap: fail fast while a provider is down
+            self.rerank_client = LLMClient(self.rerank_llm, provider="groq", model=RERANK_MODEL, cache=self.llm_cache,
+                                           guard=ProviderGuard("groq") if LLM_BREAKER_ENABLED else None)
+            self.answer_client = LLMClient(self.answer_llm, provider="openai", model=ANSWER_MODEL, cache=self.llm_cache,
+                                           guard=ProviderGuard("openai") if LLM_BREAKER_ENABLED else None)
+            # Second-stage reranker: LLM (Groq) or local cross-encoder, see RERANKER
+            self.reranker = get_reranker(RERANKER, llm_client=self.rerank_client, executor=self.executor)
+        if llms:
+            self.components["llm_clients"] = "ready"
+
+        if self.embeddings is None:
+            from langchain_huggingface import HuggingFaceEmbeddings
+
+            embeddings = HuggingFaceEmbeddings(model_name=self.embedding_model)
+            if EMBED_BATCH_WINDOW_MS > 0:
+                # Concurrent chats share one batched encode call for their queries
+                embeddings = MicroBatchingEmbeddings(embeddings)
+            self.embeddings = embeddings
+        self.components["embeddings"] = "ready"
 
     def chunks_to_documents(self, chunks: list[dict]):
         return [
@@ -55,10 +214,97 @@ class RAGEngine:
             for chunk in chunks
         ]
 
-    def initialize(self):
-        """Load knowledge base and initialize ChromaDB."""
+    def load_dense_vectorstore(self, documents: list[Document], manifest: dict):
+        """Open the persisted Chroma collection, re-embedding only if the manifest changed."""
+        from langchain_chroma import Chroma
+
+        vectorstore = Chroma(
+            collection_name=COLLECTION_NAME,
+            embedding_function=self.embeddings,
+            persist_directory=str(self.persist_dir)
+        )
+
+        stored_manifest = load_manifest(self.persist_dir)
+        if manifest_matches(stored_manifest, manifest):
+            stored_count = len(vectorstore.get(include=[])["ids"])
+            if stored_count == len(documents):
+                print(f"Reusing persisted index ({stored_count} vectors, manifest {manifest['fingerprint'][:12]})")
+                return vectorstore
+            print(f"Persisted index has {stored_count} vectors, expected {len(documents)}. Rebuilding...")
+        else:
+            print("Index manifest changed or missing. Rebuilding vector index...")
+
+        # Drop stale vectors (removed chunks, old embedding model) before re-embedding
+        vectorstore.delete_collection()
+        vectorstore = Chroma.from_documents(
+            documents=documents,
+            embedding=self.embeddings,
+            collection_name=COLLECTION_NAME,
+            persist_directory=str(self.persist_dir),
+            ids=[doc.metadata["id"] for doc in documents]  # safe restart
+        )
+        save_manifest(self.persist_dir, manifest)
+        return vectorstore
+
+    def load_numpy_index(self, documents: list[Document], manifest: dict) -> NumpyVectorIndex:
+        """Load the persisted NumPy index, re-embedding only if the manifest changed."""
+        index_path = Path(self.persist_dir) / NUMPY_INDEX_FILENAME
+        index = NumpyVectorIndex.load(index_path, documents, fingerprint=manifest["fingerprint"])
+        if index is not None:
+            print(f"Reusing persisted NumPy index ({len(documents)} vectors, {index.nbytes / 1024:.0f} KiB)")
+            return index
+
+        print("Building NumPy vector index...")
+        index = NumpyVectorIndex.from_documents(documents, self.embeddings)
+        index.save(index_path, fingerprint=manifest["fingerprint"])
+        return index
+
+    def load_bm25_index(self, documents: list[Document], manifest: dict) -> InvertedBM25Index:
+        """Load the persisted BM25 inverted index, re-tokenizing only if the manifest changed."""
+        index_path = Path(self.persist_dir) / BM25_INDEX_FILENAME
+        index = InvertedBM25Index.load(index_path, documents, fingerprint=manifest["fingerprint"])
+        if index is not None:
+            print(f"Reusing persisted BM25 index ({len(index.vocabulary)} terms)")
+            return index
+
+        print("Building BM25 inverted index...")
+        index = InvertedBM25Index.from_documents(documents)
+        index.save(index_path, fingerprint=manifest["fingerprint"])
+        return index
+
+    def build_sparse_retriever(self, backend: str):
+        """Build the sparse (keyword) retriever for a backend over the loaded documents."""
+        if backend == "inverted":
+            index = self.load_bm25_index(self.documents, self.index_manifest)
+            return InvertedBM25Retriever(index=index, k=SPARSE_K)
+        if backend == "rank_bm25":
+            from langchain_community.retrievers import BM25Retriever
+            return BM25Retriever.from_documents(self.documents, k=SPARSE_K)
+        raise ValueError(f"Unknown sparse backend: {backend}")
+
+    def build_dense_retriever(self, backend: str):
+        """Build (once) the dense retriever for a backend over the loaded documents."""
+        if backend not in self.dense_retrievers:
+            if backend == "numpy":
+                index = self.load_numpy_index(self.documents, self.index_manifest)
+                self.dense_retrievers[backend] = NumpyRetriever(index=index, embeddings=self.embeddings, k=DENSE_K)
+            elif backend == "chroma":
+                self.dense_vectorstore = self.load_dense_vectorstore(self.documents, self.index_manifest)
+                self.dense_retrievers[backend] = self.dense_vectorstore.as_retriever(search_kwargs={"k": DENSE_K})
+            else:
+                raise ValueError(f"Unknown dense backend: {backend}")
+        return self.dense_retrievers[backend]
+
+    def initialize(self, llms: bool = True):
+        """
+        Load knowledge base and initialize ChromaDB. With llms=False only what
+        retrieval needs is loaded (no API keys required), e.g. for benchmarks.
+        """
+        self.load_models(llms=llms)
+        self.check_stopping()
         if not self.knowledge_file.exists():
-            print("Knowledge file missing at {self.knowledge_file}")
+            print(f"Knowledge file missing at {self.knowledge_file}")
+            self.components["knowledge_base"] = "failed: knowledge file missing"
             return
 
         with open(self.knowledge_file, "r", encoding="utf-8") as f:
@@ -67,35 +313,102 @@ class RAGEngine:
         chunks = kb.get("chunks", [])
         if not chunks:
             print("No chunks found")
+            self.components["knowledge_base"] = "failed: no chunks"
             return
 
         documents = self.chunks_to_documents(chunks)
+        self.documents = documents
+        self.components["knowledge_base"] = "ready"
 
-        self.dense_vectorstore = Chroma.from_documents(
-            documents=documents,
-            embedding=self.embeddings,
-            collection_name="company_knowledge",
-            persist_directory=str(self.persist_dir),
-            ids=[doc.metadata["id"] for doc in documents]  # safe restart
+        self.index_manifest = build_manifest(
+            chunks,
+            embedding_model=self.embedding_model,
+            chunker_settings=kb.get("metadata", {}).get("chunker"),
+            collection_name=COLLECTION_NAME
         )
+        # Cached answers are only valid for the knowledge base they were generated from
+        self.kb_version = f"{kb.get('metadata', {}).get('generated_at', '')}:{self.index_manifest['fingerprint'][:12]}"
+        if self.answer_cache is not None:
+            self.answer_cache.set_kb_version(self.kb_version)
 
-        self.dense_retriever = self.dense_vectorstore.as_retriever(search_kwargs={"k": 5})
+        self.check_stopping()
+        self.dense_retriever = self.build_dense_retriever(self.dense_backend)
+        self.components["dense_index"] = "ready"
+        self.check_stopping()
 
         # Initialize BM25 (Sparse)
-        self.sparse_retriever = BM25Retriever.from_documents(documents, search_kwargs={"k": 10})
+        self.sparse_retriever = self.build_sparse_retriever(self.sparse_backend)
+        self.components["sparse_index"] = "ready"
 
-        # Hybrid Ensemble
-        self.hybrid_retriever = EnsembleRetriever(
-            retrievers=[self.dense_retriever, self.sparse_retriever],
-            weights=[0.7, 0.3]
-        )
+        # Hybrid: dense + sparse fused by weighted reciprocal rank
+        if HYBRID_MODE == "ensemble":
+            from langchain_classic.retrievers import EnsembleRetriever
+            self.hybrid_retriever = EnsembleRetriever(
+                retrievers=[self.dense_retriever, self.sparse_retriever],
+                weights=HYBRID_WEIGHTS
+            )
+        else:
+            self.hybrid_retriever = ParallelHybridRetriever(
+                retrievers=[self.dense_retriever, self.sparse_retriever],
+                weights=HYBRID_WEIGHTS,
+                executor=self.retrieval_executor,
+                leg_stages=["dense_retrieval", "sparse_retrieval"]
+            )
 
         print(f"RAG initialized with {len(documents)} documents")
+
+    def warm_up(self):
+        """
+        Load models and indexes, then run one dummy query end to end (minus the
+        LLM calls) so the first real request does not pay for lazy loading.
+        Sets `ready` when done; failures are recorded per component.
+        """
+        start = time.perf_counter()
+        try:
+            self.initialize()
+            if not self.hybrid_retriever:
+                return
+
+            self.check_stopping()
+            docs = self.get_relevant_documents(WARMUP_QUERY)
+            self.components["warmup_query"] = "ready"
+
+            if isinstance(self.reranker, CrossEncoderReranker):
+                # Loads the cross-encoder weights; the LLM reranker has nothing local to warm
+                self.reranker.rerank(WARMUP_QUERY, docs[:2])
+            self.components["reranker"] = "ready"
+
+            self.warmup_seconds = round(time.perf_counter() - start, 2)
+            self.ready = True
+            print(f"RAG warm-up finished in {self.warmup_seconds}s")
+        except WarmupCancelled:
+            print("RAG warm-up stopped: shutting down")
+        except Exception as e:
+            # Attribute the failure to the first component that did not finish
+            failed = next((name for name in READINESS_COMPONENTS if self.components[name] != "ready"), "warmup_query")
+            self.components[failed] = f"failed: {e}"
+            print(f"RAG warm-up error ({failed}): {e}")
+
+    def readiness(self) -> dict:
+        """Readiness summary for the /api/ready probe."""
+        return {
+            "ready": self.ready,
+            "components": dict(self.components),
+            "warmup_seconds": self.warmup_seconds,
+        }
     
     
     def get_retriever(self, mode="hybrid"):
+        """
+        Get a retriever by mode: "dense" (configured backend), "sparse", "hybrid",
+        or a specific dense backend ("chroma", "numpy"), which is built on first use.
+        """
         if mode == "dense":
             return self.dense_retriever
+        elif mode in DENSE_BACKENDS:
+            if not self.documents:
+                return None
+            return self.build_dense_retriever(mode)
         elif mode == "sparse":
             return self.sparse_retriever
         else:
@@ -104,94 +417,301 @@ class RAGEngine:
     def get_relevant_documents(self, query: str):
         if not self.hybrid_retriever:
             return []
-        retrieved_docs = self.hybrid_retriever.invoke(query)
+        with observe_stage("retrieval"):
+            retrieved_docs = self.hybrid_retriever.invoke(query)
+        trace_documents("retrieved", retrieved_docs)
         return retrieved_docs
 
-    def rerank_documents(self, query: str, retrieved_docs: list[Document]) -> list[Document]:
-        """Use LLM to rerank retrieved documents for relevance."""
-        if not retrieved_docs:
+    async def aget_relevant_documents(self, query: str):
+        """Async retrieval. Embedding and BM25 are CPU-bound, so they run on the bounded pool."""
+        if not self.hybrid_retriever:
             return []
+        with observe_stage("retrieval"):
+            if isinstance(self.hybrid_retriever, ParallelHybridRetriever):
+                # Fans the legs out to the retrieval pool itself
+                retrieved_docs = await self.hybrid_retriever.ainvoke(query)
+            else:
+                retrieved_docs = await self.run_blocking(self.hybrid_retriever.invoke, query)
+        trace_documents("retrieved", retrieved_docs)
+        return retrieved_docs
 
-        rerank_prompt = PromptTemplate.from_template("""
-            You are a ranking assistant. Your job is to re-rank a list of following documents based on how useful and relevant they are for answering the user's question.
-                
-            ### User Question:
-            "{question}"
-                
-            ### Documents:
-            {documents}
-
-            ---
-
-            ### Instructions:
-            - Read all documents.
-            - Think about the relevance of each document to the user's question.
-            - Rank the documents from most relevant to least relevant.     
-            - Output the ranking as a comma-separated list of document numbers.    
-            - VERY IMPORTANT:
-            - Output ONLY the numbers.
-            - Do NOT output explanations.
-            - Do NOT output any text other than the numbers.
-
-            ### Output format (STRICT):
-            1, 3, 2, 4
-        """)
-        
-        chain = rerank_prompt | self.rerank_llm | StrOutputParser()
+    async def run_blocking(self, func, *args):
+        """Run a blocking call on the engine's thread pool without stalling the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args))
 
-        doc_lines = [f"{i+1}. {doc.page_content}" for i, doc in enumerate(retrieved_docs)]
-        formatted_docs = "\n".join(doc_lines)
+    def shutdown(self):
+        """Release the worker threads and close the LLM cache (writing its buffered counters)."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.retrieval_executor.shutdown(wait=False, cancel_futures=True)
+        if isinstance(self.embeddings, MicroBatchingEmbeddings):
+            self.embeddings.close()
+        if self.llm_cache is not None:
+            self.llm_cache.close()
 
-        try:
-            response = chain.invoke({"question": query, "documents": formatted_docs})
-            indices = [int(x.strip()) - 1 for x in response.split(",") if x.strip().isdigit()]
-            ranked_docs = [retrieved_docs[i] for i in indices if 0 <= i < len(retrieved_docs)]
-            return ranked_docs      # return top 4
-        except Exception as e:
-            print(f"Reranking error: {e}")
-            return retrieved_docs  # return top 4
-    
+    def skip_rerank(self, retrieved_docs: list[Document], deadline: Deadline) -> bool:
+        """
+        Decide whether to skip reranking and log the decision: skipped when the
+        fused ranking is already decisive (adaptive mode) or when the request
+        budget cannot fit a rerank call and still leave time to answer.
+        """
+        skip, margin = (False, None)
+        if self.rerank_mode == "adaptive":
+            skip, margin = should_skip_rerank(retrieved_docs)
+        if skip:
+            decision = "skipped"
+        elif deadline.remaining_ms() < RERANK_MIN_BUDGET_MS:
+            decision = "skipped_budget"
+        else:
+            decision = "reranked"
+        self.rerank_decisions[decision] += 1
+        RERANK_DECISIONS.inc(decision=decision)
+        trace_rerank_decision(decision)
+        margin_text = "n/a" if margin is None else f"{margin:.3f}"
+        budget_text = "" if not deadline.bounded else f", {deadline.remaining_ms():.0f}ms left"
+        print(f"Rerank {decision}: fused margin {margin_text}, {len(retrieved_docs)} candidates{budget_text}")
+        return decision != "reranked"
+
+    def rerank_documents(self, query: str, retrieved_docs: list[Document], deadline: Deadline | None = None) -> list[Document]:
+        """Rerank retrieved documents for relevance with the configured reranker."""
+        deadline = deadline or Deadline(None)
+        if self.skip_rerank(retrieved_docs, deadline):
+            return retrieved_docs
+        with observe_stage("rerank"):
+            ranked_docs = self.reranker.rerank(query, retrieved_docs, timeout=deadline.timeout(reserve_ms=ANSWER_MIN_BUDGET_MS))
+        if not ranked_docs:
+            # A reply the reranker could not parse ranks nothing; the retrieved order still answers
+            print("Rerank returned no documents, keeping the retrieved order")
+            ranked_docs = retrieved_docs
+        trace_documents("reranked", ranked_docs)
+        return ranked_docs
+
+    async def arerank_documents(self, query: str, retrieved_docs: list[Document], deadline: Deadline | None = None) -> list[Document]:
+        """Async variant of rerank_documents."""
+        deadline = deadline or Deadline(None)
+        if self.skip_rerank(retrieved_docs, deadline):
+            return retrieved_docs
+        with observe_stage("rerank"):
+            ranked_docs = await self.reranker.arerank(query, retrieved_docs, timeout=deadline.timeout(reserve_ms=ANSWER_MIN_BUDGET_MS))
+        if not ranked_docs:
+            # A reply the reranker could not parse ranks nothing; the retrieved order still answers
+            print("Rerank returned no documents, keeping the retrieved order")
+            ranked_docs = retrieved_docs
+        trace_documents("reranked", ranked_docs)
+        return ranked_docs
+
+    def lookup_cached_answer(self, query: str):
+        """Check the semantic answer cache. Returns (cached answer or None, query vector)."""
+        if self.answer_cache is None or not self.hybrid_retriever:
+            return None, None
+        with observe_stage("cache_lookup"):
+            query_vector = self.embeddings.embed_query(query)
+            cached = self.answer_cache.get(query_vector)
+        CACHE_LOOKUPS.inc(cache="answer", result="miss" if cached is None else "hit")
+        return cached, query_vector
+
+    async def alookup_cached_answer(self, query: str):
+        """Async variant of lookup_cached_answer."""
+        if self.answer_cache is None or not self.hybrid_retriever:
+            return None, None
+        with observe_stage("cache_lookup"):
+            query_vector = await self.embeddings.aembed_query(query)
+            cached = self.answer_cache.get(query_vector)
+        CACHE_LOOKUPS.inc(cache="answer", result="miss" if cached is None else "hit")
+        return cached, query_vector
+
+    def store_cached_answer(self, query_vector, result: dict):
+        """Remember a successful answer for similar future questions."""
+        if self.answer_cache is not None and query_vector is not None:
+            self.answer_cache.put(query_vector, result)
+
+    def route_intent(self, query: str) -> dict | None:
+        """Answer greetings and canned FAQ intents directly. Returns None for everything else."""
+        if self.intent_router is None:
+            return None
+        match = self.intent_router.route(query)
+        if match is None:
+            return None
+        intent, response = match
+        return self.served_by(f"intent:{intent}", {"response": response, "sources": []})
+
+    def served_by(self, route: str, result: dict) -> dict:
+        """Tag a result with the path that produced it and count it."""
+        self.route_counts[route] += 1
+        return {**result, "route": route}
+
+    def check_answer_available(self):
+        """
+        Raise ProviderUnavailableError before any retrieval work if the answer
+        LLM's circuit is open. Callers turn it into a canned fallback response.
+        """
+        if self.answer_client is not None:
+            self.answer_client.check_available()
+
+    def extractive_result(self, top_docs: list[Document], reason: str) -> dict:
+        """Degraded answer for a request that has no budget left for the answer LLM."""
+        print(f"Extractive answer: {reason}")
+        return self.served_by("extractive", {"response": extractive_answer(top_docs), "sources": collect_sources(top_docs[:1])})
+
+    def answer_query(self, query: str, deadline: Deadline | None = None) -> dict:
+        """
+        Complete RAG pipeline: retrieval -> reranking -> grounded answering.
+
+        With a deadline, reranking is skipped when the budget is tight, the
+        answer LLM gets the remaining budget as its timeout, and the request
+        degrades to an extractive answer rather than running over.
+
+        Raises ProviderUnavailableError when the answer provider is rejecting
+        calls (open circuit or concurrency cap), so the caller can fall back.
+        """
+        deadline = deadline or Deadline(None)
+        # 0. Intent router and semantic cache
+        routed = self.route_intent(query)
+        if routed is not None:
+            return routed
+        cached, query_vector = self.lookup_cached_answer(query)
+        if cached is not None:
+            return self.served_by("cache", cached)
+        self.check_answer_available()
 
-    def answer_query(self, query: str) -> dict:
-        """Complete RAG pipeline: retrieval -> reranking -> grounded answering."""
         # 1. Retrieve
         retrieved_docs = self.get_relevant_documents(query)
         if not retrieved_docs:
-            return {"response": "I'm sorry, I can't answer that. My knowledge base is not initialized.", "sources": []}
+            return self.served_by("unavailable", {"response": "I'm sorry, I can't answer that. My knowledge base is not initialized.", "sources": []})
         
-        # 2. Rerank
-        ranked_docs = self.rerank_documents(query, retrieved_docs)
+        # 2. Rerank (never empty: an unusable rerank keeps the retrieved order)
+        ranked_docs = self.rerank_documents(query, retrieved_docs, deadline)
         top_docs = ranked_docs[:4]
         
         # 3. Answer
-        answer_prompt = PromptTemplate.from_template("""
-            You are a helpful assistant for {company_name}. Answer the user's question using ONLY the provided context.
-            ### Rules:
-            1. If the context contains the answer, be concise and professional.
-            2. If the context DOES NOT contain the answer, say exactly: "I'm sorry, I don't have specific information about that in my knowledge base."
-            3. DO NOT use outside knowledge or hallucinate.
-            4. If the user greets you, respond politely and mention you can help with {company_name} services.
-
-            ### Context:
-            {context}
-
-            ### User Question:
-            "{question}"
-
-            ### Answer:
-        """)
-        
-        context_str = "\n\n".join([f"Source: {doc.metadata['source_url']}\n{doc.page_content}" for doc in top_docs])
-        
-        chain = answer_prompt | self.answer_llm | StrOutputParser()
-        
+        if deadline.remaining_ms() < ANSWER_MIN_BUDGET_MS:
+            return self.extractive_result(top_docs, f"{deadline.remaining_ms():.0f}ms left before answering")
         try:
-            response = chain.invoke({"question": query, "context": context_str, "company_name": COMPANY_NAME})
-            sources = list(set([doc.metadata["source_url"] for doc in top_docs]))
-            return {
+            with observe_stage("answer"):
+                response = self.answer_client.invoke(render_answer_prompt(query, top_docs), timeout=deadline.timeout())
+            result = {
                 "response": response,
-                "sources": sources
+                "sources": collect_sources(top_docs)
             }
+            self.store_cached_answer(query_vector, result)
+            return self.served_by("rag", result)
+        except DeadlineExceeded as e:
+            return self.extractive_result(top_docs, str(e))
+        except ProviderUnavailableError:
+            raise
+        except Exception as e:
+            print(f"Answering error: {e}")
+            return self.served_by("error", {"response": "I encountered an error processing your request.", "sources": []})
+
+    async def aanswer_query(self, query: str, deadline: Deadline | None = None) -> dict:
+        """Non-blocking RAG pipeline for async endpoints. Same stages (and errors) as answer_query."""
+        deadline = deadline or Deadline(None)
+        routed = self.route_intent(query)
+        if routed is not None:
+            return routed
+        cached, query_vector = await self.alookup_cached_answer(query)
+        if cached is not None:
+            return self.served_by("cache", cached)
+        self.check_answer_available()
+
+        # 1. Retrieve
+        retrieved_docs = await self.aget_relevant_documents(query)
+        if not retrieved_docs:
+            return self.served_by("unavailable", {"response": "I'm sorry, I can't answer that. My knowledge base is not initialized.", "sources": []})
+
+        # 2. Rerank
+        top_docs = (await self.arerank_documents(query, retrieved_docs, deadline))[:4]
+
+        # 3. Answer
+        if deadline.remaining_ms() < ANSWER_MIN_BUDGET_MS:
+            return self.extractive_result(top_docs, f"{deadline.remaining_ms():.0f}ms left before answering")
+        try:
+            with observe_stage("answer"):
+                response = await self.answer_client.ainvoke(render_answer_prompt(query, top_docs), timeout=deadline.timeout())
+            result = {
+                "response": response,
+                "sources": collect_sources(top_docs)
+            }
+            self.store_cached_answer(query_vector, result)
+            return self.served_by("rag", result)
+        except DeadlineExceeded as e:
+            return self.extractive_result(top_docs, str(e))
+        except ProviderUnavailableError:
+            raise
+        except Exception as e:
+            print(f"Answering error: {e}")
+            return self.served_by("error", {"response": "I encountered an error processing your request.", "sources": []})
+
+    async def astream_answer(self, query: str, deadline: Deadline | None = None):
+        """
+        Streaming RAG pipeline.
+
+        Yields events as dicts with `event` and `data` keys: one `sources`
+        event as soon as reranking is done, `token` events as the answer LLM
+        produces them, and a `route` event naming the path that served the
+        request. The deadline bounds the time to the first token; when it
+        runs out, a second `sources` event replaces the first with the
+        sources of the extractive answer.
+        """
+        deadline = deadline or Deadline(None)
+        routed = self.route_intent(query)
+        if routed is not None:
+            yield {"event": "route", "data": routed["route"]}
+            yield {"event": "sources", "data": routed["sources"]}
+            yield {"event": "token", "data": routed["response"]}
+            return
+
+        cached, query_vector = await self.alookup_cached_answer(query)
+        if cached is not None:
+            yield {"event": "route", "data": self.served_by("cache", cached)["route"]}
+            yield {"event": "sources", "data": cached["sources"]}
+            yield {"event": "token", "data": cached["response"]}
+            return
+        self.check_answer_available()
+
+        retrieved_docs = await self.aget_relevant_documents(query)
+        if not retrieved_docs:
+            yield {"event": "route", "data": self.served_by("unavailable", {})["route"]}
+            yield {"event": "sources", "data": []}
+            yield {"event": "token", "data": "I'm sorry, I can't answer that. My knowledge base is not initialized."}
+            return
+        top_docs = (await self.arerank_documents(query, retrieved_docs, deadline))[:4]
+
+        if deadline.remaining_ms() < ANSWER_MIN_BUDGET_MS:
+            result = self.extractive_result(top_docs, f"{deadline.remaining_ms():.0f}ms left before answering")
+            yield {"event": "route", "data": result["route"]}
+            yield {"event": "sources", "data": result["sources"]}
+            yield {"event": "token", "data": result["response"]}
+            return
+
+        sources = collect_sources(top_docs)
+        yield {"event": "sources", "data": sources}
+
+        tokens = []
+        answer_started = time.perf_counter()
+        try:
+            async for token in self.answer_client.astream(render_answer_prompt(query, top_docs), timeout=deadline.timeout()):
+                if token:
+                    if not tokens:
+                        record_stage("answer_first_token", time.perf_counter() - answer_started)
+                    tokens.append(token)
+                    yield {"event": "token", "data": token}
+            record_stage("answer", time.perf_counter() - answer_started)
+            self.store_cached_answer(query_vector, {"response": "".join(tokens), "sources": sources})
+            yield {"event": "route", "data": self.served_by("rag", {})["route"]}
+        except DeadlineExceeded as e:
+            # Only the wait for the first token is bounded, so nothing has been streamed yet
+            result = self.extractive_result(top_docs, str(e))
+            yield {"event": "route", "data": result["route"]}
+            yield {"event": "sources", "data": result["sources"]}  # Replaces the sources sent above
+            yield {"event": "token", "data": result["response"]}
+        except ProviderUnavailableError as e:
+            if not tokens:
+                raise
+            print(f"Answering error: {e}")
+            yield {"event": "route", "data": self.served_by("error", {})["route"]}
         except Exception as e:
             print(f"Answering error: {e}")
-            return {"response": "I encountered an error processing your request.", "sources": []}
\ No newline at end of file
+            yield {"event": "route", "data": self.served_by("error", {})["route"]}
+            if not tokens:
+                yield {"event": "token", "data": "I encountered an error processing your request."}
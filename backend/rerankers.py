@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Rerankers
+==========
+Pluggable second-stage rerankers for retrieved documents.
+
+- `LLMReranker`: asks a chat model (through an LLMClient) to order the documents.
+- `CrossEncoderReranker`: scores every (query, chunk) pair locally on CPU
+  with a sentence-transformers cross-encoder in one batched forward pass.
+
+Select with the RERANKER environment variable (`llm` or `cross_encoder`).
+
+With RERANK_MODE=adaptive (the default) the engine skips reranking when
+the fused retrieval scores are already decisive, see `should_skip_rerank`.
+"""
+
+import os
+import asyncio
+
+from langchain_core.documents import Document
+from langchain_core.prompts import PromptTemplate
+
+from dotenv import load_dotenv
+load_dotenv()
+
+RERANKER = os.getenv("RERANKER", "llm")
+CROSS_ENCODER_MODEL = os.getenv("CROSS_ENCODER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+# "adaptive" skips the rerank call when retrieval is already confident, "always" never skips
+RERANK_MODE = os.getenv("RERANK_MODE", "adaptive")
+# Relative lead of the top fused score over the runner-up, (s1 - s2) / s1, that counts as decisive.
+# With RRF (c=60) a chunk ranked first by both legs leads a runner-up found by only one leg by ~30%,
+# and one ranked second by both by under 2%.
+RERANK_SKIP_MARGIN = float(os.getenv("RERANK_SKIP_MARGIN", "0.25"))
+# Characters of each chunk sent to the LLM reranker (0 sends whole chunks)
+RERANK_SNIPPET_CHARS = int(os.getenv("RERANK_SNIPPET_CHARS", "400"))
+
+RERANK_PROMPT = PromptTemplate.from_template("""
+    You are a ranking assistant. Your job is to re-rank a list of following documents based on how useful and relevant they are for answering the user's question.
+
+    ### User Question:
+    "{question}"
+
+    ### Documents:
+    {documents}
+
+    ---
+
+    ### Instructions:
+    - Read all documents.
+    - Think about the relevance of each document to the user's question.
+    - Rank the documents from most relevant to least relevant.
+    - Output the ranking as a comma-separated list of document numbers.
+    - VERY IMPORTANT:
+    - Output ONLY the numbers.
+    - Do NOT output explanations.
+    - Do NOT output any text other than the numbers.
+
+    ### Output format (STRICT):
+    1, 3, 2, 4
+""")
+
+
+def truncate_snippet(text: str, max_chars: int) -> str:
+    """Cut text to about max_chars on a word boundary."""
+    if max_chars <= 0 or len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    space = cut.rfind(" ")
+    if space > max_chars // 2:
+        cut = cut[:space]
+    return cut.rstrip() + "..."
+
+
+def format_rerank_documents(docs: list[Document], snippet_chars: int = 0) -> str:
+    """Number documents (or their leading snippets) for the rerank prompt."""
+    return "\n".join(f"{i+1}. {truncate_snippet(doc.page_content, snippet_chars)}" for i, doc in enumerate(docs))
+
+
+def fused_score_margin(docs: list[Document]) -> float | None:
+    """
+    Relative lead of the top fused score over the runner-up, or None when the
+    documents carry no fusion scores (e.g. EnsembleRetriever or a single leg).
+    """
+    if len(docs) < 2:
+        return None
+    top, runner_up = (doc.metadata.get("fusion_score") for doc in docs[:2])
+    if top is None or runner_up is None or top <= 0:
+        return None
+    return (top - runner_up) / top
+
+
+def should_skip_rerank(docs: list[Document], margin: float = RERANK_SKIP_MARGIN) -> tuple[bool, float | None]:
+    """Decide whether fused retrieval is decisive enough to skip reranking. Returns (skip, observed margin)."""
+    if len(docs) <= 1:
+        return True, None
+    observed = fused_score_margin(docs)
+    return observed is not None and observed >= margin, observed
+
+
+def parse_rerank_response(response: str, docs: list[Document]) -> list[Document]:
+    """Map the reranker's comma-separated document numbers back to documents."""
+    indices = [int(x.strip()) - 1 for x in response.split(",") if x.strip().isdigit()]
+    return [docs[i] for i in indices if 0 <= i < len(docs)]
+
+
+def with_rerank_score(doc: Document, score: float) -> Document:
+    """Copy a document with its rerank score attached (retrieved docs are shared, never mutate them)."""
+    return Document(page_content=doc.page_content, metadata={**doc.metadata, "rerank_score": score})
+
+
+class BaseReranker:
+    """Interface for rerankers. Implementations return docs ordered most relevant first."""
+    name = "base"
+
+    def rerank(self, query: str, docs: list[Document], timeout: float | None = None) -> list[Document]:
+        raise NotImplementedError
+
+    async def arerank(self, query: str, docs: list[Document], timeout: float | None = None) -> list[Document]:
+        return self.rerank(query, docs, timeout)
+
+
+class LLMReranker(BaseReranker):
+    """Rerank by asking a chat model for a comma-separated ordering."""
+    name = "llm"
+
+    def __init__(self, llm_client, snippet_chars: int = RERANK_SNIPPET_CHARS):
+        self.llm_client = llm_client
+        self.snippet_chars = snippet_chars
+
+    def render_prompt(self, query: str, docs: list[Document]) -> str:
+        return RERANK_PROMPT.format(question=query, documents=format_rerank_documents(docs, self.snippet_chars))
+
+    def rerank(self, query: str, docs: list[Document], timeout: float | None = None) -> list[Document]:
+        if not docs:
+            return []
+        try:
+            response = self.llm_client.invoke(self.render_prompt(query, docs), timeout=timeout)
+            return parse_rerank_response(response, docs)
+        except Exception as e:
+            print(f"Reranking error: {e}")
+            return docs
+
+    async def arerank(self, query: str, docs: list[Document], timeout: float | None = None) -> list[Document]:
+        if not docs:
+            return []
+        try:
+            response = await self.llm_client.ainvoke(self.render_prompt(query, docs), timeout=timeout)
+            return parse_rerank_response(response, docs)
+        except Exception as e:
+            print(f"Reranking error: {e}")
+            return docs
+
+
+class CrossEncoderReranker(BaseReranker):
+    """Rerank locally with a cross-encoder. No network call, one batched forward pass per query."""
+    name = "cross_encoder"
+
+    def __init__(self, model_name: str = CROSS_ENCODER_MODEL, executor=None, max_length: int = 512, model=None):
+        self.model_name = model_name
+        self.executor = executor
+        self.max_length = max_length
+        self._model = model
+
+    @property
+    def model(self):
+        # Loaded on first use so importing this module stays cheap
+        if self._model is None:
+            from sentence_transformers import CrossEncoder
+            self._model = CrossEncoder(self.model_name, max_length=self.max_length, device="cpu")
+        return self._model
+
+    def rerank(self, query: str, docs: list[Document], timeout: float | None = None) -> list[Document]:
+        # Local and fast: the budget check before reranking is enough, no timeout needed
+        if not docs:
+            return []
+        try:
+            pairs = [(query, doc.page_content) for doc in docs]
+            scores = self.model.predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+            order = sorted(range(len(docs)), key=lambda i: float(scores[i]), reverse=True)
+            return [with_rerank_score(docs[i], float(scores[i])) for i in order]
+        except Exception as e:
+            print(f"Reranking error: {e}")
+            return docs
+
+    async def arerank(self, query: str, docs: list[Document], timeout: float | None = None) -> list[Document]:
+        # CPU-bound: run on the engine's pool instead of the event loop
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.rerank, query, docs)
+
+
+def get_reranker(name: str = RERANKER, llm_client=None, executor=None) -> BaseReranker:
+    """
+    Build the configured reranker.
+
+    Args:
+        name: `llm` or `cross_encoder`
+        llm_client: LLMClient used by the LLM reranker
+        executor: Thread pool for CPU-bound reranking on the async path
+    """
+    if name == "cross_encoder":
+        return CrossEncoderReranker(executor=executor)
+    if name == "llm":
+        return LLMReranker(llm_client)
+    raise ValueError(f"Unknown reranker: {name}")
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Provider Resilience
+====================
+Circuit breaker and concurrency bulkhead for the LLM providers.
+
+Each provider (Groq, OpenAI) gets a `ProviderGuard` that combines:
+
+- `CircuitBreaker`: tracks the outcome and latency of the last N calls.
+  When the error rate or slow-call rate crosses its threshold the breaker
+  opens and calls fail immediately instead of waiting out client timeouts.
+  After a cool-down it lets a single probe call through (half-open); a
+  success closes it again, a failure re-opens it.
+- `Bulkhead`: a slot count capping in-flight calls to the provider, so a
+  slow provider cannot tie up every worker.
+
+Rejected calls raise `ProviderUnavailableError`, whose `fallback_type`
+(`rate_limited` or `api_error`) tells the chat endpoint which canned
+fallback response to use.
+"""
+
+import os
+import asyncio
+import threading
+import time
+from collections import deque
+
+from backend.deadline import DeadlineExceeded
+
+from dotenv import load_dotenv
+load_dotenv()
+
+LLM_BREAKER_ENABLED = os.getenv("LLM_BREAKER_ENABLED", "true").lower() == "true"
+LLM_BREAKER_WINDOW = int(os.getenv("LLM_BREAKER_WINDOW", "20"))
+LLM_BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "5"))
+LLM_BREAKER_FAILURE_RATE = float(os.getenv("LLM_BREAKER_FAILURE_RATE", "0.5"))
+LLM_BREAKER_SLOW_CALL_SECONDS = float(os.getenv("LLM_BREAKER_SLOW_CALL_SECONDS", "8"))
+LLM_BREAKER_SLOW_CALL_RATE = float(os.getenv("LLM_BREAKER_SLOW_CALL_RATE", "0.8"))
+LLM_BREAKER_OPEN_SECONDS = float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30"))
+# In-flight calls allowed per provider, and how long a call may wait for a slot
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_BULKHEAD_WAIT_MS = float(os.getenv("LLM_BULKHEAD_WAIT_MS", "250"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class ProviderUnavailableError(Exception):
+    """A call was rejected without reaching the provider."""
+
+    def __init__(self, provider: str, fallback_type: str, reason: str):
+        super().__init__(f"{provider} unavailable: {reason}")
+        self.provider = provider
+        self.fallback_type = fallback_type
+        self.reason = reason
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """True for provider 429s (openai.RateLimitError, groq.RateLimitError, HTTP 429)."""
+    return getattr(error, "status_code", None) == 429 or "ratelimit" in type(error).__name__.lower()
+
+
+class CircuitBreaker:
+    """Count-based sliding-window circuit breaker. Thread-safe."""
+
+    def __init__(self, name: str, window_size: int = LLM_BREAKER_WINDOW, min_calls: int = LLM_BREAKER_MIN_CALLS,
+                 failure_rate_threshold: float = LLM_BREAKER_FAILURE_RATE,
+                 slow_call_seconds: float = LLM_BREAKER_SLOW_CALL_SECONDS,
+                 slow_call_rate_threshold: float = LLM_BREAKER_SLOW_CALL_RATE,
+                 open_seconds: float = LLM_BREAKER_OPEN_SECONDS, clock=time.monotonic):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.open_seconds = open_seconds
+        self.clock = clock
+        self.state = CLOSED
+        self.open_reason = "api_error"
+        self.opened_at = 0.0
+        self._outcomes = deque(maxlen=window_size)  # (failed, slow, rate_limited)
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def _rejection(self) -> ProviderUnavailableError:
+        return ProviderUnavailableError(self.name, self.open_reason, "circuit open")
+
+    def _cooled_down(self) -> bool:
+        return self.clock() - self.opened_at >= self.open_seconds
+
+    def check(self):
+        """Raise if a call would be rejected right now, without claiming a probe slot."""
+        with self._lock:
+            if self.state == OPEN and not self._cooled_down():
+                raise self._rejection()
+            if self.state == HALF_OPEN and self._probe_in_flight:
+                raise self._rejection()
+
+    def before_call(self):
+        """Admit a call or raise. In half-open state only one probe is admitted at a time."""
+        with self._lock:
+            if self.state == OPEN:
+                if not self._cooled_down():
+                    raise self._rejection()
+                self.state = HALF_OPEN
+                print(f"Circuit {self.name}: half-open, probing")
+            if self.state == HALF_OPEN:
+                if self._probe_in_flight:
+                    raise self._rejection()
+                self._probe_in_flight = True
+
+    def on_success(self, duration: float):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._close()
+                return
+            self._record(False, duration >= self.slow_call_seconds, False)
+
+    def on_failure(self, error: Exception, duration: float):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._open("rate_limited" if is_rate_limit_error(error) else "api_error")
+                return
+            self._record(True, duration >= self.slow_call_seconds, is_rate_limit_error(error))
+
+    def on_timeout(self):
+        """A call ran out of request budget: counts as slow, not as an error."""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._open("api_error")
+                return
+            self._record(False, True, False)
+
+    def on_abort(self):
+        """A call was cancelled before it finished; it counts neither way."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def _record(self, failed: bool, slow: bool, rate_limited: bool):
+        self._outcomes.append((failed, slow, rate_limited))
+        calls = len(self._outcomes)
+        if calls < self.min_calls:
+            return
+        failures = sum(outcome[0] for outcome in self._outcomes)
+        slow_calls = sum(outcome[1] for outcome in self._outcomes)
+        if failures / calls >= self.failure_rate_threshold:
+            rate_limited = sum(outcome[2] for outcome in self._outcomes)
+            self._open("rate_limited" if rate_limited * 2 >= failures else "api_error")
+        elif slow_calls / calls >= self.slow_call_rate_threshold:
+            self._open("api_error")
+
+    def _open(self, reason: str):
+        self.state = OPEN
+        self.open_reason = reason
+        self.opened_at = self.clock()
+        self._probe_in_flight = False
+        self._outcomes.clear()
+        print(f"Circuit {self.name}: open ({reason}) for {self.open_seconds:.0f}s")
+
+    def _close(self):
+        self.state = CLOSED
+        self._probe_in_flight = False
+        self._outcomes.clear()
+        print(f"Circuit {self.name}: closed")
+
+
+class Bulkhead:
+    """
+    Caps concurrent calls. Shared by threads (sync path) and the event loop (async path).
+
+    Threads wait on a condition; coroutines queue a future that `release()`
+    resolves on its loop, so neither blocks the event loop nor polls. A freed
+    slot goes to the longest-waiting coroutine first.
+    """
+
+    def __init__(self, name: str, max_concurrent: int = LLM_MAX_CONCURRENCY, max_wait_ms: float = LLM_BULKHEAD_WAIT_MS):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_wait = max_wait_ms / 1000
+        self._available = max_concurrent
+        self._cond = threading.Condition()
+        self._waiters = deque()  # (loop, future) of coroutines waiting for a slot
+
+    def acquire(self) -> bool:
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._available > 0, timeout=self.max_wait):
+                return False
+            self._available -= 1
+            return True
+
+    async def aacquire(self) -> bool:
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            if self._available > 0 and not self._waiters:
+                self._available -= 1
+                return True
+            future = loop.create_future()
+            self._waiters.append((loop, future))
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.max_wait)
+            return True
+        except TimeoutError:
+            return self._withdraw(loop, future)
+        except asyncio.CancelledError:
+            if self._withdraw(loop, future):
+                self.release()
+            raise
+
+    def _withdraw(self, loop, future) -> bool:
+        """Stop waiting. True if the slot was granted first, so the caller holds it."""
+        with self._cond:
+            try:
+                self._waiters.remove((loop, future))
+            except ValueError:
+                pass  # Already handed a slot
+        return not future.cancel()
+
+    def _grant(self, future):
+        # Runs on the waiter's loop
+        if future.done():
+            self.release()  # The waiter gave up meanwhile: pass the slot on
+        else:
+            future.set_result(True)
+
+    def release(self):
+        with self._cond:
+            while self._waiters:
+                loop, future = self._waiters.popleft()
+                if future.cancelled() or loop.is_closed():
+                    continue
+                loop.call_soon_threadsafe(self._grant, future)
+                return
+            if self._available >= self.max_concurrent:
+                raise ValueError(f"Bulkhead {self.name} released more times than acquired")
+            self._available += 1
+            self._cond.notify()
+
+
+class ProviderGuard:
+    """Runs provider calls through a circuit breaker and a bulkhead."""
+
+    def __init__(self, provider: str, breaker: CircuitBreaker | None = None, bulkhead: Bulkhead | None = None):
+        self.provider = provider
+        self.breaker = breaker or CircuitBreaker(provider)
+        self.bulkhead = bulkhead or Bulkhead(provider)
+
+    def check(self):
+        """Fail fast if the provider's breaker is open."""
+        self.breaker.check()
+
+    def _on_error(self, error: Exception, duration: float):
+        if isinstance(error, DeadlineExceeded):
+            self.breaker.on_timeout()
+        else:
+            self.breaker.on_failure(error, duration)
+
+    def _saturated(self) -> ProviderUnavailableError:
+        self.breaker.on_abort()
+        return ProviderUnavailableError(self.provider, "rate_limited", "concurrency limit reached")
+
+    def call(self, func, *args):
+        """Run a blocking provider call."""
+        self.breaker.before_call()
+        if not self.bulkhead.acquire():
+            raise self._saturated()
+        start = time.monotonic()
+        try:
+            result = func(*args)
+        except Exception as e:
+            self._on_error(e, time.monotonic() - start)
+            raise
+        except BaseException:
+            self.breaker.on_abort()
+            raise
+        finally:
+            self.bulkhead.release()
+        self.breaker.on_success(time.monotonic() - start)
+        return result
+
+    async def acall(self, func, *args):
+        """Await a provider coroutine function."""
+        self.breaker.before_call()
+        if not await self.bulkhead.aacquire():
+            raise self._saturated()
+        start = time.monotonic()
+        try:
+            result = await func(*args)
+        except Exception as e:
+            self._on_error(e, time.monotonic() - start)
+            raise
+        except BaseException:
+            self.breaker.on_abort()
+            raise
+        finally:
+            self.bulkhead.release()
+        self.breaker.on_success(time.monotonic() - start)
+        return result
+
+    async def astream(self, func, *args):
+        """
+        Iterate a provider stream. The bulkhead slot is held for the whole
+        stream; latency for the slow-call check is time to first chunk.
+        """
+        self.breaker.before_call()
+        if not await self.bulkhead.aacquire():
+            raise self._saturated()
+        start = time.monotonic()
+        first_chunk = None
+        stream = func(*args)
+        try:
+            async for chunk in stream:
+                if first_chunk is None:
+                    first_chunk = time.monotonic() - start
+                yield chunk
+        except Exception as e:
+            self._on_error(e, time.monotonic() - start)
+            raise
+        except BaseException:
+            # Cancelled request or consumer stopped early
+            self.breaker.on_abort()
+            raise
+        finally:
+            await stream.aclose()
+            self.bulkhead.release()
+        self.breaker.on_success(first_chunk if first_chunk is not None else time.monotonic() - start)
@@ -6,14 +6,22 @@ Handles chat messages with RAG-based responses and onboarding nudges.
 """
 
 import os
+import json
+import time
+import asyncio
 from datetime import datetime
 from typing import Optional
 
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 from backend.pii import extract_email, extract_phone, mask_pii
 from backend.fallback import get_fallback_response
+from backend.deadline import Deadline
+from backend.metrics import observe_stage, REQUEST_SECONDS, REQUESTS, FALLBACKS
+from backend.slow_query_log import trace_request
+from backend.profiling import profile_request, PROFILE_ID_HEADER
 
 router = APIRouter()
 
@@ -63,12 +71,54 @@ def get_nudge_message(onboarding: OnboardingState) -> str:
 
 
 
+def detect_onboarding_info(message: str) -> dict:
+    """Detect name, email and phone in a message so the form can be pre-filled."""
+    detected_info = {}
+    email = extract_email(message)
+    phone = extract_phone(message)
+    
+    if email:
+        detected_info["email"] = email
+    if phone:
+        detected_info["phone"] = phone
+    
+    # Check for name (heuristic)
+    name_patterns = ["i'm ", "i am ", "my name is ", "call me "]
+    message_lower = message.lower()
+    for pattern in name_patterns:
+        if pattern in message_lower:
+            idx = message_lower.find(pattern) + len(pattern)
+            remainder = message[idx:].split()
+            potential_name = remainder[0].strip(".,!?") if remainder else ""
+            if potential_name and len(potential_name) > 1:
+                detected_info["name"] = potential_name.capitalize()
+                break
+    
+    return detected_info
+
+
+def record_request(endpoint: str, route: str, started: float):
+    """Count a finished chat request and how it was served."""
+    REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint, route=route)
+    REQUESTS.inc(endpoint=endpoint, route=route)
+    if route.startswith("fallback:"):
+        FALLBACKS.inc(type=route.split(":", 1)[1])
+    elif route in ("extractive", "unavailable", "error"):
+        FALLBACKS.inc(type=route)
+
+
+def format_sse(event: str, data) -> str:
+    """Format one Server-Sent Events frame with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
 class ChatRequest(BaseModel):
     """Chat request from frontend."""
     message: str
     session_id: str
     onboarding: OnboardingState = OnboardingState()
     message_count: int = 0  # Messages in this session
+    latency_budget_ms: Optional[float] = None  # Overrides CHAT_LATENCY_BUDGET_MS, capped at CHAT_MAX_LATENCY_BUDGET_MS
 
 class ChatResponse(BaseModel):
     """Chat response to frontend."""
@@ -76,67 +126,137 @@ class ChatResponse(BaseModel):
     sources: list[str] = []  # URLs of sources used
     detected_info: dict = {}  # Any PII detected for onboarding
     should_nudge: bool = False
+    route: str = "rag"  # Path that served the answer: intent:<name>, cache, rag, fallback:<type>, ...
 
 @router.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest, fast_request: Request):
+async def chat(request: ChatRequest, fast_request: Request, response: Response):
     """
     Handle a chat message.
     
     Flow:
     1. Check for PII in message (for onboarding)
     2. Mask PII before processing
-    3. Call RAGEngine for grounded answering
+    3. Call RAGEngine for grounded answering within the request's latency budget
     4. Add nudge if appropriate
+
+    Requests slower than SLOW_QUERY_THRESHOLD_MS are written to the
+    slow-query log when it is enabled. With profiling enabled, a request
+    carrying the admin X-Profile-Token header is profiled (see profiling.py).
     """
+    started = time.perf_counter()
+    deadline = Deadline.for_request(request.latency_budget_ms)
     message = request.message.strip()
     if not message:
         # Raise 400 which means bad request
         raise HTTPException(status_code=400, detail="Message cannot be empty")
     
     # Detect any PII for onboarding
-    detected_info = {}
-    email = extract_email(message)
-    phone = extract_phone(message)
-    
-    if email:
-        detected_info["email"] = email
-    if phone:
-        detected_info["phone"] = phone
-    
-    # Check for name (heuristic)
-    name_patterns = ["i'm ", "i am ", "my name is ", "call me "]
-    message_lower = message.lower()
-    for pattern in name_patterns:
-        if pattern in message_lower:
-            idx = message_lower.find(pattern) + len(pattern)
-            potential_name = message[idx:].split()[0].strip(".,!?")
-            if potential_name and len(potential_name) > 1:
-                detected_info["name"] = potential_name.capitalize()
-                break
-    
-    # Mask PII before processing
-    masked_message, pii_mapping = mask_pii(message)
+    detected_info = detect_onboarding_info(message)
     
-    # Use the new hybrid RAG engine
-    try:
+    slow_log = getattr(fast_request.app.state, "slow_query_log", None)
+    async with profile_request(fast_request.headers) as profiler:
+        with trace_request(slow_log, "chat", started) as trace:
+            # Mask PII before processing
+            with observe_stage("pii_masking"):
+                if profiler is None:
+                    masked_message, pii_mapping = mask_pii(message)
+                else:
+                    masked_message, pii_mapping = profiler.run(mask_pii, message)
         
-        rag = fast_request.app.state.rag_engine
-        result = rag.answer_query(masked_message)
-        response_text = result["response"]
-        sources = result["sources"]
-    except Exception as e:
-        print(f"Chat error: {e}")
-        response_text = get_fallback_response(message, "api_error")
-        sources = []
+            # Use the new hybrid RAG engine (async path keeps the event loop free during LLM calls)
+            try:
+                rag = fast_request.app.state.rag_engine
+                if profiler is None:
+                    result = await rag.aanswer_query(masked_message, deadline=deadline)
+                else:
+                    # Sync path on a worker thread, so the profile holds this request and nothing else
+                    result = await asyncio.to_thread(profiler.run, rag.answer_query, masked_message, deadline)
+                response_text = result["response"]
+                sources = result["sources"]
+                route = result.get("route", "rag")
+            except Exception as e:
+                print(f"Chat error: {e}")
+                # An open circuit breaker says whether the provider is rate limiting or failing
+                error_type = getattr(e, "fallback_type", "api_error")
+                response_text = get_fallback_response(message, error_type)
+                sources = []
+                route = f"fallback:{error_type}"
+            if trace is not None:
+                trace.query, trace.route = masked_message, route
     
     # Check if we should add onboarding nudge
     should_nudge = should_nudge_onboarding(request.message_count, request.onboarding)
     if should_nudge:
         response_text += get_nudge_message(request.onboarding)
     
+    if profiler is not None:
+        response.headers[PROFILE_ID_HEADER] = profiler.profile_id
+    record_request("chat", route, started)
     return ChatResponse(
         response=response_text,
         sources=sources,
         detected_info=detected_info,
-        should_nudge=should_nudge
+        should_nudge=should_nudge,
+        route=route
+    )
+
+
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest, fast_request: Request):
+    """
+    Handle a chat message, streaming the answer as Server-Sent Events.
+    
+    Events, in order:
+    - `sources`: source URLs of the reranked context (sent before the first token)
+    - `token`: incremental answer text
+    - `nudge`: onboarding nudge text, if appropriate
+    - `done`: detected onboarding info, whether a nudge was sent and the
+      path that served the answer (`route`)
+
+    The latency budget bounds the time to the first token.
+    """
+    started = time.perf_counter()
+    deadline = Deadline.for_request(request.latency_budget_ms)
+    message = request.message.strip()
+    if not message:
+        raise HTTPException(status_code=400, detail="Message cannot be empty")
+    
+    detected_info = detect_onboarding_info(message)
+    with observe_stage("pii_masking"):
+        masked_message, pii_mapping = mask_pii(message)
+    should_nudge = should_nudge_onboarding(request.message_count, request.onboarding)
+    rag = fast_request.app.state.rag_engine
+    slow_log = getattr(fast_request.app.state, "slow_query_log", None)
+
+    async def event_stream():
+        sent_tokens = False
+        route = "rag"
+        with trace_request(slow_log, "chat_stream", started) as trace:
+            try:
+                async for event in rag.astream_answer(masked_message, deadline=deadline):
+                    if event["event"] == "route":
+                        # Reported once, in the done event
+                        route = event["data"]
+                        continue
+                    sent_tokens = sent_tokens or event["event"] == "token"
+                    yield format_sse(event["event"], event["data"])
+            except Exception as e:
+                print(f"Chat stream error: {e}")
+                if not sent_tokens:
+                    error_type = getattr(e, "fallback_type", "api_error")
+                    route = f"fallback:{error_type}"
+                    yield format_sse("sources", [])
+                    yield format_sse("token", get_fallback_response(message, error_type))
+            if trace is not None:
+                trace.query, trace.route = masked_message, route
+        
+        if should_nudge:
+            yield format_sse("nudge", get_nudge_message(request.onboarding))
+        yield format_sse("done", {"detected_info": detected_info, "should_nudge": should_nudge, "route": route})
+        record_request("chat_stream", route, started)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
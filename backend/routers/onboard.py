@@ -2,13 +2,16 @@
 """
 Onboarding Endpoint
 ====================
-Handles user onboarding - validates and stores user information locally.
+Handles user onboarding - validates and stores user information locally
+(see `user_store` for the user repository, `app.state.user_repository`),
+and per-session chat history (`history_store`, `app.state.chat_history`).
+Writes go through `app.state.writer` (`write_behind`): chat history is
+buffered and written behind, users are written through in a worker thread,
+so handlers never wait on disk on the event loop.
 """
 import os
-import json
 from datetime import datetime
-from pathlib import Path
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel, field_validator
 
 from backend.pii import validate_email, validate_phone
@@ -17,26 +20,8 @@ from dotenv import load_dotenv
 load_dotenv()
 COMPANY_NAME = os.getenv('COMPANY_NAME')
 
-# Paths
-BACKEND_DIR = Path(__file__).parent.parent
-PROJECT_ROOT = BACKEND_DIR.parent
-DATA_DIR = PROJECT_ROOT / "data"
-USERS_FILE = DATA_DIR / "users.json"
-CHAT_HISTORY_FILE = DATA_DIR / "chat_history.json"
-
 router = APIRouter()
 
-def ensure_data_files():
-    """Ensure data files exist."""
-    DATA_DIR.mkdir(exist_ok=True)
-    
-    if not USERS_FILE.exists():
-        USERS_FILE.write_text("[]", encoding="utf-8")
-    
-    if not CHAT_HISTORY_FILE.exists():
-        CHAT_HISTORY_FILE.write_text("{}", encoding="utf-8")
-
-
 class OnboardingRequest(BaseModel):
     """Onboarding request with user details."""
     name: str
@@ -86,29 +71,22 @@ class ValidationErrorResponse(BaseModel):
     errors: dict[str, str]
 
 
-def load_users() -> list[dict]:
-    """Load existing users from file."""
-    ensure_data_files()
-    try:
-        return json.loads(USERS_FILE.read_text(encoding="utf-8"))
-    except:
-        return []
-
-
-def save_users(users: list[dict]):
-    """Save users to file."""
-    ensure_data_files()
-    USERS_FILE.write_text(json.dumps(users, indent=2), encoding="utf-8")
-
-
 def generate_user_id(email: str) -> str:
     """Generate a simple user ID from email."""
     import hashlib
     return hashlib.md5(email.encode()).hexdigest()[:12]
 
 
+def welcome_back(user: dict) -> OnboardingResponse:
+    return OnboardingResponse(
+        success=True,
+        message=f"Welcome back, {user['name']}! You're already registered.",
+        user_id=user["id"]
+    )
+
+
 @router.post("/onboard")
-async def onboard_user(request: OnboardingRequest):
+async def onboard_user(request: OnboardingRequest, fast_request: Request):
     """
     Complete user onboarding.
     
@@ -116,18 +94,6 @@ async def onboard_user(request: OnboardingRequest):
     Returns user ID on success.
     """
     try:
-        # Load existing users
-        users = load_users()
-        
-        # Check if email already registered
-        existing = next((u for u in users if u["email"] == request.email), None)
-        if existing:
-            return OnboardingResponse(
-                success=True,
-                message=f"Welcome back, {existing['name']}! You're already registered.",
-                user_id=existing["id"]
-            )
-        
         # Create new user
         user_id = generate_user_id(request.email)
         new_user = {
@@ -140,8 +106,10 @@ async def onboard_user(request: OnboardingRequest):
             "source": "chat_onboarding"
         }
         
-        users.append(new_user)
-        save_users(users)
+        # Insert-if-absent in one transaction: a concurrent onboarding (any worker) may have won the race
+        stored, created = await fast_request.app.state.writer.add_user(new_user)
+        if not created:
+            return welcome_back(stored)
         
         return OnboardingResponse(
             success=True,
@@ -162,38 +130,29 @@ class ChatHistoryEntry(BaseModel):
 
 
 @router.post("/chat-history/{session_id}")
-async def save_chat_history(session_id: str, messages: list[ChatHistoryEntry]):
-    """Save chat history for a session."""
-    ensure_data_files()
-    
-    try:
-        history = json.loads(CHAT_HISTORY_FILE.read_text(encoding="utf-8"))
-    except:
-        history = {}
-    
-    history[session_id] = [msg.model_dump() for msg in messages]
-    
-    CHAT_HISTORY_FILE.write_text(json.dumps(history, indent=2), encoding="utf-8")
-    
+async def save_chat_history(session_id: str, messages: list[ChatHistoryEntry], fast_request: Request):
+    """Replace the chat history of a session."""
+    await fast_request.app.state.writer.replace_history(session_id, [msg.model_dump() for msg in messages])
+    return {"success": True, "session_id": session_id}
+
+
+@router.post("/chat-history/{session_id}/messages")
+async def append_chat_history(session_id: str, messages: list[ChatHistoryEntry], fast_request: Request):
+    """Append new messages to the chat history of a session."""
+    await fast_request.app.state.writer.append_history(session_id, [msg.model_dump() for msg in messages])
     return {"success": True, "session_id": session_id}
 
 
 @router.get("/chat-history/{session_id}")
-async def get_chat_history(session_id: str):
+async def get_chat_history(session_id: str, fast_request: Request):
     """Get chat history for a session."""
-    ensure_data_files()
-    
-    try:
-        history = json.loads(CHAT_HISTORY_FILE.read_text(encoding="utf-8"))
-        return {"messages": history.get(session_id, [])}
-    except:
-        return {"messages": []}
+    return {"messages": await fast_request.app.state.writer.get_history(session_id)}
 
 
 @router.get("/users")
-async def list_users():
+async def list_users(fast_request: Request):
     """List all onboarded users (for demo purposes)."""
-    users = load_users()
+    users = await fast_request.app.state.writer.list_users()
     # Return sanitized list (no full email/phone)
     return {
         "count": len(users),
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Slow-Query Log
+===============
+Opt-in JSONL log of chat requests slower than a latency threshold.
+
+While a request runs, a `RequestTrace` in a context variable collects
+per-stage timings (the same stages as the metrics), the retrieved and
+reranked chunk ids with their scores, every LLM call's token usage and
+the path that served the answer. When the request finishes, traces over
+`SLOW_QUERY_THRESHOLD_MS` are handed to a background thread that appends
+them, one JSON object per line, to a size-rotated file. Requests never
+wait on disk I/O: if the writer falls behind, records are dropped.
+
+Queries are logged after PII masking. With the log disabled no trace is
+created and the hooks below are no-ops.
+"""
+
+import os
+import json
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+
+from dotenv import load_dotenv
+load_dotenv()
+
+PROJECT_ROOT = Path(__file__).parent.parent
+SLOW_QUERY_LOG_ENABLED = os.getenv("SLOW_QUERY_LOG_ENABLED", "false").lower() == "true"
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "3000"))
+SLOW_QUERY_LOG_PATH = Path(os.getenv("SLOW_QUERY_LOG_PATH", str(PROJECT_ROOT / "data" / "slow_queries.jsonl")))
+SLOW_QUERY_LOG_MAX_MB = float(os.getenv("SLOW_QUERY_LOG_MAX_MB", "10"))
+SLOW_QUERY_LOG_BACKUPS = int(os.getenv("SLOW_QUERY_LOG_BACKUPS", "5"))
+# Records waiting for the writer; beyond this they are dropped
+SLOW_QUERY_QUEUE_SIZE = 1000
+
+_current_trace: ContextVar["RequestTrace | None"] = ContextVar("request_trace", default=None)
+
+
+def doc_summary(doc) -> dict:
+    """Chunk id plus whichever retrieval scores the document carries."""
+    summary = {"id": doc.metadata.get("id")}
+    for key, value in doc.metadata.items():
+        if key.endswith("_score"):
+            summary[key] = round(float(value), 6)
+    return summary
+
+
+class RequestTrace:
+    """What happened during one chat request."""
+
+    def __init__(self, endpoint: str, query: str = "", started: float | None = None):
+        self.endpoint = endpoint
+        self.query = query
+        self.route = None
+        self.started = time.perf_counter() if started is None else started
+        self.stages = {}
+        self.retrieved = []
+        self.reranked = []
+        self.rerank_decision = None
+        self.llm_calls = []
+        self._lock = threading.Lock()  # Retrieval legs report from worker threads
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def add_stage(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds * 1000
+
+    def to_record(self, total_ms: float) -> dict:
+        prompt_tokens = sum(call.get("input_tokens", 0) for call in self.llm_calls)
+        return {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "endpoint": self.endpoint,
+            "query": self.query,
+            "total_ms": round(total_ms, 1),
+            "route": self.route,
+            "stages_ms": {stage: round(ms, 1) for stage, ms in self.stages.items()},
+            "retrieved": self.retrieved,
+            "rerank_decision": self.rerank_decision,
+            "reranked": self.reranked,
+            "llm_calls": self.llm_calls,
+            "prompt_tokens": prompt_tokens,
+        }
+
+
+def current_trace() -> RequestTrace | None:
+    return _current_trace.get()
+
+
+def trace_stage(stage: str, seconds: float):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_stage(stage, seconds)
+
+
+def trace_documents(kind: str, docs: list):
+    """Record the `retrieved` or `reranked` documents of the current request."""
+    trace = _current_trace.get()
+    if trace is not None:
+        setattr(trace, kind, [doc_summary(doc) for doc in docs])
+
+
+def trace_rerank_decision(decision: str):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.rerank_decision = decision
+
+
+def trace_llm_call(provider: str, model: str, prompt: str, usage: dict | None = None, cached: bool = False):
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    call = {"provider": provider, "model": model, "prompt_chars": len(prompt), "cached": cached}
+    for direction in ("input", "output"):
+        tokens = (usage or {}).get(f"{direction}_tokens")
+        if tokens:
+            call[f"{direction}_tokens"] = tokens
+    with trace._lock:
+        trace.llm_calls.append(call)
+
+
+class SlowQueryLog:
+    """Background JSONL writer with size-based rotation (path, path.1, ... path.N)."""
+
+    def __init__(self, path: Path = SLOW_QUERY_LOG_PATH, threshold_ms: float = SLOW_QUERY_THRESHOLD_MS,
+                 max_bytes: int = int(SLOW_QUERY_LOG_MAX_MB * 1024 * 1024), backups: int = SLOW_QUERY_LOG_BACKUPS,
+                 queue_size: int = SLOW_QUERY_QUEUE_SIZE):
+        self.path = Path(path)
+        self.threshold_ms = threshold_ms
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.dropped = 0
+        self.written = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="slow-query-log", daemon=True)
+        self._thread.start()
+
+    @contextmanager
+    def trace(self, endpoint: str, started: float | None = None):
+        """Collect a trace for the enclosed request and submit it when the block exits."""
+        trace = RequestTrace(endpoint, started=started)
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            _current_trace.reset(token)
+            self.submit(trace)
+
+    def submit(self, trace: RequestTrace):
+        """Queue a finished trace if it was slow. Never blocks."""
+        total_ms = trace.elapsed_ms()
+        if total_ms < self.threshold_ms:
+            return
+        try:
+            self._queue.put_nowait(trace.to_record(total_ms))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        file = open(self.path, "a", encoding="utf-8")
+        try:
+            while True:
+                record = self._queue.get()
+                if record is None:
+                    break
+                file.write(json.dumps(record) + "\n")
+                self.written += 1
+                if self._queue.empty():
+                    file.flush()
+                if file.tell() >= self.max_bytes:
+                    file.close()
+                    self._rotate()
+                    file = open(self.path, "a", encoding="utf-8")
+        except Exception as e:
+            print(f"Slow-query log writer stopped: {e}")
+        finally:
+            file.close()
+
+    def _rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            older = self.path.with_name(f"{self.path.name}.{i}")
+            if older.exists():
+                older.replace(self.path.with_name(f"{self.path.name}.{i + 1}"))
+        if self.backups > 0:
+            self.path.replace(self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink()
+
+    def close(self, timeout: float = 5):
+        """Write out queued records and stop the writer."""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+
+@contextmanager
+def trace_request(log: SlowQueryLog | None, endpoint: str, started: float | None = None):
+    """`log.trace(...)`, or a no-op yielding None when the log is disabled."""
+    if log is None:
+        yield None
+        return
+    with log.trace(endpoint, started) as trace:
+        yield trace
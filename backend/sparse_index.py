@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Inverted-Index BM25
+====================
+Sparse retrieval with a precomputed, persisted inverted index.
+
+rank-bm25 scores every document in pure Python on each query and
+re-tokenizes the corpus on every startup. Here the corpus is tokenized
+once, and each posting stores its final BM25 impact
+(idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl))), so a query
+only sums the postings of its own terms with NumPy. Query cost grows with
+the candidate postings, not with the corpus size.
+"""
+
+import math
+import re
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from backend.vector_index import with_score
+
+INDEX_FILENAME = "bm25_index.npz"
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase word tokenizer shared by indexing and querying."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class InvertedBM25Index:
+    """
+    BM25 (Okapi) over a CSR-style inverted index.
+
+    Postings for term t live in `doc_ids[indptr[t]:indptr[t + 1]]` with the
+    matching precomputed impacts in `weights`.
+    """
+
+    def __init__(self, documents: list[Document], vocabulary: dict[str, int], indptr: np.ndarray,
+                 doc_ids: np.ndarray, weights: np.ndarray, k1: float = 1.5, b: float = 0.75):
+        self.documents = documents
+        self.vocabulary = vocabulary
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.k1 = k1
+        self.b = b
+
+    @classmethod
+    def from_documents(cls, documents: list[Document], k1: float = 1.5, b: float = 0.75) -> "InvertedBM25Index":
+        """Tokenize the corpus once and precompute every posting's BM25 impact."""
+        vocabulary: dict[str, int] = {}
+        term_postings: list[dict[int, int]] = []
+        doc_lengths = np.zeros(len(documents), dtype=np.float32)
+
+        for doc_id, doc in enumerate(documents):
+            tokens = tokenize(doc.page_content)
+            doc_lengths[doc_id] = len(tokens)
+            for token in tokens:
+                term_id = vocabulary.setdefault(token, len(vocabulary))
+                if term_id == len(term_postings):
+                    term_postings.append({})
+                postings = term_postings[term_id]
+                postings[doc_id] = postings.get(doc_id, 0) + 1
+
+        n_docs = len(documents)
+        avg_length = float(doc_lengths.mean()) if n_docs else 0.0
+        # Per-document length normalization, precomputed once
+        length_norms = k1 * (1 - b + b * doc_lengths / avg_length) if avg_length else np.full(n_docs, k1, dtype=np.float32)
+
+        indptr = np.zeros(len(term_postings) + 1, dtype=np.int64)
+        for term_id, postings in enumerate(term_postings):
+            indptr[term_id + 1] = indptr[term_id] + len(postings)
+
+        doc_ids = np.empty(int(indptr[-1]), dtype=np.int32)
+        term_freqs = np.empty(int(indptr[-1]), dtype=np.float32)
+        idf = np.empty(len(term_postings), dtype=np.float32)
+        for term_id, postings in enumerate(term_postings):
+            start, end = indptr[term_id], indptr[term_id + 1]
+            doc_ids[start:end] = list(postings.keys())
+            term_freqs[start:end] = list(postings.values())
+            # Non-negative IDF so very common terms never subtract from a score
+            df = len(postings)
+            idf[term_id] = math.log((n_docs - df + 0.5) / (df + 0.5) + 1.0)
+
+        posting_idf = np.repeat(idf, np.diff(indptr))
+        weights = posting_idf * term_freqs * (k1 + 1) / (term_freqs + length_norms[doc_ids])
+        return cls(documents, vocabulary, indptr, doc_ids, weights.astype(np.float32), k1=k1, b=b)
+
+    @property
+    def nbytes(self) -> int:
+        return self.indptr.nbytes + self.doc_ids.nbytes + self.weights.nbytes
+
+    def save(self, path: Path, fingerprint: str = ""):
+        """Persist the index with the ids and manifest fingerprint it was built for."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        tmp_path = path.with_suffix(".tmp.npz")
+        np.savez(
+            tmp_path,
+            terms=np.array(terms, dtype=str),
+            indptr=self.indptr,
+            doc_ids=self.doc_ids,
+            weights=self.weights,
+            params=np.array([self.k1, self.b]),
+            ids=np.array([doc.metadata["id"] for doc in self.documents]),
+            fingerprint=np.array(fingerprint),
+        )
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path, documents: list[Document], fingerprint: str = "",
+             k1: float = 1.5, b: float = 0.75) -> Optional["InvertedBM25Index"]:
+        """Load a persisted index if it was built for the same documents and parameters, else None."""
+        path = Path(path)
+        if not path.exists():
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if str(data["fingerprint"]) != fingerprint:
+                    return None
+                if not np.allclose(data["params"], [k1, b]):
+                    return None
+                if [str(i) for i in data["ids"]] != [doc.metadata["id"] for doc in documents]:
+                    return None
+                vocabulary = {str(term): i for i, term in enumerate(data["terms"])}
+                return cls(documents, vocabulary, data["indptr"], data["doc_ids"], data["weights"], k1=k1, b=b)
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def search(self, query: str, k: int = 10) -> list[tuple[Document, float]]:
+        """Return the top-k (document, BM25 score) pairs, best first."""
+        term_ids = [self.vocabulary[token] for token in tokenize(query) if token in self.vocabulary]
+        if not term_ids or k <= 0:
+            return []
+
+        # Gather only the postings of the query terms (repeated terms count again, as in rank-bm25)
+        candidate_ids = np.concatenate([self.doc_ids[self.indptr[t]:self.indptr[t + 1]] for t in term_ids])
+        candidate_weights = np.concatenate([self.weights[self.indptr[t]:self.indptr[t + 1]] for t in term_ids])
+        unique_ids, inverse = np.unique(candidate_ids, return_inverse=True)
+        scores = np.bincount(inverse, weights=candidate_weights).astype(np.float32)
+
+        k = min(k, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        # Stable tie-break on document order keeps results deterministic
+        top = top[np.lexsort((unique_ids[top], -scores[top]))]
+        return [(self.documents[unique_ids[i]], float(scores[i])) for i in top]
+
+
+class InvertedBM25Retriever(BaseRetriever):
+    """LangChain retriever over an InvertedBM25Index."""
+
+    index: Any
+    k: int = 10
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        return [with_score(doc, "sparse_score", score) for doc, score in self.index.search(query, k=self.k)]
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+User Store
+===========
+Repository for onboarded users, selected with `USER_STORE_BACKEND`:
+
+- `sqlite` (default): one SQLite database under `data/`, in WAL mode with a
+  busy timeout so every uvicorn worker can share it. Email has a unique
+  index, so the "already registered?" lookup and the insert are O(log n)
+  and happen in one `BEGIN IMMEDIATE` transaction: concurrent onboardings
+  of the same email create exactly one user, and none are lost. Users from
+  the legacy `data/users.json` are imported once, on first open (the JSON
+  file is left in place).
+- `json`: the original single JSON file, rewritten on every insert. Kept
+  for small demos and for rolling back; guarded by a lock within a
+  process only.
+"""
+
+import os
+import json
+import sqlite3
+import threading
+from pathlib import Path
+
+from dotenv import load_dotenv
+load_dotenv()
+
+PROJECT_ROOT = Path(__file__).parent.parent
+USER_STORE_BACKEND = os.getenv("USER_STORE_BACKEND", "sqlite")
+USER_DB_PATH = Path(os.getenv("USER_DB_PATH", str(PROJECT_ROOT / "data" / "users.sqlite")))
+USERS_JSON_PATH = PROJECT_ROOT / "data" / "users.json"
+
+USER_FIELDS = ("id", "name", "email", "phone", "session_id", "created_at", "source")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL,
+    phone TEXT,
+    session_id TEXT,
+    created_at TEXT NOT NULL,
+    source TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email ON users(email);
+CREATE TABLE IF NOT EXISTS user_store_meta (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class UserRepository:
+    """Interface for user storage. Users are dicts with USER_FIELDS."""
+    name = "base"
+
+    def get_by_email(self, email: str) -> dict | None:
+        raise NotImplementedError
+
+    def add_if_absent(self, user: dict) -> tuple[dict, bool]:
+        """Insert the user unless the email is taken. Returns (stored user, created)."""
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def list_users(self) -> list[dict]:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class JsonUserRepository(UserRepository):
+    """All users in one JSON list (the original storage)."""
+    name = "json"
+
+    def __init__(self, path: Path = USERS_JSON_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def _load(self) -> list[dict]:
+        try:
+            return json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return []
+
+    def get_by_email(self, email: str) -> dict | None:
+        return next((u for u in self._load() if u["email"] == email), None)
+
+    def add_if_absent(self, user: dict) -> tuple[dict, bool]:
+        with self._lock:
+            users = self._load()
+            existing = next((u for u in users if u["email"] == user["email"]), None)
+            if existing:
+                return existing, False
+            users.append(user)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.write_text(json.dumps(users, indent=2), encoding="utf-8")
+            return user, True
+
+    def count(self) -> int:
+        return len(self._load())
+
+    def list_users(self) -> list[dict]:
+        return self._load()
+
+
+class SqliteUserRepository(UserRepository):
+    """Users in SQLite with a unique email index, safe for concurrent threads and processes."""
+    name = "sqlite"
+
+    def __init__(self, path: Path = USER_DB_PATH, legacy_json: Path | None = USERS_JSON_PATH):
+        self.path = Path(path)
+        self._local = threading.local()
+        # Every thread's connection, so close() can close them all
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection().executescript(SCHEMA)
+        if legacy_json is not None:
+            self.migrate_json(Path(legacy_json))
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared across threads; keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def migrate_json(self, path: Path) -> int:
+        """Import users from the legacy JSON file, once per database. Returns the number imported."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            done = conn.execute("SELECT 1 FROM user_store_meta WHERE name = 'migrated_json'").fetchone()
+            imported = 0
+            if not done:
+                users = json.loads(path.read_text(encoding="utf-8")) if path.exists() else []
+                for user in users:
+                    imported += conn.execute(
+                        f"INSERT OR IGNORE INTO users({', '.join(USER_FIELDS)}) VALUES ({', '.join('?' * len(USER_FIELDS))})",
+                        tuple(user.get(field) for field in USER_FIELDS)
+                    ).rowcount
+                conn.execute("INSERT INTO user_store_meta(name, value) VALUES ('migrated_json', ?)", (str(path),))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if imported:
+            print(f"Migrated {imported} users from {path} to {self.path}")
+        return imported
+
+    def get_by_email(self, email: str) -> dict | None:
+        row = self._connection().execute("SELECT * FROM users WHERE email = ?", (email,)).fetchone()
+        return dict(row) if row else None
+
+    def add_if_absent(self, user: dict) -> tuple[dict, bool]:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            created = conn.execute(
+                f"INSERT INTO users({', '.join(USER_FIELDS)}) VALUES ({', '.join('?' * len(USER_FIELDS))}) "
+                "ON CONFLICT(email) DO NOTHING",
+                tuple(user.get(field) for field in USER_FIELDS)
+            ).rowcount == 1
+            stored = user if created else dict(
+                conn.execute("SELECT * FROM users WHERE email = ?", (user["email"],)).fetchone()
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return stored, created
+
+    def count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def list_users(self) -> list[dict]:
+        return [dict(row) for row in self._connection().execute("SELECT * FROM users ORDER BY created_at")]
+
+    def close(self):
+        """Close the connections of every thread that used the repository (app shutdown)."""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+
+def get_user_repository(name: str | None = None) -> UserRepository:
+    """Build the configured user repository (`sqlite` or `json`)."""
+    name = name or USER_STORE_BACKEND
+    if name == "sqlite":
+        return SqliteUserRepository(USER_DB_PATH, legacy_json=USERS_JSON_PATH)
+    if name == "json":
+        return JsonUserRepository(USERS_JSON_PATH)
+    raise ValueError(f"Unknown user store backend: {name}")
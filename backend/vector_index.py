@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+NumPy Vector Index
+===================
+Exact in-memory dense retrieval for small and medium knowledge bases.
+
+All chunk embeddings are L2-normalized and stored in one contiguous float32
+matrix, so a query is a single matrix-vector product (cosine similarity)
+followed by `argpartition` for the top-k. At a few thousand chunks this is
+sub-millisecond and needs far less memory than a Chroma/SQLite stack.
+"""
+
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+INDEX_FILENAME = "numpy_index.npz"
+
+# Metadata fields that can be used in search filters
+FILTER_FIELDS = ("id", "source_url", "category", "title")
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize rows into a contiguous float32 matrix (zero rows stay zero)."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(vectors / norms, dtype=np.float32)
+
+
+def with_score(doc: Document, key: str, score: float) -> Document:
+    """Copy a document with a retrieval score attached (indexed docs are shared, never mutate them)."""
+    return Document(page_content=doc.page_content, metadata={**doc.metadata, key: score})
+
+
+class NumpyVectorIndex:
+    """Exact cosine-similarity index over a float32 embedding matrix."""
+
+    def __init__(self, documents: list[Document], embeddings: np.ndarray):
+        if len(documents) != len(embeddings):
+            raise ValueError(f"Got {len(documents)} documents but {len(embeddings)} embeddings")
+        self.documents = documents
+        self.matrix = normalize_rows(embeddings) if len(documents) else np.zeros((0, 0), dtype=np.float32)
+        # Column-wise metadata for vectorized filtering
+        self.metadata_columns = {
+            field: np.array([doc.metadata.get(field) for doc in documents], dtype=object)
+            for field in FILTER_FIELDS
+        }
+
+    @classmethod
+    def from_documents(cls, documents: list[Document], embedder: Embeddings) -> "NumpyVectorIndex":
+        """Embed documents and build the index."""
+        vectors = embedder.embed_documents([doc.page_content for doc in documents]) if documents else []
+        return cls(documents, np.asarray(vectors, dtype=np.float32))
+
+    @property
+    def nbytes(self) -> int:
+        return self.matrix.nbytes
+
+    def save(self, path: Path, fingerprint: str = ""):
+        """Persist the embedding matrix alongside the ids and manifest fingerprint it was built for."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        ids = np.array([doc.metadata["id"] for doc in self.documents])
+        tmp_path = path.with_suffix(".tmp.npz")
+        np.savez(tmp_path, matrix=self.matrix, ids=ids, fingerprint=np.array(fingerprint))
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path, documents: list[Document], fingerprint: str = "") -> Optional["NumpyVectorIndex"]:
+        """Load a persisted index if it was built for the same documents, else None."""
+        path = Path(path)
+        if not path.exists():
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if str(data["fingerprint"]) != fingerprint:
+                    return None
+                ids = [str(i) for i in data["ids"]]
+                if ids != [doc.metadata["id"] for doc in documents]:
+                    return None
+                return cls(documents, data["matrix"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def filter_mask(self, filter: dict) -> np.ndarray:
+        """
+        Boolean mask of documents matching a metadata filter.
+
+        Filter values may be a single value or a list/tuple/set of allowed values,
+        e.g. {"category": ["services/tax-credits", "faq"]}.
+        """
+        mask = np.ones(len(self.documents), dtype=bool)
+        for field, allowed in filter.items():
+            if field not in self.metadata_columns:
+                raise ValueError(f"Cannot filter on metadata field: {field}")
+            values = self.metadata_columns[field]
+            if isinstance(allowed, (list, tuple, set)):
+                mask &= np.isin(values, list(allowed))
+            else:
+                mask &= values == allowed
+        return mask
+
+    def search(self, query_vector, k: int = 5, filter: Optional[dict] = None) -> list[tuple[Document, float]]:
+        """Return the top-k (document, cosine similarity) pairs, best first."""
+        if not self.documents or k <= 0:
+            return []
+
+        query = normalize_rows(np.asarray(query_vector, dtype=np.float32))[0]
+        scores = self.matrix @ query
+
+        candidates = None
+        if filter:
+            candidates = np.flatnonzero(self.filter_mask(filter))
+            if candidates.size == 0:
+                return []
+            scores = scores[candidates]
+
+        k = min(k, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        rows = candidates[top] if candidates is not None else top
+        return [(self.documents[row], float(scores[i])) for row, i in zip(rows, top)]
+
+
+class NumpyRetriever(BaseRetriever):
+    """LangChain retriever over a NumpyVectorIndex."""
+
+    index: Any
+    embeddings: Any
+    k: int = 5
+    filter: Optional[dict] = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        query_vector = self.embeddings.embed_query(query)
+        return [
+            with_score(doc, "dense_score", score)
+            for doc, score in self.index.search(query_vector, k=self.k, filter=self.filter)
+        ]
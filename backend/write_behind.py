@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Write-Behind Persistence
+=========================
+Takes chat history writes off the request path.
+
+Handlers hand their write to `WriteBehindWriter` and return as soon as it
+is buffered in memory; a background task on the event loop flushes the
+buffer to the chat history store (in a worker thread) every
+`WRITE_BEHIND_FLUSH_INTERVAL_MS`, or as soon as `WRITE_BEHIND_BATCH_SIZE`
+keys are pending. Updates to the same key are coalesced while they wait:
+appends to a session are concatenated into one append, and a replace
+drops the session's earlier pending writes.
+
+Onboarding is not buffered: it needs the answer of the repository's
+transactional insert-if-absent (another worker may have registered the
+email first), so it is written through, in a worker thread.
+
+The buffer holds at most `WRITE_BEHIND_MAX_PENDING` keys; beyond that,
+writers wait for the next flush instead of growing memory. Reads in the
+same process see pending writes; only a read of a session whose writes
+are being flushed at that moment waits for that batch. A failed write is
+put back in front of newer ones and retried on the next flush, up to
+`WRITE_BEHIND_MAX_RETRIES` times. `close()` (app shutdown) drains the
+buffer. Acknowledged writes can be lost if the process dies before the
+next flush; with `WRITE_BEHIND_ENABLED=false` every write is made before
+the response (still in a worker thread, not on the event loop).
+"""
+
+import os
+import asyncio
+
+from dotenv import load_dotenv
+load_dotenv()
+
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "true").lower() == "true"
+WRITE_BEHIND_FLUSH_INTERVAL_MS = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL_MS", "200"))
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "100"))
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "10000"))
+WRITE_BEHIND_MAX_RETRIES = int(os.getenv("WRITE_BEHIND_MAX_RETRIES", "3"))
+
+
+class PendingHistory:
+    """Coalesced writes for one session: an optional full replace, then appended messages."""
+
+    def __init__(self, replace: list[dict] | None = None, appended: list[dict] | None = None):
+        self.replace = replace
+        self.appended = appended or []
+        self.attempts = 0
+
+    def then(self, newer: "PendingHistory") -> "PendingHistory":
+        """These writes followed by `newer` ones, as one."""
+        if newer.replace is not None:
+            return newer
+        merged = PendingHistory(self.replace, self.appended + newer.appended)
+        merged.attempts = self.attempts
+        return merged
+
+    def apply_to(self, messages: list[dict]) -> list[dict]:
+        return (list(self.replace) if self.replace is not None else messages) + self.appended
+
+
+class WriteBehindWriter:
+    """Buffers chat history writes and flushes them in batches from a background task; users are written through."""
+
+    def __init__(self, users, history, enabled: bool = WRITE_BEHIND_ENABLED,
+                 flush_interval_ms: float = WRITE_BEHIND_FLUSH_INTERVAL_MS,
+                 batch_size: int = WRITE_BEHIND_BATCH_SIZE, max_pending: int = WRITE_BEHIND_MAX_PENDING,
+                 max_retries: int = WRITE_BEHIND_MAX_RETRIES):
+        self.users = users
+        self.history = history
+        self.enabled = enabled
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.pending = {}  # session_id -> PendingHistory
+        self.inflight = {}  # session_id -> PendingHistory, the batch being written now
+        self.flushed = 0
+        self.dropped = 0
+        self._task = None
+        self._closing = False
+        self._wake = asyncio.Event()
+        self._space = asyncio.Event()
+        self._batch_done = asyncio.Event()
+        self._batch_done.set()
+        self._reading = {}  # session_id -> reads in progress; their pending writes stay out of the next batch
+
+    # --- Buffer ------------------------------------------------------------
+
+    def _ensure_started(self):
+        # Started lazily so the task runs on the serving event loop
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _put(self, key: str, write: PendingHistory):
+        self._ensure_started()
+        while key not in self.pending and len(self.pending) >= self.max_pending:
+            self._space.clear()
+            self._wake.set()
+            await self._space.wait()  # Backpressure: wait for the next flush
+        self.pending[key] = self.pending[key].then(write) if key in self.pending else write
+        if len(self.pending) >= self.batch_size:
+            self._wake.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+            if self._closing and not self.pending:
+                return
+
+    async def flush(self):
+        """Write everything pending now, in a worker thread (one batch at a time)."""
+        while self.inflight:
+            await self._batch_done.wait()
+        # Sessions being read keep their writes pending until the read is done (see get_history)
+        batch = {key: write for key, write in self.pending.items() if key not in self._reading}
+        if not batch:
+            return
+        for key in batch:
+            del self.pending[key]
+        self.inflight = batch
+        self._batch_done.clear()
+        try:
+            failed = await asyncio.to_thread(self._write_batch, batch)
+        finally:
+            self.inflight = {}
+            self._batch_done.set()
+        self.flushed += len(batch) - len(failed)
+        for key, write in failed.items():
+            write.attempts += 1
+            if write.attempts > self.max_retries:
+                self.dropped += 1
+                print(f"Write-behind: dropping history write for {key} after {write.attempts} attempts")
+                continue
+            # Older than anything buffered since the batch was taken
+            self.pending[key] = write.then(self.pending[key]) if key in self.pending else write
+        self._space.set()
+
+    def _write_batch(self, batch: dict) -> dict:
+        """Apply a batch; returns the writes that failed."""
+        failed = {}
+        for key, write in batch.items():
+            try:
+                self._write(key, write)
+            except Exception as e:
+                print(f"Write-behind: history write for {key} failed: {e}")
+                failed[key] = write
+        return failed
+
+    def _write(self, session_id: str, write: PendingHistory):
+        if write.replace is not None:
+            self.history.replace(session_id, write.replace + write.appended)
+        else:
+            self.history.append(session_id, write.appended)
+
+    async def close(self):
+        """Drain the buffer and stop the flush task (app shutdown)."""
+        self._closing = True
+        if self._task is not None:
+            self._wake.set()
+            await self._task
+            self._task = None
+
+    # --- Chat history ------------------------------------------------------
+
+    async def append_history(self, session_id: str, messages: list[dict]):
+        if not self.enabled:
+            return await asyncio.to_thread(self.history.append, session_id, messages)
+        await self._put(session_id, PendingHistory(appended=list(messages)))
+
+    async def replace_history(self, session_id: str, messages: list[dict]):
+        if not self.enabled:
+            return await asyncio.to_thread(self.history.replace, session_id, messages)
+        await self._put(session_id, PendingHistory(replace=list(messages)))
+
+    async def get_history(self, session_id: str) -> list[dict]:
+        pending = self.pending.get(session_id)
+        if pending is not None and pending.replace is not None:
+            return pending.apply_to([])
+        # Only a read of a session that is being written right now waits for that batch; other reads never do
+        while session_id in self.inflight:
+            await self._batch_done.wait()
+        # No await between the check and here: until the read is done this session's writes stay pending,
+        # so the store holds exactly the writes older than what `pending` has
+        self._reading[session_id] = self._reading.get(session_id, 0) + 1
+        try:
+            messages = await asyncio.to_thread(self.history.get, session_id)
+        finally:
+            self._reading[session_id] -= 1
+            if not self._reading[session_id]:
+                del self._reading[session_id]
+        pending = self.pending.get(session_id)
+        return pending.apply_to(messages) if pending is not None else messages
+
+    # --- Users --------------------------------------------------------------
+
+    async def add_user(self, user: dict) -> tuple[dict, bool]:
+        """Insert-if-absent, written through: `created` is the repository's answer, across all workers."""
+        return await asyncio.to_thread(self.users.add_if_absent, user)
+
+    async def list_users(self) -> list[dict]:
+        return await asyncio.to_thread(self.users.list_users)
@@ -17,7 +17,9 @@ const state = {
         phone: null,
         completed: false
     },
-    messages: []
+    messages: [],
+    savedMessages: 0,  // How many of `messages` the server already has
+    historySave: Promise.resolve()  // Saves run one after another, each from where the last one ended
 };
 
 function generateSessionId() {
@@ -183,6 +185,17 @@ function showError(message) {
 function addMessage(role, content, sources = []) {
     state.messages.push({ role, content, timestamp: new Date().toISOString() });
 
+    const contentDiv = createMessageElement(role);
+
+    // Parse content (support basic markdown-like formatting)
+    contentDiv.innerHTML = formatMessage(content);
+
+    // Add sources if available
+    renderSources(contentDiv, sources);
+    scrollToBottom();
+}
+
+function createMessageElement(role) {
     const messageDiv = document.createElement('div');
     messageDiv.className = `message ${role}`;
 
@@ -193,10 +206,14 @@ function addMessage(role, content, sources = []) {
     const contentDiv = document.createElement('div');
     contentDiv.className = 'message-content';
 
-    // Parse content (support basic markdown-like formatting)
-    contentDiv.innerHTML = formatMessage(content);
+    messageDiv.appendChild(avatarDiv);
+    messageDiv.appendChild(contentDiv);
 
-    // Add sources if available
+    elements.chatMessages.appendChild(messageDiv);
+    return contentDiv;
+}
+
+function renderSources(contentDiv, sources) {
     if (sources.length > 0) {
         const sourcesDiv = document.createElement('div');
         sourcesDiv.className = 'message-sources';
@@ -205,12 +222,6 @@ function addMessage(role, content, sources = []) {
         ).join(', ');
         contentDiv.appendChild(sourcesDiv);
     }
-
-    messageDiv.appendChild(avatarDiv);
-    messageDiv.appendChild(contentDiv);
-
-    elements.chatMessages.appendChild(messageDiv);
-    scrollToBottom();
 }
 
 function formatMessage(text) {
@@ -249,7 +260,7 @@ async function sendMessage(message) {
     showTyping(true);
 
     try {
-        const response = await fetch('/api/chat', {
+        const response = await fetch('/api/chat/stream', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
@@ -260,31 +271,10 @@ async function sendMessage(message) {
             })
         });
 
-        const data = await response.json();
-
-        // Hide typing indicator
-        showTyping(false);
-
         if (response.ok) {
-            // Add assistant response
-            addMessage('assistant', data.response, data.sources || []);
-
-            // Update onboarding state if info was detected
-            if (data.detected_info) {
-                if (data.detected_info.name && !state.onboarding.name) {
-                    elements.nameInput.value = data.detected_info.name;
-                    updateOnboardingField('name', data.detected_info.name, true);
-                }
-                if (data.detected_info.email && !state.onboarding.email) {
-                    elements.emailInput.value = data.detected_info.email;
-                    updateOnboardingField('email', data.detected_info.email, validators.email(data.detected_info.email));
-                }
-                if (data.detected_info.phone && !state.onboarding.phone) {
-                    elements.phoneInput.value = data.detected_info.phone;
-                    updateOnboardingField('phone', data.detected_info.phone, validators.phone(data.detected_info.phone));
-                }
-            }
+            await readChatStream(response);
         } else {
+            showTyping(false);
             addMessage('assistant', 'I apologize, but I encountered an error. Please try again.');
         }
     } catch (error) {
@@ -299,14 +289,99 @@ async function sendMessage(message) {
     }
 }
 
-async function saveChatHistory() {
+async function readChatStream(response) {
+    // Parse Server-Sent Events from the streamed response body
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let contentDiv = null;
+    let text = '';
+    let sources = [];
+
+    const render = () => {
+        if (!contentDiv) {
+            // First token: replace the typing indicator with the message bubble
+            showTyping(false);
+            contentDiv = createMessageElement('assistant');
+        }
+        contentDiv.innerHTML = formatMessage(text);
+        scrollToBottom();
+    };
+
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const frame = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let event = 'message';
+            let data = '';
+            for (const line of frame.split('\n')) {
+                if (line.startsWith('event: ')) event = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            }
+            const payload = data ? JSON.parse(data) : null;
+
+            if (event === 'sources') {
+                sources = payload || [];
+            } else if (event === 'token' || event === 'nudge') {
+                text += payload;
+                render();
+            } else if (event === 'done') {
+                applyDetectedInfo(payload.detected_info);
+            }
+        }
+    }
+
+    if (!contentDiv) render();
+    showTyping(false);
+    renderSources(contentDiv, sources);
+    scrollToBottom();
+    state.messages.push({ role: 'assistant', content: text, timestamp: new Date().toISOString() });
+}
+
+function applyDetectedInfo(detectedInfo) {
+    // Update onboarding state if info was detected
+    if (!detectedInfo) return;
+    if (detectedInfo.name && !state.onboarding.name) {
+        elements.nameInput.value = detectedInfo.name;
+        updateOnboardingField('name', detectedInfo.name, true);
+    }
+    if (detectedInfo.email && !state.onboarding.email) {
+        elements.emailInput.value = detectedInfo.email;
+        updateOnboardingField('email', detectedInfo.email, validators.email(detectedInfo.email));
+    }
+    if (detectedInfo.phone && !state.onboarding.phone) {
+        elements.phoneInput.value = detectedInfo.phone;
+        updateOnboardingField('phone', detectedInfo.phone, validators.phone(detectedInfo.phone));
+    }
+}
+
+function saveChatHistory() {
+    // Queued behind any save still in flight, so two saves never send the same messages
+    state.historySave = state.historySave.then(sendUnsavedMessages);
+    return state.historySave;
+}
+
+async function sendUnsavedMessages() {
+    // Send only the messages added since the last successful save
+    const start = state.savedMessages;
+    const pending = state.messages.slice(start);
+    if (pending.length === 0) return;
     try {
-        await fetch(`/api/chat-history/${state.sessionId}`, {
+        const response = await fetch(`/api/chat-history/${state.sessionId}/messages`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify(state.messages)
+            body: JSON.stringify(pending)
         });
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+        state.savedMessages = start + pending.length;
     } catch (error) {
+        // savedMessages is unchanged, so the next save retries them
         console.error('Failed to save chat history:', error);
     }
 }
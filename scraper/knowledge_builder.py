@@ -1,6 +1,5 @@
 import os
 from datetime import datetime
-from sentence_transformers import SentenceTransformer
 from sklearn.metrics.pairwise import cosine_similarity
 from dotenv import load_dotenv
 load_dotenv()
@@ -9,8 +8,18 @@ COMPANY_NAME = os.getenv("COMPANY_NAME")
 SIMILARITY_THRESHOLD = 0.6 # similarity threshold for semantic chunking
 MAX_CHARS = 1500  # hard limit
 MIN_CHUNK_CHARS = 250 # Ensure chunks have context
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
 
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+_embedding_model = None
+
+
+def get_embedding_model():
+    """Load the sentence-transformers model on first use (keeps imports of this module cheap)."""
+    global _embedding_model
+    if _embedding_model is None:
+        from sentence_transformers import SentenceTransformer
+        _embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    return _embedding_model
 
 def categorize_page(url: str) -> str:
     """Determine category based on URL."""
@@ -57,7 +66,7 @@ def create_knowledge_chunks(page: dict, start_id: int) -> tuple[list[dict], int]
     page_title = page["title"]
     page_category = categorize_page(page["url"])
 
-    embeddings = embedding_model.encode(sentences)
+    embeddings = get_embedding_model().encode(sentences)
 
     chunks = []
     current_chunk = [sentences[0]]
@@ -118,6 +127,14 @@ def build_knowledge_base(pages: list[dict]) -> dict:
         "metadata": {
             "generated_at": datetime.now().isoformat(),
             "total_pages": len(pages),
-            "total_chunks": len(all_chunks)
+            "total_chunks": len(all_chunks),
+            # Recorded so the backend index manifest changes when chunking does
+            "chunker": {
+                "method": "semantic",
+                "embedding_model": EMBEDDING_MODEL_NAME,
+                "similarity_threshold": SIMILARITY_THRESHOLD,
+                "max_chars": MAX_CHARS,
+                "min_chunk_chars": MIN_CHUNK_CHARS
+            }
         }
     }
\ No newline at end of file
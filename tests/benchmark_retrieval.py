@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Retrieval Benchmark
+====================
+Offline benchmark of the dense, sparse and hybrid retrievers.
+
+Builds a labeled query set from `data/knowledge.json` (queries derived
+from a chunk's content and title, each labeled with the chunk `id`, plus
+any chunks with identical content), then for every index backend
+combination and every `RAGEngine.get_retriever` mode measures:
+
+- recall@k and MRR against the labels,
+- p50 / p95 query latency,
+- Python heap peak while building the indexes and while querying
+  (tracemalloc, measured in a separate pass so latency is not skewed),
+  plus the in-memory size of the NumPy / BM25 indexes.
+
+Results are written as JSON; `--compare` diffs a run against an earlier
+results file and exits non-zero on regressions. No LLM keys are needed:
+the engine is initialized without LLM clients. `--embeddings fake` uses
+deterministic fake embeddings for a quick smoke run without the
+sentence-transformers model (dense numbers are then meaningless).
+
+Usage:
+    python tests/benchmark_retrieval.py
+    python tests/benchmark_retrieval.py --queries 100 --compare data/benchmarks/baseline.json
+"""
+
+import sys
+import argparse
+import json
+import math
+import random
+import re
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from backend.rag import RAGEngine, DENSE_BACKENDS
+
+SPARSE_BACKENDS = ("inverted", "rank_bm25")
+MODES = ("dense", "sparse", "hybrid")
+K_VALUES = (1, 3, 5, 10)
+MEMORY_SAMPLE_QUERIES = 20
+# Regressions flagged by --compare
+MAX_RECALL_DROP = 0.02
+MAX_MRR_DROP = 0.02
+MAX_P95_INCREASE = 0.25
+
+STOPWORDS = frozenset("""
+a about above after again all also an and any are as at be because been before being below between both but by
+can could did do does doing down during each few for from further had has have having here how i if in into is it
+its itself just more most no nor not now of off on once only or other our out over own same should so some such
+than that the their them then there these they this those through to too under until up very was we were what
+when where which while who whom why will with you your yours
+""".split())
+WORD_RE = re.compile(r"[a-z0-9][a-z0-9&'-]+")
+
+
+def tokenize(text: str) -> list[str]:
+    return [word for word in WORD_RE.findall(text.lower()) if len(word) > 2 and word not in STOPWORDS]
+
+
+def build_query_set(chunks: list[dict], max_queries: int = 200, seed: int = 13) -> list[dict]:
+    """
+    Derive labeled queries from chunks. Each sampled chunk gives a
+    `sentence` query (a sentence from its content) and a `keywords` query
+    (its title plus its most distinctive terms by TF-IDF). `relevant` holds
+    the chunk id and the ids of chunks with identical content.
+    """
+    document_frequency = Counter()
+    for chunk in chunks:
+        document_frequency.update(set(tokenize(chunk["content"])))
+    same_content = {}
+    for chunk in chunks:
+        same_content.setdefault(chunk["content"].strip(), []).append(chunk["id"])
+
+    candidates = [chunk for chunk in chunks if len(tokenize(chunk["content"])) >= 12]
+    rng = random.Random(seed)
+    sampled = rng.sample(candidates, min(len(candidates), max(1, max_queries // 2)))
+
+    queries = []
+    for chunk in sampled:
+        relevant = same_content[chunk["content"].strip()]
+        sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+", chunk["content"]) if len(s.split()) >= 6]
+        if sentences:
+            words = rng.choice(sentences).split()[:20]
+            queries.append({"query": " ".join(words), "kind": "sentence", "relevant": relevant})
+        terms = Counter(tokenize(chunk["content"]))
+        scored = sorted(terms, key=lambda t: (-terms[t] * math.log(len(chunks) / document_frequency[t]), t))
+        keywords = " ".join(scored[:5])
+        queries.append({"query": f"{chunk['title']} {keywords}", "kind": "keywords", "relevant": relevant})
+    return queries[:max_queries]
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0..100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def first_relevant_rank(retrieved_ids: list[str], relevant: list[str]) -> int | None:
+    for rank, doc_id in enumerate(retrieved_ids, start=1):
+        if doc_id in relevant:
+            return rank
+    return None
+
+
+def score_ranks(ranks: list[int | None], k_values=K_VALUES) -> dict:
+    """recall@k and MRR from the rank of the first relevant result per query (None: not retrieved)."""
+    n = len(ranks) or 1
+    scores = {f"recall@{k}": sum(1 for r in ranks if r is not None and r <= k) / n for k in k_values}
+    scores["mrr"] = sum(1 / r for r in ranks if r is not None) / n
+    return scores
+
+
+def evaluate_retriever(retriever, queries: list[dict], k_values=K_VALUES) -> dict:
+    """Quality and latency of one retriever over the query set."""
+    retriever.invoke(queries[0]["query"])  # Warm caches and lazy state
+    ranks, latencies = [], []
+    for item in queries:
+        start = time.perf_counter()
+        docs = retriever.invoke(item["query"])
+        latencies.append((time.perf_counter() - start) * 1000)
+        ranks.append(first_relevant_rank([doc.metadata.get("id") for doc in docs], item["relevant"]))
+    result = {key: round(value, 4) for key, value in score_ranks(ranks, k_values).items()}
+    result.update({
+        "queries": len(queries),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "mean_ms": round(sum(latencies) / len(latencies), 3),
+    })
+    return result
+
+
+def query_peak_kib(retriever, queries: list[dict]) -> float:
+    """Largest Python heap growth during a single query, over a sample of queries."""
+    peak = 0
+    tracemalloc.start()
+    try:
+        for item in queries[:MEMORY_SAMPLE_QUERIES]:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            retriever.invoke(item["query"])
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+    return round(peak / 1024, 1)
+
+
+def make_embeddings(kind: str, model_name: str):
+    """The raw embedding model. Not RAGEngine's micro-batching wrapper: its batch window would add to every
+    dense query and its recent-query cache would let later modes reuse vectors from the dense pass."""
+    if kind == "fake":
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        return DeterministicFakeEmbedding(size=384)
+    from langchain_huggingface import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(model_name=model_name)
+
+
+def benchmark_config(knowledge_file: Path, index_dir: Path, dense_backend: str, sparse_backend: str,
+                     queries: list[dict], embeddings: str) -> dict:
+    """Build one engine configuration and measure every retriever mode."""
+    engine = RAGEngine(knowledge_file, index_dir, dense_backend=dense_backend, sparse_backend=sparse_backend)
+    engine.answer_cache = None
+    engine.embeddings = make_embeddings(embeddings, engine.embedding_model)
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        engine.initialize(llms=False)
+        build_seconds = time.perf_counter() - start
+        build_peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    result = {
+        "dense_backend": dense_backend,
+        "sparse_backend": sparse_backend,
+        "build_seconds": round(build_seconds, 3),
+        "build_peak_mib": round(build_peak / 1024 / 1024, 2),
+        "index_bytes": {},
+        "modes": {},
+    }
+    for mode, retriever in (("dense", engine.dense_retriever), ("sparse", engine.sparse_retriever)):
+        index = getattr(retriever, "index", None)
+        if index is not None and hasattr(index, "nbytes"):
+            result["index_bytes"][mode] = int(index.nbytes)
+    try:
+        for mode in MODES:
+            retriever = engine.get_retriever(mode)
+            scores = evaluate_retriever(retriever, queries)
+            scores["query_peak_kib"] = query_peak_kib(retriever, queries)
+            result["modes"][mode] = scores
+            print(f"  {dense_backend}/{sparse_backend} {mode:6s} recall@5={scores['recall@5']:.3f} "
+                  f"mrr={scores['mrr']:.3f} p50={scores['p50_ms']:.2f}ms p95={scores['p95_ms']:.2f}ms")
+    finally:
+        engine.shutdown()
+    return result
+
+
+def compare_results(current: dict, baseline: dict) -> list[str]:
+    """Regressions of `current` against `baseline`, as readable lines."""
+    regressions = []
+    previous = {(c["dense_backend"], c["sparse_backend"]): c for c in baseline.get("configs", [])}
+    for config in current["configs"]:
+        key = (config["dense_backend"], config["sparse_backend"])
+        if key not in previous:
+            continue
+        for mode, scores in config["modes"].items():
+            before = previous[key]["modes"].get(mode)
+            if before is None:
+                continue
+            label = f"{key[0]}/{key[1]} {mode}"
+            for metric in (f"recall@{k}" for k in K_VALUES):
+                if metric in before and before[metric] - scores[metric] > MAX_RECALL_DROP:
+                    regressions.append(f"{label}: {metric} {before[metric]:.3f} -> {scores[metric]:.3f}")
+            if before["mrr"] - scores["mrr"] > MAX_MRR_DROP:
+                regressions.append(f"{label}: mrr {before['mrr']:.3f} -> {scores['mrr']:.3f}")
+            if before["p95_ms"] > 0 and scores["p95_ms"] > before["p95_ms"] * (1 + MAX_P95_INCREASE):
+                regressions.append(f"{label}: p95 {before['p95_ms']:.2f}ms -> {scores['p95_ms']:.2f}ms")
+    return regressions
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=project_root,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def available_backends(backends: list[str]) -> list[str]:
+    """Drop backends whose optional packages are not installed."""
+    available = []
+    for backend in backends:
+        module = {"chroma": "langchain_chroma", "rank_bm25": "rank_bm25"}.get(backend)
+        try:
+            if module:
+                __import__(module)
+            available.append(backend)
+        except ImportError:
+            print(f"Skipping {backend}: {module} is not installed")
+    return available
+
+
+def run_benchmark(knowledge_file: Path, dense_backends: list[str], sparse_backends: list[str],
+                  max_queries: int = 200, seed: int = 13, embeddings: str = "hf", index_root: Path | None = None) -> dict:
+    with open(knowledge_file, "r", encoding="utf-8") as f:
+        kb = json.load(f)
+    queries = build_query_set(kb.get("chunks", []), max_queries=max_queries, seed=seed)
+    print(f"{len(queries)} labeled queries from {len(kb.get('chunks', []))} chunks")
+
+    configs = []
+    with tempfile.TemporaryDirectory(prefix="retrieval-bench-") as tmp:
+        root = Path(index_root or tmp)
+        for dense_backend in available_backends(dense_backends):
+            for sparse_backend in available_backends(sparse_backends):
+                # A fresh index directory per configuration, so build times include embedding
+                index_dir = root / f"{dense_backend}-{sparse_backend}"
+                configs.append(benchmark_config(knowledge_file, index_dir, dense_backend, sparse_backend,
+                                                queries, embeddings))
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "knowledge_file": str(knowledge_file),
+        "kb_generated_at": kb.get("metadata", {}).get("generated_at"),
+        "embeddings": embeddings,
+        "seed": seed,
+        "queries": len(queries),
+        "query_kinds": dict(Counter(item["kind"] for item in queries)),
+        "configs": configs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline retrieval benchmark (recall@k, MRR, latency, memory)")
+    parser.add_argument("--knowledge-file", type=Path, default=project_root / "data" / "knowledge.json")
+    parser.add_argument("--queries", type=int, default=200, help="Maximum number of labeled queries")
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--dense-backends", default=",".join(DENSE_BACKENDS))
+    parser.add_argument("--sparse-backends", default=",".join(SPARSE_BACKENDS))
+    parser.add_argument("--embeddings", choices=["hf", "fake"], default="hf")
+    parser.add_argument("--output", type=Path, default=None, help="Results JSON (default: data/benchmarks/retrieval-<time>.json)")
+    parser.add_argument("--compare", type=Path, default=None, help="Earlier results JSON to check for regressions")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.knowledge_file, args.dense_backends.split(","), args.sparse_backends.split(","),
+                            max_queries=args.queries, seed=args.seed, embeddings=args.embeddings)
+    output = args.output or project_root / "data" / "benchmarks" / f"retrieval-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"Results written to {output}")
+
+    if args.compare:
+        regressions = compare_results(results, json.loads(args.compare.read_text()))
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,496 @@
+#!/usr/bin/env python3
+"""
+Load Test
+==========
+Drives the FastAPI app at a target request rate with the LLMs replaced
+by in-process stubs, to size pods without spending API credits.
+
+`run` (the default) starts the app in a child process (`serve`), waits
+for `/api/ready`, then sends an open-loop mix of `/api/chat`,
+`/api/onboard` and `/api/chat-history/{session_id}` requests at the
+target RPS (with linear ramp-up and a client-side concurrency cap) and
+reports throughput, p50/p95/p99 latency and error rates per endpoint,
+plus the server's event-loop lag.
+
+In `serve` mode the real app runs under uvicorn with:
+- `ChatGroq` / `ChatOpenAI` replaced by `StubChatModel`s with
+  configurable time to first token, token rate and error rate (the rest
+  of the call path — LLM client, breaker, bulkhead — is the real one),
+- optionally fake embeddings (`--fake-embeddings`) when the
+  sentence-transformers model is not available,
+- indexes, onboarding and chat history files in a temporary directory,
+  so nothing under `data/` or `chroma_db/` is touched,
+- the LLM call cache and semantic answer cache off unless `--caches`,
+- an event-loop lag monitor at `GET /loadtest/lag`.
+
+Latency is measured from each request's scheduled send time, so time
+spent waiting for a free client slot counts (no coordinated omission).
+
+Usage:
+    python tests/load_test.py --rps 20 --duration 60 --ramp-up 10
+    python tests/load_test.py --rps 50 --llm-latency-ms 800 --llm-error-rate 0.02 --output load.json
+    python tests/load_test.py --url http://localhost:8000 --rps 5   # An already running server
+"""
+
+import os
+import sys
+import argparse
+import asyncio
+import json
+import math
+import random
+import subprocess
+import tempfile
+import time
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, Iterator, AsyncIterator
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+import httpx
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+DEFAULT_MIX = "chat=70,onboard=10,history_get=10,history_append=8,history_post=2"
+ANSWER_TEXT = (
+    "We help businesses identify and claim tax credits, raise capital and plan for growth. "
+    "Our advisors review your situation, explain the options that apply and handle the filings, "
+    "so you can focus on running the company. Would you like to know more about a specific service?"
+)
+SMALL_TALK = ["hi", "hello!", "thanks", "thank you so much", "bye", "what services do you offer?", "how can I contact you?"]
+QUESTION_TEMPLATES = [
+    "Tell me about {title}",
+    "What do you offer for {title}?",
+    "How does {title} work?",
+    "Can you explain {title} for a small business?",
+]
+LAG_INTERVAL = 0.05  # Seconds between event-loop lag samples
+
+
+class StubProviderError(Exception):
+    """Injected provider failure; looks like an HTTP 503 to the breaker."""
+    status_code = 503
+
+
+class StubChatModel(BaseChatModel):
+    """Chat model that answers a fixed text after a latency, at a token rate, failing at an error rate."""
+
+    response: str = ANSWER_TEXT
+    latency_ms: float = 300.0  # Time to first token
+    tokens_per_second: float = 80.0
+    error_rate: float = 0.0
+    seed: int | None = None
+    _rng: random.Random = PrivateAttr(default=None)
+
+    def model_post_init(self, __context: Any):
+        self._rng = random.Random(self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _tokens(self) -> list[str]:
+        words = self.response.split(" ")
+        return [word + " " for word in words[:-1]] + words[-1:]
+
+    def _fail_maybe(self):
+        if self.error_rate and self._rng.random() < self.error_rate:
+            raise StubProviderError("Injected stub LLM failure")
+
+    def _usage(self, messages: list[BaseMessage]) -> dict:
+        input_tokens = sum(len(str(message.content)) for message in messages) // 4
+        output_tokens = len(self._tokens())
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+    def _duration(self) -> float:
+        return self.latency_ms / 1000 + len(self._tokens()) / self.tokens_per_second
+
+    def _result(self, messages: list[BaseMessage]) -> ChatResult:
+        message = AIMessage(content=self.response, usage_metadata=self._usage(messages))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self._fail_maybe()
+        time.sleep(self._duration())
+        return self._result(messages)
+
+    async def _agenerate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self._fail_maybe()
+        await asyncio.sleep(self._duration())
+        return self._result(messages)
+
+    def _stream(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        self._fail_maybe()
+        time.sleep(self.latency_ms / 1000)
+        for token in self._tokens():
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+            time.sleep(1 / self.tokens_per_second)
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(messages)))
+
+    async def _astream(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        self._fail_maybe()
+        await asyncio.sleep(self.latency_ms / 1000)
+        for token in self._tokens():
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+            await asyncio.sleep(1 / self.tokens_per_second)
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(messages)))
+
+
+class LoopLagMonitor:
+    """Samples how late the event loop wakes up from a short sleep."""
+
+    def __init__(self, interval: float = LAG_INTERVAL, max_samples: int = 100_000):
+        self.interval = interval
+        self.samples = deque(maxlen=max_samples)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - start - self.interval) * 1000)
+
+    def report(self) -> dict:
+        samples = list(self.samples)
+        return {
+            "samples": len(samples),
+            "p50_ms": round(percentile(samples, 50), 2),
+            "p95_ms": round(percentile(samples, 95), 2),
+            "p99_ms": round(percentile(samples, 99), 2),
+            "max_ms": round(max(samples, default=0.0), 2),
+        }
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0..100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(q / 100 * len(ordered))) - 1]
+
+
+# --- Server side -------------------------------------------------------------
+
+def build_app(args, workdir: Path):
+    """The real app with stub LLMs, temporary data paths and the lag monitor."""
+    if not args.caches:
+        os.environ["LLM_CACHE_ENABLED"] = "false"
+        os.environ["ANSWER_CACHE_ENABLED"] = "false"
+    os.environ["RAG_BACKGROUND_WARMUP"] = "true"
+
+    import backend.main as main
+    import backend.user_store as user_store
+    import backend.history_store as history_store
+    from backend.rag import RAGEngine, RERANK_MODEL, ANSWER_MODEL
+    from backend.llm_client import LLMClient
+    from backend.rerankers import get_reranker, RERANKER
+    from backend.resilience import ProviderGuard, LLM_BREAKER_ENABLED
+
+    class StubbedRAGEngine(RAGEngine):
+        def load_models(self, llms: bool = True):
+            if llms and self.answer_client is None:
+                self.rerank_llm = StubChatModel(response="1, 2, 3, 4", latency_ms=args.rerank_latency_ms,
+                                                tokens_per_second=args.tokens_per_second, error_rate=args.llm_error_rate)
+                self.answer_llm = StubChatModel(latency_ms=args.llm_latency_ms, tokens_per_second=args.tokens_per_second,
+                                                error_rate=args.llm_error_rate)
+                self.rerank_client = LLMClient(self.rerank_llm, provider="groq", model=RERANK_MODEL,
+                                               guard=ProviderGuard("groq") if LLM_BREAKER_ENABLED else None)
+                self.answer_client = LLMClient(self.answer_llm, provider="openai", model=ANSWER_MODEL,
+                                               guard=ProviderGuard("openai") if LLM_BREAKER_ENABLED else None)
+                self.reranker = get_reranker(RERANKER, llm_client=self.rerank_client, executor=self.executor)
+            if args.fake_embeddings and self.embeddings is None:
+                from langchain_core.embeddings import DeterministicFakeEmbedding
+                self.embeddings = DeterministicFakeEmbedding(size=384)
+            super().load_models(llms=llms)
+
+    main.RAGEngine = StubbedRAGEngine
+    main.CHROMA_DIR = workdir / "index"
+    user_store.USER_DB_PATH = workdir / "users.sqlite"
+    user_store.USERS_JSON_PATH = workdir / "users.json"
+    history_store.CHAT_HISTORY_DB_PATH = workdir / "chat_history.sqlite"
+    history_store.CHAT_HISTORY_JSON_PATH = workdir / "chat_history.json"
+
+    app = main.app
+    app_lifespan = app.router.lifespan_context
+    monitor = LoopLagMonitor()
+
+    @asynccontextmanager
+    async def lifespan_with_monitor(app):
+        async with app_lifespan(app) as state:
+            task = asyncio.create_task(monitor.run())
+            try:
+                yield state
+            finally:
+                task.cancel()
+
+    app.router.lifespan_context = lifespan_with_monitor
+
+    @app.get("/loadtest/lag")
+    async def loop_lag(reset: bool = False):
+        report = monitor.report()
+        if reset:
+            monitor.samples.clear()
+        return report
+
+    return app
+
+
+def serve(args):
+    import uvicorn
+
+    with tempfile.TemporaryDirectory(prefix="load-test-") as tmp:
+        app = build_app(args, Path(tmp))
+        uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+# --- Client side -------------------------------------------------------------
+
+def parse_mix(mix: str) -> dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("chat", "onboard", "history_get", "history_append", "history_post"):
+            raise ValueError(f"Unknown endpoint in mix: {name}")
+        weights[name] = float(weight)
+    return weights
+
+
+def load_questions(knowledge_file: Path, rng: random.Random, count: int = 200) -> list[str]:
+    """Domain questions built from knowledge base page titles."""
+    titles = ["our services"]
+    if knowledge_file.exists():
+        chunks = json.loads(knowledge_file.read_text(encoding="utf-8")).get("chunks", [])
+        titles = sorted({chunk["title"].split("|")[0].strip() for chunk in chunks if chunk.get("title")}) or titles
+    return [rng.choice(QUESTION_TEMPLATES).format(title=rng.choice(titles)) for _ in range(count)]
+
+
+class RequestFactory:
+    """Builds the next request of the mix: domain questions, popular repeats, small talk and onboarding."""
+
+    def __init__(self, weights: dict[str, float], questions: list[str], rng: random.Random):
+        self.names = list(weights)
+        self.weights = [weights[name] for name in self.names]
+        self.questions = questions
+        self.popular = questions[:5]
+        self.rng = rng
+        self.sequence = 0
+
+    def chat_message(self) -> str:
+        roll = self.rng.random()
+        if roll < 0.15:
+            return self.rng.choice(SMALL_TALK)
+        if roll < 0.40:
+            return self.rng.choice(self.popular)  # Repeats, as real traffic has
+        return self.rng.choice(self.questions)
+
+    def next(self) -> tuple[str, str, str, Any]:
+        """(endpoint name, method, path, json body)."""
+        self.sequence += 1
+        session_id = f"load-{self.rng.randrange(1000)}"
+        name = self.rng.choices(self.names, weights=self.weights)[0]
+        if name == "chat":
+            body = {"message": self.chat_message(), "session_id": session_id, "message_count": self.rng.randrange(1, 8)}
+            return name, "POST", "/api/chat", body
+        if name == "onboard":
+            user = self.rng.randrange(5000)
+            body = {"name": f"Load User {user}", "email": f"load{user}@example.com",
+                    "phone": f"(555) {100 + user % 900:03d}-{user % 10000:04d}", "session_id": session_id}
+            return name, "POST", "/api/onboard", body
+        if name == "history_append":
+            messages = [{"role": role, "content": f"{role} message {self.sequence}", "timestamp": "2024-01-01T00:00:00"}
+                        for role in ("user", "assistant")]
+            return name, "POST", f"/api/chat-history/{session_id}/messages", messages
+        if name == "history_post":
+            messages = [{"role": role, "content": f"{role} message {i}", "timestamp": "2024-01-01T00:00:00"}
+                        for i, role in enumerate(["user", "assistant"] * self.rng.randint(1, 5))]
+            return name, "POST", f"/api/chat-history/{session_id}", messages
+        return name, "GET", f"/api/chat-history/{session_id}", None
+
+
+def schedule(rps: float, duration: float, ramp_up: float) -> list[float]:
+    """Send times (seconds from start): rate grows linearly to `rps` over `ramp_up`, then holds."""
+    times, t = [], 0.0
+    while True:
+        rate = rps if ramp_up <= 0 or t >= ramp_up else max(rps * t / ramp_up, rps * 0.05)
+        t += 1 / rate
+        if t >= duration:
+            return times
+        times.append(t)
+
+
+async def drive(base_url: str, factory: RequestFactory, send_times: list[float], concurrency: int,
+                timeout: float) -> list[dict]:
+    """Send requests at the scheduled times; returns one result per request."""
+    results = []
+    slots = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+
+        async def one(scheduled: float, name: str, method: str, path: str, body):
+            async with slots:
+                try:
+                    response = await client.request(method, path, json=body)
+                    status = response.status_code
+                    route = response.json().get("route") if name == "chat" and status == 200 else None
+                except Exception as e:
+                    status, route = type(e).__name__, None
+            results.append({"endpoint": name, "status": status, "route": route,
+                            "latency_ms": (loop.time() - start - scheduled) * 1000, "finished": loop.time() - start})
+
+        tasks = []
+        for scheduled in send_times:
+            delay = start + scheduled - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(one(scheduled, *factory.next())))
+        await asyncio.gather(*tasks)
+    return results
+
+
+def summarize(results: list[dict], duration: float) -> dict:
+    """Throughput, latency percentiles, error rates and status codes per endpoint and overall."""
+    def stats(rows: list[dict]) -> dict:
+        latencies = [row["latency_ms"] for row in rows]
+        errors = [row for row in rows if row["status"] != 200]
+        return {
+            "requests": len(rows),
+            "throughput_rps": round(len(rows) / duration, 2) if duration else 0.0,
+            "p50_ms": round(percentile(latencies, 50), 1),
+            "p95_ms": round(percentile(latencies, 95), 1),
+            "p99_ms": round(percentile(latencies, 99), 1),
+            "error_rate": round(len(errors) / len(rows), 4) if rows else 0.0,
+            "statuses": dict(Counter(str(row["status"]) for row in rows)),
+        }
+
+    summary = {"overall": stats(results), "endpoints": {}}
+    for name in sorted({row["endpoint"] for row in results}):
+        summary["endpoints"][name] = stats([row for row in results if row["endpoint"] == name])
+    routes = Counter(row["route"] for row in results if row["route"])
+    if routes:
+        # Answered with 200 but not by the normal path: canned fallbacks, extractive answers, errors
+        degraded = sum(count for route, count in routes.items()
+                       if route.startswith("fallback:") or route in ("extractive", "unavailable", "error"))
+        summary["chat_routes"] = dict(routes)
+        summary["chat_degraded_rate"] = round(degraded / sum(routes.values()), 4)
+    return summary
+
+
+def print_report(report: dict):
+    print(f"\n{'endpoint':14s} {'requests':>8s} {'rps':>7s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s} {'errors':>7s}")
+    rows = list(report["summary"]["endpoints"].items()) + [("overall", report["summary"]["overall"])]
+    for name, row in rows:
+        print(f"{name:14s} {row['requests']:8d} {row['throughput_rps']:7.2f} {row['p50_ms']:8.1f} "
+              f"{row['p95_ms']:8.1f} {row['p99_ms']:8.1f} {row['error_rate']:7.2%}")
+    if "chat_routes" in report["summary"]:
+        print(f"chat routes: {report['summary']['chat_routes']} (degraded {report['summary']['chat_degraded_rate']:.2%})")
+    lag = report.get("event_loop_lag")
+    if lag:
+        print(f"event-loop lag: p50 {lag['p50_ms']}ms, p95 {lag['p95_ms']}ms, p99 {lag['p99_ms']}ms, max {lag['max_ms']}ms")
+
+
+def wait_until_ready(base_url: str, timeout: float, server: subprocess.Popen | None = None):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server is not None and server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode}")
+        try:
+            if httpx.get(f"{base_url}/api/ready", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"{base_url} not ready after {timeout:.0f}s")
+
+
+def serve_command(args) -> list[str]:
+    command = [sys.executable, __file__, "serve", "--port", str(args.port),
+               "--llm-latency-ms", str(args.llm_latency_ms), "--rerank-latency-ms", str(args.rerank_latency_ms),
+               "--tokens-per-second", str(args.tokens_per_second), "--llm-error-rate", str(args.llm_error_rate)]
+    if args.fake_embeddings:
+        command.append("--fake-embeddings")
+    if args.caches:
+        command.append("--caches")
+    return command
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    factory = RequestFactory(parse_mix(args.mix), load_questions(args.knowledge_file, rng), rng)
+    send_times = schedule(args.rps, args.duration, args.ramp_up)
+    base_url = args.url or f"http://127.0.0.1:{args.port}"
+
+    server = None if args.url else subprocess.Popen(serve_command(args), cwd=project_root)
+    try:
+        wait_until_ready(base_url, args.startup_timeout, server)
+        try:
+            httpx.get(f"{base_url}/loadtest/lag", params={"reset": True}, timeout=5)
+        except httpx.HTTPError:
+            pass
+        print(f"Sending {len(send_times)} requests over {args.duration:.0f}s "
+              f"(target {args.rps} rps, ramp-up {args.ramp_up:.0f}s, concurrency {args.concurrency})")
+        started = time.monotonic()
+        results = asyncio.run(drive(base_url, factory, send_times, args.concurrency, args.timeout))
+        elapsed = time.monotonic() - started
+        lag = None
+        try:
+            response = httpx.get(f"{base_url}/loadtest/lag", timeout=5)
+            lag = response.json() if response.status_code == 200 else None
+        except httpx.HTTPError:
+            pass
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    report = {
+        "config": {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()},
+        "elapsed_seconds": round(elapsed, 2),
+        "summary": summarize(results, elapsed),
+        "event_loop_lag": lag,
+    }
+    print_report(report)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"Report written to {args.output}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the chat API with stub LLMs")
+    parser.add_argument("mode", nargs="?", choices=["run", "serve"], default="run")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--url", default=None, help="Target an already running server instead of starting one")
+    parser.add_argument("--rps", type=float, default=10.0, help="Target requests per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of load, including ramp-up")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="Seconds to ramp linearly up to the target rate")
+    parser.add_argument("--concurrency", type=int, default=100, help="Maximum requests in flight")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Client timeout per request (seconds)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Endpoint weights")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--knowledge-file", type=Path, default=project_root / "data" / "knowledge.json")
+    parser.add_argument("--llm-latency-ms", type=float, default=400.0, help="Answer LLM time to first token")
+    parser.add_argument("--rerank-latency-ms", type=float, default=150.0, help="Rerank LLM time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=80.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Share of stub LLM calls that fail")
+    parser.add_argument("--fake-embeddings", action="store_true", help="Use fake embeddings instead of the HF model")
+    parser.add_argument("--caches", action="store_true", help="Keep the LLM call cache and semantic answer cache on")
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--output", type=Path, default=None, help="Write the report as JSON")
+    args = parser.parse_args()
+
+    if args.mode == "serve":
+        serve(args)
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Tests for the Semantic Answer Cache
+====================================
+Tests similarity matching, TTL, LRU bounds and knowledge-base invalidation.
+"""
+
+import sys
+import time
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+import numpy as np
+import pytest
+from backend.answer_cache import SemanticAnswerCache
+
+
+ANSWER = {"response": "We offer tax credits.", "sources": ["https://example.com/tax"]}
+
+
+class TestSimilarityLookup:
+    """Test hit/miss decisions."""
+
+    def test_near_duplicate_hits(self):
+        """Test that a very similar query embedding is a hit."""
+        cache = SemanticAnswerCache(similarity_threshold=0.95)
+        cache.put([1.0, 0.0, 0.0], ANSWER)
+
+        assert cache.get([0.99, 0.05, 0.0]) == ANSWER
+        assert cache.hits == 1
+
+    def test_dissimilar_query_misses(self):
+        """Test that an unrelated query embedding is a miss."""
+        cache = SemanticAnswerCache(similarity_threshold=0.95)
+        cache.put([1.0, 0.0, 0.0], ANSWER)
+
+        assert cache.get([0.0, 1.0, 0.0]) is None
+        assert cache.misses == 1
+
+    def test_best_match_wins(self):
+        """Test that the most similar cached query is returned."""
+        cache = SemanticAnswerCache(similarity_threshold=0.9)
+        cache.put([1.0, 0.0], {"response": "first", "sources": []})
+        cache.put([0.95, 0.31], {"response": "second", "sources": []})
+
+        assert cache.get([0.96, 0.28])["response"] == "second"
+
+    def test_scale_invariant(self):
+        """Test that vectors are compared by cosine, not raw dot product."""
+        cache = SemanticAnswerCache(similarity_threshold=0.99)
+        cache.put([10.0, 0.0], ANSWER)
+        assert cache.get([0.1, 0.0]) == ANSWER
+
+    def test_returns_copies(self):
+        """Test that callers cannot corrupt cached entries."""
+        cache = SemanticAnswerCache()
+        cache.put([1.0, 0.0], ANSWER)
+        cache.get([1.0, 0.0])["response"] = "tampered"
+        assert cache.get([1.0, 0.0])["response"] == ANSWER["response"]
+
+
+class TestEviction:
+    """Test TTL, size bound and invalidation."""
+
+    def test_ttl_expiry(self):
+        """Test that entries expire after the TTL."""
+        cache = SemanticAnswerCache(ttl_seconds=0.05)
+        cache.put([1.0, 0.0], ANSWER)
+        time.sleep(0.1)
+        assert cache.get([1.0, 0.0]) is None
+
+    def test_lru_bound(self):
+        """Test that the least recently used entry is evicted first."""
+        cache = SemanticAnswerCache(similarity_threshold=0.99, max_entries=2)
+        cache.put([1.0, 0.0, 0.0], {"response": "a", "sources": []})
+        cache.put([0.0, 1.0, 0.0], {"response": "b", "sources": []})
+        cache.get([1.0, 0.0, 0.0])  # "a" is now most recently used
+        cache.put([0.0, 0.0, 1.0], {"response": "c", "sources": []})
+
+        assert len(cache) == 2
+        assert cache.get([0.0, 1.0, 0.0]) is None
+        assert cache.get([1.0, 0.0, 0.0])["response"] == "a"
+
+    def test_kb_version_change_invalidates(self):
+        """Test that a new knowledge base drops all cached answers."""
+        cache = SemanticAnswerCache(kb_version="2026-01-12:abc")
+        cache.put([1.0, 0.0], ANSWER)
+
+        cache.set_kb_version("2026-01-12:abc")
+        assert cache.get([1.0, 0.0]) == ANSWER
+
+        cache.set_kb_version("2026-02-01:def")
+        assert cache.get([1.0, 0.0]) is None
+
+
+class TestPerformance:
+    """Test that hits stay cheap at the size bound."""
+
+    def test_lookup_at_capacity_is_fast(self):
+        """Test that a lookup against a full cache takes well under a millisecond on average."""
+        rng = np.random.default_rng(0)
+        cache = SemanticAnswerCache(max_entries=1000)
+        for vector in rng.normal(size=(1000, 384)):
+            cache.put(vector, ANSWER)
+        query = rng.normal(size=384)
+        cache.get(query)  # Builds the stacked matrix
+
+        start = time.perf_counter()
+        for _ in range(100):
+            cache.get(query)
+        assert (time.perf_counter() - start) / 100 < 0.001
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
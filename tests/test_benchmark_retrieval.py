@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Tests for the Retrieval Benchmark
+==================================
+Tests the labeled query set, the ranking metrics, regression checks and
+a small offline run.
+"""
+
+import sys
+import json
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+import pytest
+from tests.benchmark_retrieval import (
+    build_query_set, score_ranks, percentile, compare_results, run_benchmark,
+)
+
+
+def make_chunks(n: int) -> list[dict]:
+    topics = ["tax credits", "payroll services", "capital raising", "bookkeeping", "mergers", "audits"]
+    return [
+        {"id": f"c{i}", "source_url": f"https://example.com/{i}", "category": "faq", "title": f"Page {i}",
+         "content": f"Our {topics[i % len(topics)]} team number {i} helps companies plan, file and review "
+                    f"{topics[i % len(topics)]} work every quarter. Clients in region {i} get a dedicated advisor."}
+        for i in range(n)
+    ]
+
+
+class TestQuerySet:
+    """Test labeled query generation."""
+
+    def test_queries_are_labeled_and_deterministic(self):
+        """Test that each query points at its chunk and the same seed gives the same set."""
+        chunks = make_chunks(12)
+        queries = build_query_set(chunks, max_queries=10, seed=1)
+        assert queries == build_query_set(chunks, max_queries=10, seed=1)
+        assert len(queries) == 10
+        assert {item["kind"] for item in queries} == {"sentence", "keywords"}
+        ids = {chunk["id"] for chunk in chunks}
+        assert all(set(item["relevant"]) <= ids for item in queries)
+
+    def test_duplicate_content_counts_as_relevant(self):
+        """Test that chunks with identical content share labels."""
+        chunks = make_chunks(4)
+        chunks.append(dict(chunks[0], id="copy"))
+        queries = build_query_set(chunks, max_queries=20)
+        assert any(set(item["relevant"]) == {"c0", "copy"} for item in queries)
+
+
+class TestMetrics:
+    """Test ranking and latency metrics."""
+
+    def test_recall_and_mrr(self):
+        """Test recall@k and MRR from first relevant ranks."""
+        scores = score_ranks([1, 2, None, 5], k_values=(1, 5))
+        assert scores["recall@1"] == 0.25
+        assert scores["recall@5"] == 0.75
+        assert scores["mrr"] == pytest.approx((1 + 0.5 + 0.2) / 4)
+
+    def test_percentile(self):
+        """Test nearest-rank percentiles."""
+        values = list(range(1, 101))
+        assert percentile(values, 50) == 50
+        assert percentile(values, 95) == 95
+
+    def test_compare_flags_regressions(self):
+        """Test that recall drops and slower p95 are reported, noise is not."""
+        def results(recall, p95):
+            mode = {"recall@1": recall, "recall@3": recall, "recall@5": recall, "recall@10": recall,
+                    "mrr": recall, "p95_ms": p95}
+            return {"configs": [{"dense_backend": "numpy", "sparse_backend": "inverted", "modes": {"hybrid": mode}}]}
+
+        assert compare_results(results(0.80, 1.1), results(0.81, 1.0)) == []
+        regressions = compare_results(results(0.70, 2.0), results(0.80, 1.0))
+        assert any("recall@5" in line for line in regressions)
+        assert any("p95" in line for line in regressions)
+
+
+class TestRun:
+    """Test an offline run end to end."""
+
+    def test_run_benchmark(self, tmp_path):
+        """Test that a run over a small knowledge base produces results per mode."""
+        knowledge_file = tmp_path / "knowledge.json"
+        knowledge_file.write_text(json.dumps({"chunks": make_chunks(12), "metadata": {"generated_at": "test"}}))
+        results = run_benchmark(knowledge_file, ["numpy"], ["inverted"], max_queries=8,
+                                embeddings="fake", index_root=tmp_path / "indexes")
+        json.dumps(results)  # Machine-readable
+        config = results["configs"][0]
+        assert set(config["modes"]) == {"dense", "sparse", "hybrid"}
+        assert config["modes"]["sparse"]["recall@10"] > 0.5
+        assert config["index_bytes"]["dense"] > 0
+        for scores in config["modes"].values():
+            assert scores["queries"] == 8
+            assert scores["p95_ms"] >= scores["p50_ms"] > 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
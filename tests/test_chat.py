@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Tests for the Chat Endpoint
+============================
+Tests that /api/chat answers through the async engine path and keeps the
+event loop responsive while the engine waits on slow LLM calls.
+"""
+
+import sys
+import json
+import time
+import asyncio
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from backend.llm_client import LLMClient
+from backend.rerankers import LLMReranker
+from backend.rag import RAGEngine
+from backend.routers.chat import router
+
+
+class TestAsyncChatPath:
+    """Test that /api/chat answers through the async engine path without blocking the event loop."""
+
+    def make_engine(self, tmp_path, rerank_seconds: float) -> RAGEngine:
+        chunks = [
+            {"id": f"c{i}", "source_url": f"https://example.com/{i}", "category": "faq",
+             "title": f"Page {i}", "content": f"Chunk {i} explains tax credits for business number {i}."}
+            for i in range(6)
+        ]
+        knowledge_file = tmp_path / "knowledge.json"
+        knowledge_file.write_text(json.dumps({"chunks": chunks, "metadata": {"generated_at": "test"}}))
+        engine = RAGEngine(knowledge_file, tmp_path / "index", dense_backend="numpy", sparse_backend="inverted")
+        engine.answer_cache = None
+        engine.rerank_mode = "always"
+        engine.embeddings = DeterministicFakeEmbedding(size=16)
+        engine.answer_client = engine.rerank_client = LLMClient(FakeListChatModel(responses=["Grounded answer."]), provider="fake", model="fake")
+        slow_model = FakeListChatModel(responses=["2, 1"], sleep=rerank_seconds)
+        engine.reranker = LLMReranker(LLMClient(slow_model, provider="fake", model="fake"))
+        engine.warm_up()
+        return engine
+
+    def test_slow_rerank_does_not_block_the_loop(self, tmp_path):
+        """Test that the endpoint awaits aanswer_query and the loop keeps running during a slow rerank."""
+        engine = self.make_engine(tmp_path, rerank_seconds=0.3)
+
+        def blocking_path(*args, **kwargs):
+            raise AssertionError("sync answer_query called from /api/chat")
+
+        engine.answer_query = blocking_path
+        app = FastAPI()
+        app.include_router(router, prefix="/api")
+        app.state.rag_engine = engine
+
+        async def run():
+            lags = []
+            stop = asyncio.Event()
+
+            async def ticker():
+                while not stop.is_set():
+                    started = time.perf_counter()
+                    await asyncio.sleep(0.01)
+                    lags.append(time.perf_counter() - started - 0.01)
+
+            ticking = asyncio.create_task(ticker())
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                started = time.perf_counter()
+                response = await client.post("/api/chat", json={"message": "How do tax credits work?", "session_id": "s1"})
+                elapsed = time.perf_counter() - started
+            stop.set()
+            await ticking
+            return response.json(), elapsed, max(lags)
+
+        body, elapsed, max_lag = asyncio.run(run())
+        engine.shutdown()
+        assert body["route"] == "rag"
+        assert body["response"] == "Grounded answer."
+        assert elapsed >= 0.3  # The rerank really was slow
+        assert max_lag < 0.1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
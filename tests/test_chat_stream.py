@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Tests for the Streaming Chat Endpoint
+======================================
+Tests the Server-Sent Events framing and event order of /api/chat/stream.
+"""
+
+import sys
+import json
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from backend.routers.chat import router, format_sse, detect_onboarding_info
+
+
+class StubRAGEngine:
+    """Stand-in for RAGEngine that streams a fixed answer."""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.queries = []
+
+    async def astream_answer(self, query: str, deadline=None):
+        self.queries.append(query)
+        if self.fail:
+            raise RuntimeError("LLM unavailable")
+        yield {"event": "route", "data": "rag"}
+        yield {"event": "sources", "data": ["https://example.com/tax"]}
+        for token in ["We ", "offer ", "tax credits."]:
+            yield {"event": "token", "data": token}
+
+
+def make_client(engine: StubRAGEngine) -> TestClient:
+    app = FastAPI()
+    app.include_router(router, prefix="/api")
+    app.state.rag_engine = engine
+    return TestClient(app)
+
+
+def parse_events(body: str) -> list[tuple[str, object]]:
+    """Parse an SSE body into (event, data) pairs."""
+    events = []
+    for frame in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in frame.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+class TestSSEFormat:
+    """Test SSE frame formatting."""
+
+    def test_frame_format(self):
+        """Test that frames carry an event name and JSON data."""
+        assert format_sse("token", "hi") == 'event: token\ndata: "hi"\n\n'
+
+    def test_newlines_stay_on_one_data_line(self):
+        """Test that multi-line text does not break the frame."""
+        frame = format_sse("token", "line one\nline two")
+        assert frame.count("\n") == 3
+
+
+class TestChatStream:
+    """Test the /api/chat/stream endpoint."""
+
+    def test_event_order(self):
+        """Test that sources arrive before tokens and done comes last."""
+        client = make_client(StubRAGEngine())
+        response = client.post("/api/chat/stream", json={"message": "Tell me about tax", "session_id": "s1"})
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = parse_events(response.text)
+        names = [name for name, _ in events]
+        assert names[0] == "sources"
+        assert names[-1] == "done"
+        assert "".join(data for name, data in events if name == "token") == "We offer tax credits."
+
+    def test_pii_masked_before_engine(self):
+        """Test that the engine only sees the masked message."""
+        engine = StubRAGEngine()
+        client = make_client(engine)
+        client.post("/api/chat/stream", json={"message": "Email me at john@example.com", "session_id": "s1"})
+
+        assert "john@example.com" not in engine.queries[0]
+
+    def test_nudge_is_final_content_event(self):
+        """Test that the nudge follows the answer tokens."""
+        client = make_client(StubRAGEngine())
+        response = client.post("/api/chat/stream", json={"message": "Hello", "session_id": "s1", "message_count": 3})
+
+        names = [name for name, _ in parse_events(response.text)]
+        assert names[-2:] == ["nudge", "done"]
+
+    def test_fallback_when_engine_fails(self):
+        """Test that an engine failure streams a fallback answer."""
+        client = make_client(StubRAGEngine(fail=True))
+        response = client.post("/api/chat/stream", json={"message": "What services do you offer?", "session_id": "s1"})
+
+        tokens = [data for name, data in parse_events(response.text) if name == "token"]
+        assert len(tokens) == 1
+        assert "services" in tokens[0].lower()
+
+    def test_route_reported_in_done(self):
+        """Test that the serving path is reported once, in the done event."""
+        response = make_client(StubRAGEngine()).post("/api/chat/stream", json={"message": "Tax?", "session_id": "s1"})
+        events = parse_events(response.text)
+        assert "route" not in [name for name, _ in events]
+        assert events[-1][1]["route"] == "rag"
+
+        response = make_client(StubRAGEngine(fail=True)).post("/api/chat/stream", json={"message": "Tax?", "session_id": "s1"})
+        assert parse_events(response.text)[-1][1]["route"] == "fallback:api_error"
+
+    def test_empty_message_rejected(self):
+        """Test that empty messages are rejected before streaming."""
+        client = make_client(StubRAGEngine())
+        response = client.post("/api/chat/stream", json={"message": "   ", "session_id": "s1"})
+        assert response.status_code == 400
+
+
+class TestOnboardingDetection:
+    """Test onboarding info detection shared by both chat endpoints."""
+
+    def test_detects_name_and_email(self):
+        """Test that name and email are detected."""
+        info = detect_onboarding_info("Hi, my name is jane and my email is jane@example.com")
+        assert info == {"name": "Jane", "email": "jane@example.com"}
+
+    def test_trailing_pattern_is_ignored(self):
+        """Test that a name pattern at the end of the message doesn't crash."""
+        assert "name" not in detect_onboarding_info("Honestly I am ")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Tests for Request Deadlines
+============================
+Tests the latency budget and how each RAG stage degrades when it runs out.
+"""
+
+import sys
+import json
+import asyncio
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from backend.deadline import Deadline, DeadlineExceeded, CHAT_MAX_LATENCY_BUDGET_MS
+from backend.llm_client import LLMClient
+from backend.rerankers import LLMReranker
+from backend.resilience import ProviderGuard, CircuitBreaker, ProviderUnavailableError, CLOSED
+from backend.rag import RAGEngine, extractive_answer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class ExplodingClient:
+    """LLM client that must not be called."""
+
+    def check_available(self):
+        pass
+
+    def invoke(self, prompt, timeout=None):
+        raise AssertionError("LLM called")
+
+    async def ainvoke(self, prompt, timeout=None):
+        raise AssertionError("LLM called")
+
+
+class HangingStreamModel:
+    """Chat model whose stream hangs after `chunks`, recording whether it was closed."""
+
+    def __init__(self, chunks: list[str] = ()):
+        self.chunks = list(chunks)
+        self.closed = False
+
+    async def astream(self, prompt):
+        try:
+            for chunk in self.chunks:
+                yield chunk
+            await asyncio.sleep(10)
+            yield "late"
+        finally:
+            self.closed = True
+
+
+def fake_client(sleep: float | None = None, response: str = "Grounded answer.") -> LLMClient:
+    return LLMClient(FakeListChatModel(responses=[response], sleep=sleep), provider="fake", model="fake")
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """Warmed-up engine over a small knowledge base with fake models."""
+    chunks = [
+        {"id": f"c{i}", "source_url": f"https://example.com/{i}", "category": "faq",
+         "title": f"Page {i}", "content": f"Chunk {i} explains tax credits for business number {i}."}
+        for i in range(6)
+    ]
+    knowledge_file = tmp_path / "knowledge.json"
+    knowledge_file.write_text(json.dumps({"chunks": chunks, "metadata": {"generated_at": "test"}}))
+    engine = RAGEngine(knowledge_file, tmp_path / "index", dense_backend="numpy", sparse_backend="inverted")
+    engine.answer_cache = None
+    engine.rerank_mode = "always"
+    engine.embeddings = DeterministicFakeEmbedding(size=16)
+    engine.answer_client = engine.rerank_client = fake_client()
+    engine.reranker = LLMReranker(fake_client(response="1, 2"))
+    engine.warm_up()
+    yield engine
+    engine.shutdown()
+
+
+class TestDeadline:
+    """Test budget arithmetic."""
+
+    def test_remaining_and_timeout(self):
+        """Test remaining time and reserved timeouts."""
+        clock = FakeClock()
+        deadline = Deadline(2000, clock=clock)
+        clock.now += 0.5
+        assert deadline.remaining_ms() == pytest.approx(1500)
+        assert deadline.timeout(reserve_ms=1000) == pytest.approx(0.5)
+        clock.now += 5
+        assert deadline.remaining() == 0
+        assert deadline.timeout() == 0
+
+    def test_unbounded(self):
+        """Test that Deadline(None) never constrains anything."""
+        deadline = Deadline(None)
+        assert not deadline.bounded
+        assert deadline.timeout() is None
+        assert deadline.remaining_ms() == float("inf")
+
+    def test_request_override_is_capped(self):
+        """Test that per-request budgets cannot exceed the configured maximum."""
+        assert Deadline.for_request(10 ** 9).budget_ms == CHAT_MAX_LATENCY_BUDGET_MS
+        assert Deadline.for_request(1500).budget_ms == 1500
+
+
+class TestClientTimeouts:
+    """Test that LLM calls respect the remaining budget."""
+
+    def test_ainvoke_timeout(self):
+        """Test that a slow answer raises DeadlineExceeded."""
+        with pytest.raises(DeadlineExceeded):
+            asyncio.run(fake_client(sleep=0.5).ainvoke("prompt", timeout=0.05))
+
+    def test_stream_first_token_timeout(self):
+        """Test that the time to the first streamed chunk is bounded."""
+        async def run():
+            return [chunk async for chunk in fake_client(sleep=0.5).astream("prompt", timeout=0.05)]
+
+        with pytest.raises(DeadlineExceeded):
+            asyncio.run(run())
+
+    def test_timed_out_stream_is_closed(self):
+        """Test that the provider stream is closed when the first token misses the budget."""
+        model = HangingStreamModel()
+
+        async def run():
+            return [chunk async for chunk in LLMClient(model, provider="fake", model="fake").astream("prompt", timeout=0.05)]
+
+        with pytest.raises(DeadlineExceeded):
+            asyncio.run(run())
+        assert model.closed
+
+    def test_abandoned_stream_is_closed(self):
+        """Test that closing the client's stream early closes the provider stream right away."""
+        model = HangingStreamModel(chunks=["Hello"])
+
+        async def run():
+            stream = LLMClient(model, provider="fake", model="fake").astream("prompt", timeout=1)
+            first = await anext(stream)
+            await stream.aclose()
+            return first, model.closed
+
+        assert asyncio.run(run()) == ("Hello", True)
+
+    def test_timeout_is_not_a_provider_failure(self):
+        """Test that budget timeouts count as slow calls, not errors, in the breaker."""
+        breaker = CircuitBreaker("fake", min_calls=2, failure_rate_threshold=0.5, slow_call_rate_threshold=1.0)
+        client = LLMClient(FakeListChatModel(responses=["x"], sleep=0.2), provider="fake", model="fake",
+                           guard=ProviderGuard("fake", breaker=breaker))
+        for _ in range(2):
+            with pytest.raises(DeadlineExceeded):
+                asyncio.run(client.ainvoke("prompt", timeout=0.01))
+        assert breaker.state != CLOSED  # Every call was slow
+
+
+class TestEngineDegradation:
+    """Test stage-by-stage budget checks in the RAG pipeline."""
+
+    def test_no_budget_gives_extractive_answer(self, engine):
+        """Test that an exhausted budget skips rerank and the answer LLM."""
+        engine.reranker = LLMReranker(ExplodingClient())
+        engine.answer_client = ExplodingClient()
+
+        result = engine.answer_query("tax credits", deadline=Deadline(0))
+        assert result["route"] == "extractive"
+        assert result["response"].startswith("Here's the most relevant information")
+        assert len(result["sources"]) == 1
+        assert engine.rerank_decisions["skipped_budget"] == 1
+
+    def test_unusable_rerank_still_degrades(self, engine):
+        """Test that an unparseable rerank reply followed by a slow answer gives an extractive answer, not an error."""
+        engine.reranker = LLMReranker(fake_client(response="1 3 2"))
+        engine.answer_client = fake_client(sleep=2.0)
+        result = asyncio.run(engine.aanswer_query("tax credits", deadline=Deadline(1600)))
+        assert result["route"] == "extractive"
+        assert result["response"].startswith("Here's the most relevant information")
+        assert extractive_answer([]).startswith("I'm sorry")
+
+    def test_tight_budget_skips_rerank_only(self, engine):
+        """Test that a budget too small for rerank still gets an LLM answer."""
+        engine.reranker = LLMReranker(ExplodingClient())
+        result = asyncio.run(engine.aanswer_query("tax credits", deadline=Deadline(2000)))
+        assert result["route"] == "rag"
+        assert result["response"] == "Grounded answer."
+
+    def test_slow_answer_degrades(self, engine):
+        """Test that an answer LLM slower than the remaining budget degrades to extractive."""
+        engine.answer_client = fake_client(sleep=2.0)
+        result = asyncio.run(engine.aanswer_query("tax credits", deadline=Deadline(1600)))
+        assert result["route"] == "extractive"
+
+    def test_stream_degrades(self, engine):
+        """Test that a stream with no first token in time sends the extractive answer."""
+        engine.answer_client = fake_client(sleep=2.0)
+
+        async def run():
+            return [event async for event in engine.astream_answer("tax credits", deadline=Deadline(1600))]
+
+        events = asyncio.run(run())
+        assert {"event": "route", "data": "extractive"} in events
+        tokens = [event["data"] for event in events if event["event"] == "token"]
+        assert len(tokens) == 1 and tokens[0].startswith("Here's the most relevant")
+        sources = [event["data"] for event in events if event["event"] == "sources"]
+        assert len(sources[-1]) == 1  # The extractive answer's source replaces the top-4 list
+
+    def test_stream_reports_provider_failure_mid_answer(self, engine):
+        """Test that a provider rejection after some tokens ends the stream with an error route."""
+        class FailingStreamClient:
+            def check_available(self):
+                pass
+
+            async def astream(self, prompt, timeout=None):
+                yield "Partial"
+                raise ProviderUnavailableError("openai", "api_error", "circuit open")
+
+        engine.answer_client = FailingStreamClient()
+
+        async def run():
+            return [event async for event in engine.astream_answer("tax credits")]
+
+        events = asyncio.run(run())
+        assert {"event": "token", "data": "Partial"} in events
+        assert events[-1] == {"event": "route", "data": "error"}
+
+    def test_unbounded_by_default(self, engine):
+        """Test that engine calls without a deadline behave as before."""
+        assert engine.answer_query("tax credits")["route"] == "rag"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
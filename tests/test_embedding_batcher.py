@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Tests for the Embedding Micro-Batcher
+======================================
+Tests that concurrent query embeddings share batched encode calls.
+"""
+
+import sys
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+import pytest
+from backend.embedding_batcher import MicroBatchingEmbeddings
+
+
+class RecordingEmbeddings:
+    """Fake embedder that records every batch it is asked to encode."""
+
+    def __init__(self, fail: bool = False):
+        self.batches = []
+        self.fail = fail
+        self.lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self.lock:
+            self.batches.append(list(texts))
+        if self.fail:
+            raise RuntimeError("model crashed")
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class TestMicroBatching:
+    """Test batching behavior."""
+
+    def test_single_query(self):
+        """Test that a lone query is embedded correctly."""
+        embedder = MicroBatchingEmbeddings(RecordingEmbeddings(), batch_window_ms=1)
+        try:
+            assert embedder.embed_query("hello") == [5.0, 1.0]
+        finally:
+            embedder.close()
+
+    def test_lone_query_does_not_wait(self):
+        """Test that at low load a query is embedded without waiting out the batch window."""
+        embedder = MicroBatchingEmbeddings(RecordingEmbeddings(), batch_window_ms=500)
+        try:
+            for text in ("first", "second"):
+                started = time.perf_counter()
+                embedder.embed_query(text)
+                assert time.perf_counter() - started < 0.25
+                time.sleep(0.6)  # Further apart than the window
+        finally:
+            embedder.close()
+
+    def test_concurrent_queries_are_batched(self):
+        """Test that queries arriving together share encode calls."""
+        inner = RecordingEmbeddings()
+        embedder = MicroBatchingEmbeddings(inner, batch_window_ms=50, max_batch_size=64)
+        queries = [f"query number {i}" for i in range(20)]
+        try:
+            with ThreadPoolExecutor(max_workers=20) as pool:
+                results = list(pool.map(embedder.embed_query, queries))
+        finally:
+            embedder.close()
+
+        assert results == [[float(len(q)), 1.0] for q in queries]
+        assert len(inner.batches) < len(queries)
+        assert sum(len(batch) for batch in inner.batches) == len(queries)
+
+    def test_max_batch_size(self):
+        """Test that no batch exceeds the configured size."""
+        inner = RecordingEmbeddings()
+        embedder = MicroBatchingEmbeddings(inner, batch_window_ms=50, max_batch_size=4)
+        try:
+            futures = [embedder.submit(f"q{i}") for i in range(10)]
+            [future.result(timeout=5) for future in futures]
+        finally:
+            embedder.close()
+
+        assert max(len(batch) for batch in inner.batches) <= 4
+
+    def test_duplicate_queries_encoded_once(self):
+        """Test that identical queries in one window are encoded once."""
+        inner = RecordingEmbeddings()
+        embedder = MicroBatchingEmbeddings(inner, batch_window_ms=50)
+        try:
+            futures = [embedder.submit("what services do you offer") for _ in range(5)]
+            results = [future.result(timeout=5) for future in futures]
+        finally:
+            embedder.close()
+
+        assert all(result == results[0] for result in results)
+        assert sum(len(batch) for batch in inner.batches) < 5
+
+    def test_async_query(self):
+        """Test that the async path resolves without blocking the loop."""
+        embedder = MicroBatchingEmbeddings(RecordingEmbeddings(), batch_window_ms=1)
+
+        async def embed_many():
+            return await asyncio.gather(*[embedder.aembed_query(t) for t in ["a", "bb", "ccc"]])
+
+        try:
+            assert asyncio.run(embed_many()) == [[1.0, 1.0], [2.0, 1.0], [3.0, 1.0]]
+        finally:
+            embedder.close()
+
+    def test_errors_reach_every_caller(self):
+        """Test that a failed batch fails each waiting caller."""
+        embedder = MicroBatchingEmbeddings(RecordingEmbeddings(fail=True), batch_window_ms=1)
+        try:
+            with pytest.raises(RuntimeError):
+                embedder.embed_query("hello")
+        finally:
+            embedder.close()
+
+    def test_documents_bypass_batcher(self):
+        """Test that index builds go straight to the model."""
+        inner = RecordingEmbeddings()
+        embedder = MicroBatchingEmbeddings(inner)
+        try:
+            embedder.embed_documents(["a", "b", "c"])
+        finally:
+            embedder.close()
+
+        assert inner.batches == [["a", "b", "c"]]
+
+
+class TestShutdown:
+    """Test that callers never hang on a closed or stuck batcher."""
+
+    def test_closed_batcher_refuses_queries(self):
+        """Test that queries after close() fail instead of waiting forever."""
+        embedder = MicroBatchingEmbeddings(RecordingEmbeddings())
+        embedder.close()
+        with pytest.raises(RuntimeError):
+            embedder.embed_query("late")
+        embedder.close()  # Idempotent
+
+    def test_query_times_out(self):
+        """Test that a caller stops waiting on a stuck model after the timeout."""
+        release = threading.Event()
+
+        class StuckEmbeddings(RecordingEmbeddings):
+            def embed_documents(self, texts):
+                release.wait()
+                return super().embed_documents(texts)
+
+        embedder = MicroBatchingEmbeddings(StuckEmbeddings(), timeout=0.05)
+        try:
+            with pytest.raises(TimeoutError):
+                embedder.embed_query("stuck")
+            with pytest.raises(TimeoutError):
+                asyncio.run(embedder.aembed_query("stuck too"))
+        finally:
+            release.set()
+            embedder.close()
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
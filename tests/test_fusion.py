@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Tests for Hybrid Fusion
+========================
+Tests weighted reciprocal rank fusion and concurrent retrieval legs.
+"""
+
+import sys
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+import pytest
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from backend.fusion import reciprocal_rank_fusion, ParallelHybridRetriever
+
+
+def doc(doc_id: str, content: str = None, **metadata) -> Document:
+    return Document(page_content=content or f"content of {doc_id}", metadata={"id": doc_id, **metadata})
+
+
+class SlowRetriever(BaseRetriever):
+    """Retriever that sleeps before returning fixed documents."""
+
+    docs: list
+    delay: float = 0.0
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        time.sleep(self.delay)
+        return self.docs
+
+
+class TestReciprocalRankFusion:
+    """Test the RRF scoring."""
+
+    def test_weighted_scores(self):
+        """Test that scores follow sum(w / (c + rank))."""
+        fused = reciprocal_rank_fusion([[doc("a"), doc("b")], [doc("b"), doc("c")]], [0.7, 0.3], c=60)
+        scores = {d.metadata["id"]: d.metadata["fusion_score"] for d in fused}
+
+        assert scores["a"] == pytest.approx(0.7 / 61)
+        assert scores["b"] == pytest.approx(0.7 / 62 + 0.3 / 61)
+        assert scores["c"] == pytest.approx(0.3 / 62)
+        assert [d.metadata["id"] for d in fused] == ["b", "a", "c"]
+
+    def test_dedup_by_id_not_content(self):
+        """Test that distinct chunks with identical text are both kept, and one chunk is never duplicated."""
+        fused = reciprocal_rank_fusion(
+            [[doc("a", "same text"), doc("b", "same text")], [doc("a", "same text")]], [0.5, 0.5]
+        )
+        assert sorted(d.metadata["id"] for d in fused) == ["a", "b"]
+
+    def test_metadata_from_both_legs_merged(self):
+        """Test that leg scores from every list survive fusion without touching the inputs."""
+        dense = [doc("a", dense_score=0.9)]
+        sparse = [doc("a", sparse_score=7.5)]
+        fused = reciprocal_rank_fusion([dense, sparse], [0.7, 0.3])
+
+        assert fused[0].metadata["dense_score"] == 0.9
+        assert fused[0].metadata["sparse_score"] == 7.5
+        assert "fusion_score" not in dense[0].metadata
+
+    def test_empty_lists(self):
+        """Test that empty legs are tolerated."""
+        assert reciprocal_rank_fusion([[], []], [0.7, 0.3]) == []
+        assert [d.metadata["id"] for d in reciprocal_rank_fusion([[], [doc("x")]], [0.7, 0.3])] == ["x"]
+
+    def test_weight_count_mismatch(self):
+        """Test that weights must match the number of legs."""
+        with pytest.raises(ValueError):
+            reciprocal_rank_fusion([[doc("a")]], [0.7, 0.3])
+
+
+class TestParallelHybridRetriever:
+    """Test that both legs run concurrently."""
+
+    def make_retriever(self, executor=None) -> ParallelHybridRetriever:
+        return ParallelHybridRetriever(
+            retrievers=[SlowRetriever(docs=[doc("a"), doc("b")], delay=0.2),
+                        SlowRetriever(docs=[doc("b"), doc("c")], delay=0.2)],
+            weights=[0.7, 0.3],
+            executor=executor
+        )
+
+    def test_sync_legs_overlap(self):
+        """Test that sync latency is close to the slowest leg, not the sum."""
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            retriever = self.make_retriever(pool)
+            start = time.perf_counter()
+            results = retriever.invoke("query")
+            elapsed = time.perf_counter() - start
+
+        assert [d.metadata["id"] for d in results] == ["b", "a", "c"]
+        assert elapsed < 0.35
+
+    def test_async_legs_overlap(self):
+        """Test that the async path gathers both legs concurrently."""
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            retriever = self.make_retriever(pool)
+            start = time.perf_counter()
+            results = asyncio.run(retriever.ainvoke("query"))
+            elapsed = time.perf_counter() - start
+
+        assert [d.metadata["id"] for d in results] == ["b", "a", "c"]
+        assert elapsed < 0.35
+
+    def test_without_executor(self):
+        """Test that a private pool is used when none is given."""
+        assert len(self.make_retriever().invoke("query")) == 3
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Tests for the Chat History Store
+=================================
+Tests the SQLite and JSON history stores, migration from
+chat_history.json, compaction, and the history endpoints.
+"""
+
+import sys
+import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from backend.history_store import SqliteChatHistoryStore, JsonChatHistoryStore
+from backend.routers.onboard import router
+from backend.write_behind import WriteBehindWriter
+
+
+def messages(*contents: str) -> list[dict]:
+    return [{"role": "user", "content": content, "timestamp": "2024-01-01T00:00:00"} for content in contents]
+
+
+@pytest.fixture(params=["sqlite", "json"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        store = SqliteChatHistoryStore(tmp_path / "history.sqlite", legacy_json=None, sync_interval_ms=10)
+    else:
+        store = JsonChatHistoryStore(tmp_path / "history.json")
+    yield store
+    store.close()
+
+
+class TestStores:
+    """Test behavior shared by both backends."""
+
+    def test_append_replace_get(self, store):
+        """Test that appends keep order, replace overwrites, and sessions are separate."""
+        assert store.append("s1", messages("a", "b")) == 2
+        assert store.append("s1", messages("c")) == 3
+        store.append("s2", messages("x"))
+        assert [m["content"] for m in store.get("s1")] == ["a", "b", "c"]
+        store.replace("s1", messages("z"))
+        assert store.get("s1") == messages("z")
+        assert store.get("s2") == messages("x")
+        assert store.get("missing") == []
+
+    def test_concurrent_appends(self, store):
+        """Test that concurrent appends to one session lose no messages."""
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(lambda i: store.append("s1", messages(str(i))), range(50)))
+        assert sorted(int(m["content"]) for m in store.get("s1")) == list(range(50))
+
+
+class TestSqlite:
+    """Test SQLite-specific behavior."""
+
+    def test_migrates_json_once(self, tmp_path):
+        """Test that legacy sessions are imported on first open only."""
+        legacy = tmp_path / "chat_history.json"
+        legacy.write_text(json.dumps({"s1": messages("a", "b"), "s2": messages("c")}))
+        store = SqliteChatHistoryStore(tmp_path / "history.sqlite", legacy_json=legacy, sync_interval_ms=0)
+        store.append("s1", messages("new"))
+        store.close()
+        store = SqliteChatHistoryStore(tmp_path / "history.sqlite", legacy_json=legacy, sync_interval_ms=0)
+        assert [m["content"] for m in store.get("s1")] == ["a", "b", "new"]
+        store.close()
+
+    def test_reads_one_session_only(self, tmp_path):
+        """Test that reading a session searches the primary key instead of scanning all history."""
+        store = SqliteChatHistoryStore(tmp_path / "history.sqlite", legacy_json=None, sync_interval_ms=0)
+        plan = store._connection().execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM chat_messages WHERE session_id = ? ORDER BY seq", ("s1",)
+        ).fetchall()
+        assert "SEARCH" in " ".join(str(tuple(row)) for row in plan)
+        store.close()
+
+    def test_compaction(self, tmp_path):
+        """Test that space freed by replaced histories is returned once past the ratio."""
+        path = tmp_path / "history.sqlite"
+        store = SqliteChatHistoryStore(path, legacy_json=None, sync_interval_ms=0, compact_ratio=0.25)
+        for i in range(200):
+            store.append(f"s{i}", messages("x" * 2000))
+        for i in range(150):
+            store.replace(f"s{i}", [])
+        conn = store._connection()
+        pages = conn.execute("PRAGMA page_count").fetchone()[0]
+        assert store.compact()
+        assert conn.execute("PRAGMA page_count").fetchone()[0] < pages / 2
+        assert not store.compact()  # Nothing left to reclaim
+        assert len(store.get("s199")) == 1
+        store.close()
+
+
+class TestHistoryEndpoints:
+    """Test the chat history endpoints with the store behind a write-through writer."""
+
+    def test_append_endpoint(self, tmp_path):
+        """Test appending new messages, replacing and reading a session."""
+        app = FastAPI()
+        app.include_router(router, prefix="/api")
+        store = SqliteChatHistoryStore(tmp_path / "history.sqlite", legacy_json=None, sync_interval_ms=0)
+        app.state.writer = WriteBehindWriter(None, store, enabled=False)
+        client = TestClient(app)
+
+        assert client.post("/api/chat-history/s1/messages", json=messages("a", "b")).json()["success"]
+        assert client.post("/api/chat-history/s1/messages", json=messages("c")).json()["success"]
+        assert len(client.get("/api/chat-history/s1").json()["messages"]) == 3
+        assert client.post("/api/chat-history/s1", json=messages("z")).json()["success"]
+        assert client.get("/api/chat-history/s1").json()["messages"] == messages("z")
+        store.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Tests for the LLM HTTP Clients
+===============================
+Tests the retry transports and the shared pooled clients without network access.
+"""
+
+import sys
+import json
+import asyncio
+import random
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+import httpx
+import pytest
+from backend.http_clients import (
+    RetryPolicy, RetryTransport, AsyncRetryTransport, call_deadline,
+    get_http_client, get_async_http_client, aclose_http_clients,
+)
+
+
+def scripted_handler(statuses: list, headers: dict | None = None):
+    """Mock handler answering with the given status codes in order (exceptions are raised)."""
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        status = statuses[min(len(calls), len(statuses) - 1)]
+        calls.append(request)
+        if isinstance(status, Exception):
+            raise status
+        return httpx.Response(status, headers=headers or {}, json={"attempt": len(calls)})
+
+    return handler, calls
+
+
+def sync_client(handler, policy: RetryPolicy, sleeps: list) -> httpx.Client:
+    return httpx.Client(transport=RetryTransport(httpx.MockTransport(handler), policy, sleep=sleeps.append))
+
+
+class TestRetryPolicy:
+    """Test backoff computation."""
+
+    def test_full_jitter_is_capped(self):
+        """Test that backoff stays within the exponential cap."""
+        policy = RetryPolicy(max_retries=5, base_ms=100, max_ms=1000, rng=random.Random(1))
+        for attempt in range(6):
+            assert 0 <= policy.backoff(attempt) <= min(1.0, 0.1 * 2 ** attempt)
+
+    def test_retry_after(self):
+        """Test that Retry-After headers are honoured, up to the cap."""
+        policy = RetryPolicy(max_ms=2000)
+        assert policy.backoff(0, httpx.Response(429, headers={"retry-after": "1"})) == 1.0
+        assert policy.backoff(0, httpx.Response(429, headers={"retry-after-ms": "150"})) == 0.15
+        assert policy.backoff(0, httpx.Response(429, headers={"retry-after": "60"})) == 2.0
+
+
+class TestRetryTransport:
+    """Test which failures are retried."""
+
+    def test_retries_429_and_5xx(self):
+        """Test that retryable statuses are retried until success."""
+        handler, calls = scripted_handler([429, 503, 200])
+        sleeps = []
+        response = sync_client(handler, RetryPolicy(max_retries=2), sleeps).get("https://api.example.com/")
+        assert response.status_code == 200
+        assert len(calls) == 3
+        assert len(sleeps) == 2
+
+    def test_gives_up_after_max_retries(self):
+        """Test that the last retryable response is returned to the SDK."""
+        handler, calls = scripted_handler([500])
+        response = sync_client(handler, RetryPolicy(max_retries=2), []).get("https://api.example.com/")
+        assert response.status_code == 500
+        assert len(calls) == 3
+
+    def test_client_errors_not_retried(self):
+        """Test that 4xx other than 429 are returned immediately."""
+        handler, calls = scripted_handler([400, 200])
+        response = sync_client(handler, RetryPolicy(max_retries=2), []).get("https://api.example.com/")
+        assert response.status_code == 400
+        assert len(calls) == 1
+
+    def test_connect_errors_retried(self):
+        """Test that failed connects are retried."""
+        handler, calls = scripted_handler([httpx.ConnectError("refused"), 200])
+        response = sync_client(handler, RetryPolicy(max_retries=2), []).get("https://api.example.com/")
+        assert response.status_code == 200
+
+    def test_retries_share_the_call_deadline(self):
+        """Test that attempts are capped at the time left and no retry waits past the deadline."""
+        handler, calls = scripted_handler([429, 200], headers={"retry-after": "1"})
+        sleeps = []
+        client = sync_client(handler, RetryPolicy(max_retries=2), sleeps)
+        with call_deadline(0.5):
+            response = client.get("https://api.example.com/")
+        assert response.status_code == 429
+        assert len(calls) == 1 and not sleeps
+        assert calls[0].extensions["timeout"]["read"] <= 0.5
+
+        handler, calls = scripted_handler([429, 200], headers={"retry-after": "1"})
+        response = sync_client(handler, RetryPolicy(max_retries=2), sleeps).get("https://api.example.com/")
+        assert response.status_code == 200  # No deadline: retried as before
+
+    def test_async_transport(self):
+        """Test that the async path applies the same policy."""
+        handler, calls = scripted_handler([502, 200])
+        sleeps = []
+
+        async def sleep(seconds):
+            sleeps.append(seconds)
+
+        async def run():
+            transport = AsyncRetryTransport(httpx.MockTransport(handler), RetryPolicy(max_retries=2), sleep=sleep)
+            async with httpx.AsyncClient(transport=transport) as client:
+                return await client.post("https://api.example.com/", json={"q": 1})
+
+        response = asyncio.run(run())
+        assert response.status_code == 200
+        assert len(calls) == 2 and len(sleeps) == 1
+        assert json.loads(calls[1].content) == {"q": 1}
+
+    def test_openai_sdk_uses_transport(self):
+        """Test that a chat model built on the shared transport retries a 503 once, with no SDK retries."""
+        from langchain_openai import ChatOpenAI
+
+        completion = {
+            "id": "c1", "object": "chat.completion", "created": 0, "model": "gpt-4o-mini",
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": "Hello!"}}],
+        }
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(503) if len(calls) == 1 else httpx.Response(200, json=completion)
+
+        client = httpx.Client(transport=RetryTransport(httpx.MockTransport(handler), RetryPolicy(), sleep=lambda s: None))
+        llm = ChatOpenAI(model="gpt-4o-mini", api_key="test", base_url="https://api.example.com/v1",
+                         http_client=client, max_retries=0)
+        assert llm.invoke("hi").content == "Hello!"
+        assert len(calls) == 2
+
+
+class TestSharedClients:
+    """Test the process-wide clients."""
+
+    def test_singletons(self):
+        """Test that all callers get the same pooled clients until they are closed."""
+        assert get_http_client() is get_http_client()
+        async_client = get_async_http_client()
+        assert async_client is get_async_http_client()
+        assert isinstance(get_http_client()._transport, RetryTransport)
+
+        asyncio.run(aclose_http_clients())
+        assert get_async_http_client() is not async_client
+        asyncio.run(aclose_http_clients())
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
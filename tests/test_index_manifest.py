@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Tests for the Index Manifest
+=============================
+Tests that the persisted vector index is only rebuilt when the knowledge
+base, embedding model or chunker settings change.
+"""
+
+import sys
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+import pytest
+from backend.index_manifest import build_manifest, load_manifest, save_manifest, manifest_matches
+
+
+CHUNKS = [
+    {"id": "chunk_0", "source_url": "https://example.com", "category": "homepage",
+     "title": "Home", "content": "We help businesses grow."},
+    {"id": "chunk_1", "source_url": "https://example.com/tax", "category": "services/tax-credits",
+     "title": "Tax", "content": "R&D tax credits with carryforwards."},
+]
+CHUNKER = {"method": "semantic", "similarity_threshold": 0.6, "max_chars": 1500, "min_chunk_chars": 250}
+
+
+class TestManifestFingerprint:
+    """Test when the manifest fingerprint changes."""
+
+    def test_same_inputs_match(self):
+        """Test that identical inputs produce matching manifests."""
+        first = build_manifest(CHUNKS, "all-MiniLM-L6-v2", CHUNKER)
+        second = build_manifest([dict(c) for c in CHUNKS], "all-MiniLM-L6-v2", dict(CHUNKER))
+        assert manifest_matches(first, second)
+
+    def test_content_change_invalidates(self):
+        """Test that editing a chunk changes the fingerprint."""
+        edited = [dict(c) for c in CHUNKS]
+        edited[1]["content"] += " Updated."
+        assert not manifest_matches(
+            build_manifest(CHUNKS, "all-MiniLM-L6-v2", CHUNKER),
+            build_manifest(edited, "all-MiniLM-L6-v2", CHUNKER)
+        )
+
+    def test_model_change_invalidates(self):
+        """Test that switching the embedding model changes the fingerprint."""
+        assert not manifest_matches(
+            build_manifest(CHUNKS, "all-MiniLM-L6-v2", CHUNKER),
+            build_manifest(CHUNKS, "all-mpnet-base-v2", CHUNKER)
+        )
+
+    def test_chunker_change_invalidates(self):
+        """Test that new chunker settings change the fingerprint."""
+        assert not manifest_matches(
+            build_manifest(CHUNKS, "all-MiniLM-L6-v2", CHUNKER),
+            build_manifest(CHUNKS, "all-MiniLM-L6-v2", {**CHUNKER, "max_chars": 1000})
+        )
+
+    def test_missing_manifest_never_matches(self):
+        """Test that a missing stored manifest forces a rebuild."""
+        assert not manifest_matches(None, build_manifest(CHUNKS, "all-MiniLM-L6-v2"))
+
+
+class TestManifestPersistence:
+    """Test saving and loading manifests."""
+
+    def test_round_trip(self, tmp_path):
+        """Test that a saved manifest loads back unchanged."""
+        manifest = build_manifest(CHUNKS, "all-MiniLM-L6-v2", CHUNKER)
+        save_manifest(tmp_path / "chroma_db", manifest)
+        assert load_manifest(tmp_path / "chroma_db") == manifest
+
+    def test_corrupt_manifest_is_ignored(self, tmp_path):
+        """Test that an unreadable manifest is treated as missing."""
+        (tmp_path / "index_manifest.json").write_text("{not json", encoding="utf-8")
+        assert load_manifest(tmp_path) is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Tests for the Intent Router
+============================
+Tests the zero-LLM fast path for greetings and canned FAQ intents.
+"""
+
+import sys
+import asyncio
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+import pytest
+from backend.intent_router import IntentRouter, INTENT_RESPONSES, normalize_message
+from backend.fallback import FALLBACK_RESPONSES, SIMPLE_FAQ
+from backend.rag import RAGEngine
+
+
+@pytest.fixture
+def router():
+    return IntentRouter()
+
+
+class TestIntentMatching:
+    """Test which messages match an intent."""
+
+    @pytest.mark.parametrize("message", ["hi", "Hello!", "hey there", "Good morning :)", "  HELLO  team. "])
+    def test_greetings(self, router, message):
+        """Test that bare greetings match."""
+        assert router.match(message) == "greeting"
+
+    @pytest.mark.parametrize("message,intent", [
+        ("Thanks!", "thanks"),
+        ("thank you so much", "thanks"),
+        ("bye", "goodbye"),
+        ("What services do you offer?", "services"),
+        ("what are your services", "services"),
+        ("Who are you?", "about"),
+        ("How can I contact you?", "contact"),
+    ])
+    def test_small_talk_and_faq(self, router, message, intent):
+        """Test small talk and canned FAQ questions."""
+        assert router.match(message) == intent
+
+    @pytest.mark.parametrize("message", [
+        "hi, how do R&D tax credits work?",
+        "This is about payroll",
+        "Which services help with taxes for a retail store?",
+        "thanks, and what about capital markets?",
+        "How can I contact your payments team about a chargeback?",
+    ])
+    def test_real_questions_go_to_rag(self, router, message):
+        """Test that a question merely starting with small talk is not intercepted."""
+        assert router.match(message) is None
+
+    def test_long_messages_never_match(self, router):
+        """Test that long messages skip the router."""
+        assert router.match("hello " * 30) is None
+
+    def test_responses(self, router):
+        """Test that intents reuse the canned fallback answers."""
+        assert router.route("hi") == ("greeting", FALLBACK_RESPONSES["greeting"])
+        assert router.route("services")[1] == SIMPLE_FAQ["services"]
+        assert set(INTENT_RESPONSES) == set(router.patterns)
+
+    def test_normalize(self):
+        """Test message normalization."""
+        assert normalize_message("  Hello\n  THERE!!! ") == "hello there"
+
+
+class TestEngineRouting:
+    """Test that the engine answers routed intents without retrieval or LLM calls."""
+
+    def make_engine(self, tmp_path):
+        # No models are loaded: any retrieval or LLM call would fail
+        return RAGEngine(tmp_path / "knowledge.json", tmp_path / "index")
+
+    def test_answer_query(self, tmp_path):
+        """Test that a greeting is served by the intent path."""
+        engine = self.make_engine(tmp_path)
+        result = engine.answer_query("Hello!")
+        assert result["route"] == "intent:greeting"
+        assert result["response"] == FALLBACK_RESPONSES["greeting"]
+        assert result["sources"] == []
+        assert engine.route_counts["intent:greeting"] == 1
+        engine.shutdown()
+
+    def test_async_paths(self, tmp_path):
+        """Test the async and streaming paths."""
+        engine = self.make_engine(tmp_path)
+
+        async def run():
+            result = await engine.aanswer_query("thanks")
+            events = [event async for event in engine.astream_answer("bye")]
+            return result, events
+
+        result, events = asyncio.run(run())
+        assert result["route"] == "intent:thanks"
+        assert events[0] == {"event": "route", "data": "intent:goodbye"}
+        assert [event["event"] for event in events] == ["route", "sources", "token"]
+        engine.shutdown()
+
+    def test_unmatched_query_is_not_routed(self, tmp_path):
+        """Test that other questions fall through to the pipeline."""
+        engine = self.make_engine(tmp_path)
+        assert engine.answer_query("How do R&D tax credits work?")["route"] == "unavailable"
+        engine.shutdown()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Tests for the LLM Call Cache
+=============================
+Tests the persistent exact-match cache and the LLMClient call path.
+"""
+
+import sys
+import sqlite3
+import asyncio
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from backend.llm_cache import LLMCallCache, make_cache_key
+from backend.llm_client import LLMClient
+
+
+def write_entries(path: str, worker: int):
+    cache = LLMCallCache(Path(path))
+    for i in range(25):
+        key = make_cache_key("gpt-4o-mini", 0, f"worker {worker} prompt {i}")
+        cache.put(key, "gpt-4o-mini", f"answer {i}")
+        assert cache.get(key) == f"answer {i}"
+    cache.close()  # Writes the buffered hit counts
+
+
+class TestCacheKey:
+    """Test what the cache key depends on."""
+
+    def test_key_inputs(self):
+        """Test that model, temperature and prompt all change the key."""
+        base = make_cache_key("gpt-4o-mini", 0, "prompt")
+        assert base == make_cache_key("gpt-4o-mini", 0, "prompt")
+        assert base != make_cache_key("llama-3.1-8b-instant", 0, "prompt")
+        assert base != make_cache_key("gpt-4o-mini", 0.7, "prompt")
+        assert base != make_cache_key("gpt-4o-mini", 0, "prompt ")
+
+
+class TestLLMCallCache:
+    """Test storage, counters and eviction."""
+
+    def test_round_trip_and_counters(self, tmp_path):
+        """Test that hits and misses are counted."""
+        cache = LLMCallCache(tmp_path / "llm_cache.sqlite")
+        key = make_cache_key("gpt-4o-mini", 0, "hello")
+
+        assert cache.get(key) is None
+        cache.put(key, "gpt-4o-mini", "Hi there!")
+        assert cache.get(key) == "Hi there!"
+
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["entries"] == 1
+
+    def test_close_closes_every_thread(self, tmp_path):
+        """Test that close() flushes the counters and closes connections opened by worker threads."""
+        cache = LLMCallCache(tmp_path / "llm_cache.sqlite")
+        key = make_cache_key("gpt-4o-mini", 0, "hello")
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(lambda _: cache.get(key), range(4)))
+            connections = list(pool.map(lambda _: cache._connection(), range(4)))
+        cache.close()
+        for conn in connections:
+            with pytest.raises(sqlite3.ProgrammingError):
+                conn.execute("SELECT 1")
+        assert LLMCallCache(tmp_path / "llm_cache.sqlite").stats()["misses"] == 4
+
+    def test_survives_restart(self, tmp_path):
+        """Test that entries persist across cache instances."""
+        key = make_cache_key("gpt-4o-mini", 0, "hello")
+        LLMCallCache(tmp_path / "llm_cache.sqlite").put(key, "gpt-4o-mini", "Hi there!")
+        assert LLMCallCache(tmp_path / "llm_cache.sqlite").get(key) == "Hi there!"
+
+    def test_size_eviction_is_lru(self, tmp_path):
+        """Test that the least recently used entries go first when over the size bound."""
+        cache = LLMCallCache(tmp_path / "llm_cache.sqlite", max_bytes=250)
+        keys = [make_cache_key("m", 0, str(i)) for i in range(3)]
+        for key in keys:
+            cache.put(key, "m", "x" * 100)
+            cache.get(keys[0])  # Keep the first entry hot
+
+        assert cache.get(keys[0]) is not None
+        assert cache.get(keys[1]) is None
+        assert cache.stats()["bytes"] <= 250
+        assert cache.stats()["evictions"] == 1
+
+    def test_replacing_entry_keeps_size_accurate(self, tmp_path):
+        """Test that overwriting a key does not double count its size."""
+        cache = LLMCallCache(tmp_path / "llm_cache.sqlite")
+        key = make_cache_key("m", 0, "p")
+        cache.put(key, "m", "x" * 10)
+        cache.put(key, "m", "x" * 30)
+        assert cache.stats()["bytes"] == 30
+
+    def test_concurrent_processes(self, tmp_path):
+        """Test that several worker processes can share one cache file."""
+        path = str(tmp_path / "llm_cache.sqlite")
+        LLMCallCache(Path(path)).close()  # Never fork with an open SQLite connection
+        processes = [multiprocessing.Process(target=write_entries, args=(path, w)) for w in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(timeout=60)
+
+        assert all(process.exitcode == 0 for process in processes)
+        stats = LLMCallCache(Path(path)).stats()
+        assert stats["entries"] == 100
+        assert stats["hits"] == 100
+
+
+class TestLLMClient:
+    """Test that the client consults the cache before the model."""
+
+    def test_second_call_served_from_cache(self, tmp_path):
+        """Test that an identical prompt never reaches the model twice."""
+        llm = FakeListChatModel(responses=["first", "second"])
+        client = LLMClient(llm, provider="fake", model="fake", cache=LLMCallCache(tmp_path / "c.sqlite"))
+
+        assert client.invoke("What services do you offer?") == "first"
+        assert client.invoke("What services do you offer?") == "first"
+        assert client.invoke("Something else") == "second"
+
+    def test_async_and_stream_share_cache(self, tmp_path):
+        """Test that streamed answers are cached for later calls."""
+        llm = FakeListChatModel(responses=["streamed answer", "unused"])
+        client = LLMClient(llm, provider="fake", model="fake", cache=LLMCallCache(tmp_path / "c.sqlite"))
+
+        async def run():
+            chunks = [chunk async for chunk in client.astream("prompt")]
+            return "".join(chunks), await client.ainvoke("prompt")
+
+        streamed, cached = asyncio.run(run())
+        assert streamed == cached == "streamed answer"
+
+    def test_without_cache(self):
+        """Test that the client works with caching disabled."""
+        client = LLMClient(FakeListChatModel(responses=["a", "b"]), provider="fake", model="fake")
+        assert [client.invoke("p"), client.invoke("p")] == ["a", "b"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
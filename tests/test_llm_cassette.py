@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Tests for LLM Record / Replay
+==============================
+Tests recording LLM HTTP calls to a cassette and replaying them offline,
+with their original or scaled latency.
+"""
+
+import sys
+import json
+import asyncio
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+import httpx
+import pytest
+from backend.llm_cassette import (
+    Cassette, CassetteMiss, RecordReplayTransport, AsyncRecordReplayTransport, request_key,
+)
+
+URL = "https://api.example.com/v1/chat/completions"
+
+
+def completion(text: str) -> dict:
+    return {
+        "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": "gpt-test",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}],
+        "usage": {"prompt_tokens": 5, "completion_tokens": 2, "total_tokens": 7},
+    }
+
+
+class ChunkedStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    def __init__(self, chunks: list[bytes]):
+        self.chunks = chunks
+
+    def __iter__(self):
+        yield from self.chunks
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+def upstream(calls: list):
+    """A fake provider: answers with the request's prompt echoed back, in two chunks."""
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        prompt = json.loads(request.content)["prompt"]
+        return httpx.Response(200, headers={"content-type": "text/plain", "x-request-id": "abc"},
+                              stream=ChunkedStream([b"echo: ", prompt.encode()]))
+    return httpx.MockTransport(handler)
+
+
+def offline():
+    def handler(request: httpx.Request) -> httpx.Response:
+        raise AssertionError("replay must not reach the network")
+    return httpx.MockTransport(handler)
+
+
+class TestRecordReplay:
+    """Test the sync and async cassette transports."""
+
+    def test_record_then_replay(self, tmp_path):
+        """Test that a recorded call is served back without the network."""
+        path = tmp_path / "cassette.jsonl"
+        calls = []
+        with httpx.Client(transport=RecordReplayTransport(upstream(calls), Cassette(path), "record")) as client:
+            assert client.post(URL, json={"prompt": "hi"}).text == "echo: hi"
+        assert len(calls) == 1
+        entry = json.loads(path.read_text())
+        assert entry["request"] == {"prompt": "hi"}
+        assert entry["headers"] == {"content-type": "text/plain"}
+        assert len(entry["chunks"]) == 2
+
+        transport = RecordReplayTransport(offline(), Cassette(path), "replay", latency_scale=0)
+        with httpx.Client(transport=transport) as client:
+            response = client.post(URL, json={"prompt": "hi"})
+            assert (response.status_code, response.text) == (200, "echo: hi")
+            with pytest.raises(CassetteMiss):
+                client.post(URL, json={"prompt": "something else"})
+
+    def test_repeated_requests_replay_in_order(self, tmp_path):
+        """Test that identical requests recorded twice replay in recorded order."""
+        path = tmp_path / "cassette.jsonl"
+        cassette = Cassette(path)
+        answers = iter([b"first", b"second"])
+        recorder = RecordReplayTransport(httpx.MockTransport(lambda request: httpx.Response(200, content=next(answers))),
+                                         cassette, "record")
+        with httpx.Client(transport=recorder) as client:
+            client.post(URL, json={"prompt": "same"})
+            client.post(URL, json={"prompt": "same"})
+        with httpx.Client(transport=RecordReplayTransport(offline(), Cassette(path), "replay", latency_scale=0)) as client:
+            assert [client.post(URL, json={"prompt": "same"}).text for _ in range(3)] == ["first", "second", "first"]
+
+    def test_latency_scale(self, tmp_path):
+        """Test that chunks are replayed at their recorded offsets times the scale."""
+        path = tmp_path / "cassette.jsonl"
+        entry = {"key": None, "method": "POST", "url": URL, "request": {"prompt": "hi"}, "status": 200,
+                 "headers": {}, "chunks": [[400.0, "YQ=="], [1000.0, "Yg=="]]}
+        entry["key"] = request_key("POST", URL, json.dumps({"prompt": "hi"}).encode())
+        path.write_text(json.dumps(entry) + "\n")
+        waits = []
+        transport = RecordReplayTransport(offline(), Cassette(path), "replay", latency_scale=0.5, sleep=waits.append)
+        with httpx.Client(transport=transport) as client:
+            assert client.post(URL, content=json.dumps({"prompt": "hi"})).text == "ab"
+        assert waits == pytest.approx([0.2, 0.5], abs=0.05)  # Offsets from the start of the call
+
+    def test_async_record_then_replay(self, tmp_path):
+        """Test the async transport, used for streamed answers."""
+        path = tmp_path / "cassette.jsonl"
+
+        async def run(transport):
+            async with httpx.AsyncClient(transport=transport) as client:
+                async with client.stream("POST", URL, json={"prompt": "hi"}) as response:
+                    return [chunk async for chunk in response.aiter_bytes()]
+
+        recorded = asyncio.run(run(AsyncRecordReplayTransport(upstream([]), Cassette(path), "record")))
+        replayed = asyncio.run(run(AsyncRecordReplayTransport(offline(), Cassette(path), "replay", latency_scale=0)))
+        assert b"".join(recorded) == b"".join(replayed) == b"echo: hi"
+
+
+class TestChatModelReplay:
+    """Test replaying through a real LangChain chat model and LLMClient."""
+
+    def test_llm_client_offline(self, tmp_path):
+        """Test that an answer recorded from the provider is replayed with the same text."""
+        from langchain_openai import ChatOpenAI
+        from backend.llm_client import LLMClient
+
+        path = tmp_path / "cassette.jsonl"
+
+        def client_for(transport):
+            http_client = httpx.Client(transport=transport)
+            llm = ChatOpenAI(model="gpt-test", temperature=0, api_key="test", base_url="https://api.example.com/v1",
+                             http_client=http_client, max_retries=0)
+            return LLMClient(llm, provider="openai", model="gpt-test")
+
+        provider = httpx.MockTransport(lambda request: httpx.Response(200, json=completion("Recorded answer")))
+        assert client_for(RecordReplayTransport(provider, Cassette(path), "record")).invoke("Question?") == "Recorded answer"
+        replay = client_for(RecordReplayTransport(offline(), Cassette(path), "replay", latency_scale=0))
+        assert replay.invoke("Question?") == "Recorded answer"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Tests for the Load Test Harness
+================================
+Tests the stub LLM, the request schedule and mix, and the report.
+"""
+
+import sys
+import time
+import asyncio
+import random
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+import pytest
+from tests.load_test import (
+    StubChatModel, StubProviderError, LoopLagMonitor, RequestFactory, schedule, parse_mix, summarize,
+)
+from backend.llm_client import LLMClient
+
+
+class TestStubChatModel:
+    """Test the stand-in LLM."""
+
+    def test_invoke_reports_usage(self):
+        """Test the fixed answer and token usage."""
+        model = StubChatModel(response="one two three", latency_ms=0, tokens_per_second=1000)
+        message = model.invoke("a prompt of some length")
+        assert message.content == "one two three"
+        assert message.usage_metadata["output_tokens"] == 3
+
+    def test_stream_through_llm_client(self):
+        """Test streaming tokens through the real client path."""
+        client = LLMClient(StubChatModel(response="one two three", latency_ms=0, tokens_per_second=1000),
+                           provider="stub", model="stub")
+
+        async def collect():
+            return [chunk async for chunk in client.astream("prompt")]
+
+        assert "".join(asyncio.run(collect())) == "one two three"
+
+    def test_error_rate(self):
+        """Test injected failures."""
+        model = StubChatModel(latency_ms=0, tokens_per_second=1000, error_rate=1.0)
+        with pytest.raises(StubProviderError):
+            model.invoke("prompt")
+
+
+class TestLoadShape:
+    """Test the schedule and request mix."""
+
+    def test_schedule_ramps_up(self):
+        """Test that the rate ramps up and then holds at the target."""
+        times = schedule(rps=10, duration=10, ramp_up=4)
+        assert times == sorted(times)
+        assert sum(1 for t in times if t >= 4) == pytest.approx(60, abs=1)
+        assert sum(1 for t in times if t < 2) < sum(1 for t in times if 2 <= t < 4)
+
+    def test_mix(self):
+        """Test endpoint weights and request shapes."""
+        with pytest.raises(ValueError):
+            parse_mix("chat=50,login=50")
+        factory = RequestFactory(parse_mix("chat=1,history_get=1"), ["Tell me about audits"], random.Random(1))
+        requests = [factory.next() for _ in range(200)]
+        assert {name for name, *_ in requests} == {"chat", "history_get"}
+        chat = next(request for request in requests if request[0] == "chat")
+        assert chat[1:3] == ("POST", "/api/chat") and chat[3]["message"]
+
+
+class TestReport:
+    """Test the summary and lag monitor."""
+
+    def test_summarize(self):
+        """Test per-endpoint stats, error rates and degraded chat answers."""
+        results = [
+            {"endpoint": "chat", "status": 200, "route": "rag", "latency_ms": 100.0},
+            {"endpoint": "chat", "status": 200, "route": "fallback:api_error", "latency_ms": 300.0},
+            {"endpoint": "onboard", "status": 500, "route": None, "latency_ms": 10.0},
+            {"endpoint": "onboard", "status": "ReadTimeout", "route": None, "latency_ms": 30000.0},
+        ]
+        summary = summarize(results, duration=2.0)
+        assert summary["overall"]["throughput_rps"] == 2.0
+        assert summary["endpoints"]["onboard"]["error_rate"] == 1.0
+        assert summary["endpoints"]["chat"]["p99_ms"] == 300.0
+        assert summary["chat_degraded_rate"] == 0.5
+
+    def test_lag_monitor(self):
+        """Test that a blocked event loop shows up as lag."""
+        monitor = LoopLagMonitor(interval=0.01)
+
+        async def block():
+            task = asyncio.create_task(monitor.run())
+            await asyncio.sleep(0.05)
+            time.sleep(0.1)  # Blocking call on the loop
+            await asyncio.sleep(0.05)
+            task.cancel()
+
+        asyncio.run(block())
+        assert monitor.report()["max_ms"] >= 80
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
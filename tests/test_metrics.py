@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Tests for Metrics
+==================
+Tests the Prometheus text rendering, the /metrics endpoint and the
+stage and LLM metrics recorded by the pipeline.
+"""
+
+import sys
+import json
+import asyncio
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.fake_chat_models import FakeListChatModel, GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from backend.metrics import (
+    MetricsRegistry, STAGE_SECONDS, CACHE_LOOKUPS, LLM_TOKENS, LLM_ERRORS, LLM_SECONDS, CONTENT_TYPE,
+)
+from backend.llm_client import LLMClient
+from backend.rerankers import LLMReranker
+from backend.rag import RAGEngine
+
+
+class FailingModel(FakeListChatModel):
+    def _call(self, *args, **kwargs):
+        raise ConnectionError("provider down")
+
+
+class TestRendering:
+    """Test the text exposition format."""
+
+    def test_counter_and_label_escaping(self):
+        """Test counter samples and escaped label values."""
+        registry = MetricsRegistry()
+        counter = registry.counter("demo_total", "Demo counter.", ("kind",))
+        counter.inc(kind='say "hi"\n')
+        counter.inc(2, kind="plain")
+        text = registry.render()
+        assert "# TYPE demo_total counter" in text
+        assert 'demo_total{kind="say \\"hi\\"\\n"} 1' in text
+        assert 'demo_total{kind="plain"} 2' in text
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test bucket counts, +Inf, sum and count."""
+        registry = MetricsRegistry()
+        histogram = registry.histogram("demo_seconds", "Demo histogram.", buckets=(0.1, 1))
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value)
+        lines = registry.render().splitlines()
+        assert 'demo_seconds_bucket{le="0.1"} 1' in lines
+        assert 'demo_seconds_bucket{le="1"} 2' in lines
+        assert 'demo_seconds_bucket{le="+Inf"} 3' in lines
+        assert "demo_seconds_sum 5.55" in lines
+        assert "demo_seconds_count 3" in lines
+
+    def test_label_names_are_enforced(self):
+        """Test that missing or unknown labels are rejected."""
+        counter = MetricsRegistry().counter("demo_total", "Demo counter.", ("kind",))
+        with pytest.raises(ValueError):
+            counter.inc(other="x")
+
+    def test_metrics_endpoint(self):
+        """Test that /metrics serves the registry in the Prometheus format."""
+        from backend.main import app
+
+        response = TestClient(app).get("/metrics")  # No lifespan needed
+        assert response.status_code == 200
+        assert response.headers["content-type"] == CONTENT_TYPE
+        assert "# TYPE rag_stage_duration_seconds histogram" in response.text
+
+
+class TestLLMMetrics:
+    """Test provider latency, token and error accounting."""
+
+    def test_tokens_and_latency(self):
+        """Test that reported usage is counted per direction."""
+        message = AIMessage(content="Answer.", usage_metadata={"input_tokens": 12, "output_tokens": 3, "total_tokens": 15})
+        client = LLMClient(GenericFakeChatModel(messages=iter([message])), provider="metrics-test", model="m1")
+        before = LLM_SECONDS.count(provider="metrics-test", model="m1")
+        assert client.invoke("prompt") == "Answer."
+        assert LLM_TOKENS.value(provider="metrics-test", model="m1", direction="input") == 12
+        assert LLM_TOKENS.value(provider="metrics-test", model="m1", direction="output") == 3
+        assert LLM_SECONDS.count(provider="metrics-test", model="m1") == before + 1
+
+    def test_errors_counted_by_type(self):
+        """Test that failed calls are counted by exception type."""
+        client = LLMClient(FailingModel(responses=["x"]), provider="metrics-fail", model="m1")
+        with pytest.raises(ConnectionError):
+            asyncio.run(client.ainvoke("prompt"))
+        assert LLM_ERRORS.value(provider="metrics-fail", error="ConnectionError") == 1
+
+
+class TestStageMetrics:
+    """Test that a RAG query records its stages."""
+
+    def test_query_observes_stages(self, tmp_path):
+        """Test retrieval legs, fusion, rerank, answer and cache lookups."""
+        chunks = [
+            {"id": f"c{i}", "source_url": f"https://example.com/{i}", "category": "faq",
+             "title": f"Page {i}", "content": f"Chunk {i} explains tax credits for business number {i}."}
+            for i in range(6)
+        ]
+        knowledge_file = tmp_path / "knowledge.json"
+        knowledge_file.write_text(json.dumps({"chunks": chunks, "metadata": {"generated_at": "test"}}))
+        engine = RAGEngine(knowledge_file, tmp_path / "index", dense_backend="numpy", sparse_backend="inverted")
+        engine.rerank_mode = "always"
+        engine.embeddings = DeterministicFakeEmbedding(size=16)
+        engine.answer_client = engine.rerank_client = LLMClient(
+            FakeListChatModel(responses=["Grounded answer."]), provider="fake", model="fake")
+        engine.reranker = LLMReranker(LLMClient(FakeListChatModel(responses=["1, 2"]), provider="fake", model="fake"))
+        engine.warm_up()
+        stages = ("retrieval", "dense_retrieval", "sparse_retrieval", "fusion", "rerank", "answer", "cache_lookup")
+        before = {stage: STAGE_SECONDS.count(stage=stage) for stage in stages}
+        misses = CACHE_LOOKUPS.value(cache="answer", result="miss")
+        try:
+            result = asyncio.run(engine.aanswer_query("How do tax credits work?"))
+        finally:
+            engine.shutdown()
+        assert result["route"] == "rag"
+        for stage in stages:
+            assert STAGE_SECONDS.count(stage=stage) == before[stage] + 1, stage
+        assert CACHE_LOOKUPS.value(cache="answer", result="miss") == misses + 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
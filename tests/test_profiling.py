@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Tests for Request Profiling
+============================
+Tests the admin-token gate, profile collection across threads and the
+profiled /api/chat path.
+"""
+
+import sys
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from backend import profiling
+from backend.profiling import RequestProfiler, profile_leg, profiling_requested, PROFILE_HEADER, PROFILE_ID_HEADER
+from backend.routers.chat import router
+from backend.embedding_batcher import MicroBatchingEmbeddings
+
+
+def leg_work():
+    return sum(i * i for i in range(1000))
+
+
+class ThreadRecordingEmbeddings:
+    """Fake embedding model recording which thread encoded."""
+
+    def __init__(self):
+        self.threads = []
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    def embed_documents(self, texts):
+        self.threads.append(threading.current_thread().name)
+        return [[float(len(text))] for text in texts]
+
+
+class StubRAGEngine:
+    """Stand-in for RAGEngine recording which path answered."""
+
+    def __init__(self):
+        self.paths = []
+
+    def answer_query(self, query: str, deadline=None):
+        self.paths.append("sync")
+        return {"response": "Answer.", "sources": [], "route": "rag"}
+
+    async def aanswer_query(self, query: str, deadline=None):
+        self.paths.append("async")
+        return {"response": "Answer.", "sources": [], "route": "rag"}
+
+
+@pytest.fixture
+def profiling_on(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(profiling, "PROFILING_TOKEN", "secret")
+    monkeypatch.setattr(profiling, "PROFILE_DIR", tmp_path / "profiles")
+    return tmp_path / "profiles"
+
+
+class TestGate:
+    """Test when a request is profiled."""
+
+    def test_off_by_default(self):
+        """Test that the header does nothing unless profiling is enabled."""
+        assert not profiling_requested({PROFILE_HEADER: ""})
+        assert not profiling_requested({PROFILE_HEADER: "secret"})
+
+    def test_token_must_match(self, profiling_on):
+        """Test the admin token check."""
+        assert profiling_requested({PROFILE_HEADER: "secret"})
+        assert not profiling_requested({PROFILE_HEADER: "guess"})
+        assert not profiling_requested({})
+
+
+class TestRequestProfiler:
+    """Test profile collection."""
+
+    def test_worker_threads_are_merged(self, tmp_path):
+        """Test that work fanned out with profile_leg lands in the same profile."""
+        profiler = RequestProfiler()
+
+        def request():
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                futures = [pool.submit(contextvars.copy_context().run, profile_leg, leg_work) for _ in range(2)]
+                return [future.result() for future in futures]
+
+        profiler.run(request)
+        assert len(profiler.profiles) == 3
+        path = profiler.save(tmp_path)
+        assert path.exists()
+        assert "leg_work" in (tmp_path / f"{profiler.profile_id}.txt").read_text()
+
+    def test_query_embedding_runs_on_profiled_thread(self):
+        """Test that a profiled request encodes its query itself instead of on the batcher's thread."""
+        model = ThreadRecordingEmbeddings()
+        embeddings = MicroBatchingEmbeddings(model)
+        profiler = RequestProfiler()
+
+        embeddings.embed_query("plain")
+        profiler.run(embeddings.embed_query, "profiled")
+        embeddings.close()
+        assert model.threads == ["embedding-batcher", threading.current_thread().name]
+        assert "embed_documents" in profiler.summary()
+
+    def test_leg_outside_a_profile_runs_plainly(self):
+        """Test that profile_leg is a plain call when nothing is being profiled."""
+        assert profile_leg(leg_work) == leg_work()
+
+
+class TestProfiledChat:
+    """Test the profiled /api/chat path."""
+
+    def test_profiled_request(self, profiling_on):
+        """Test that a profiled request is answered on the sync path and stored."""
+        engine = StubRAGEngine()
+        app = FastAPI()
+        app.include_router(router, prefix="/api")
+        app.state.rag_engine = engine
+        client = TestClient(app)
+        body = {"message": "How do tax credits work?", "session_id": "s1"}
+
+        plain = client.post("/api/chat", json=body)
+        profiled = client.post("/api/chat", json=body, headers={PROFILE_HEADER: "secret"})
+
+        assert PROFILE_ID_HEADER not in plain.headers
+        profile_id = profiled.headers[PROFILE_ID_HEADER]
+        assert profiled.json()["response"] == "Answer."
+        assert engine.paths == ["async", "sync"]
+        assert (profiling_on / f"{profile_id}.prof").exists()
+        assert "mask_pii" in (profiling_on / f"{profile_id}.txt").read_text()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Tests for Startup and Readiness
+================================
+Tests lazy imports, the background warm-up and the /api/ready probe.
+"""
+
+import sys
+import json
+import subprocess
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from backend.rag import RAGEngine, READINESS_COMPONENTS
+from backend.rerankers import LLMReranker
+from backend.llm_client import LLMClient
+
+PROJECT_ROOT = Path(__file__).parent.parent
+HEAVY_MODULES = [
+    "langchain_chroma", "langchain_huggingface", "langchain_groq",
+    "langchain_openai", "sentence_transformers", "langchain_classic",
+]
+
+
+def make_engine(tmp_path: Path, chunks: list[dict] | None) -> RAGEngine:
+    """Engine over a small knowledge file with fake models preloaded (no network, no torch)."""
+    knowledge_file = tmp_path / "knowledge.json"
+    if chunks is not None:
+        knowledge_file.write_text(json.dumps({"chunks": chunks, "metadata": {"generated_at": "test"}}))
+    engine = RAGEngine(knowledge_file, tmp_path / "index", dense_backend="numpy", sparse_backend="inverted")
+    client = LLMClient(FakeListChatModel(responses=["1"]), provider="fake", model="fake")
+    engine.answer_client = engine.rerank_client = client
+    engine.reranker = LLMReranker(client)
+    engine.embeddings = DeterministicFakeEmbedding(size=16)
+    return engine
+
+
+def make_chunks(n: int) -> list[dict]:
+    return [
+        {"id": f"c{i}", "source_url": f"https://example.com/{i}", "category": "faq",
+         "title": f"Page {i}", "content": f"Chunk {i} about tax credits and services"}
+        for i in range(n)
+    ]
+
+
+class TestLazyImports:
+    """Test that importing the app does not load model stacks."""
+
+    def test_heavy_stacks_not_imported(self):
+        """Test that backend.main imports without the model and vector store packages."""
+        code = (
+            "import sys, backend.main; "
+            f"print([m for m in {HEAVY_MODULES!r} if m in sys.modules])"
+        )
+        result = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_ROOT, capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
+        assert result.stdout.strip() == "[]"
+
+
+class TestWarmUp:
+    """Test the warm-up sequence and per-component status."""
+
+    def test_not_ready_before_warm_up(self, tmp_path):
+        """Test that a fresh engine reports every component pending."""
+        engine = make_engine(tmp_path, make_chunks(3))
+        status = engine.readiness()
+        assert status["ready"] is False
+        assert set(status["components"]) == set(READINESS_COMPONENTS)
+        engine.shutdown()
+
+    def test_warm_up_marks_ready(self, tmp_path):
+        """Test that warm-up loads indexes and runs the dummy query."""
+        engine = make_engine(tmp_path, make_chunks(5))
+        engine.warm_up()
+        status = engine.readiness()
+        assert status["ready"] is True
+        assert all(value == "ready" for value in status["components"].values())
+        assert status["warmup_seconds"] is not None
+        engine.shutdown()
+
+    def test_missing_knowledge_file(self, tmp_path):
+        """Test that a missing knowledge base is reported, not raised."""
+        engine = make_engine(tmp_path, None)
+        engine.warm_up()
+        status = engine.readiness()
+        assert status["ready"] is False
+        assert status["components"]["knowledge_base"].startswith("failed")
+        engine.shutdown()
+
+
+    def test_stops_when_shutting_down(self, tmp_path):
+        """Test that warm-up stops at its next stage once shutdown has begun, without reporting a failure."""
+        engine = make_engine(tmp_path, make_chunks(5))
+        engine.stopping.set()
+        engine.warm_up()
+        status = engine.readiness()
+        assert status["ready"] is False
+        assert status["components"]["dense_index"] == "pending"
+        assert not any(value.startswith("failed") for value in status["components"].values())
+        engine.shutdown()
+
+class TestReadyEndpoint:
+    """Test the /api/ready probe."""
+
+    def test_status_codes(self, tmp_path):
+        """Test 503 while warming up and 200 once ready, with /api/health always up."""
+        from backend.main import app
+
+        engine = make_engine(tmp_path, make_chunks(3))
+        app.state.rag_engine = engine
+        client = TestClient(app)  # No lifespan: the engine is driven by hand
+
+        response = client.get("/api/ready")
+        assert response.status_code == 503
+        assert response.json()["components"]["dense_index"] == "pending"
+        assert client.get("/api/health").status_code == 200
+
+        engine.warm_up()
+        response = client.get("/api/ready")
+        assert response.status_code == 200
+        assert response.json()["ready"] is True
+        engine.shutdown()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
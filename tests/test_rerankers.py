@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Tests for Rerankers
+====================
+Tests the LLM and cross-encoder rerankers without network or model downloads.
+"""
+
+import sys
+import asyncio
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from backend.llm_client import LLMClient
+from backend.rerankers import (
+    LLMReranker, CrossEncoderReranker, get_reranker, parse_rerank_response,
+    truncate_snippet, should_skip_rerank
+)
+from backend.rag import RAGEngine
+
+
+DOCS = [
+    Document(page_content="Our office hours are 9 to 5.", metadata={"id": "chunk_0"}),
+    Document(page_content="R&D tax credits offset income tax.", metadata={"id": "chunk_1"}),
+    Document(page_content="We help with payment processing.", metadata={"id": "chunk_2"}),
+]
+
+
+def fake_client(*responses: str) -> LLMClient:
+    return LLMClient(FakeListChatModel(responses=list(responses)), provider="fake", model="fake")
+
+
+def fused(*scores: float) -> list[Document]:
+    return [Document(page_content=f"chunk {i}", metadata={"id": f"chunk_{i}", "fusion_score": score})
+            for i, score in enumerate(scores)]
+
+
+class RecordingClient:
+    """LLM client stub that records prompts."""
+
+    def __init__(self, response: str):
+        self.response = response
+        self.prompts = []
+
+    def invoke(self, prompt: str, timeout: float | None = None) -> str:
+        self.prompts.append(prompt)
+        return self.response
+
+
+class KeywordCrossEncoder:
+    """Fake cross-encoder: scores a pair by shared words, records batch sizes."""
+
+    def __init__(self):
+        self.batches = []
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        self.batches.append(len(pairs))
+        return [len(set(q.lower().split()) & set(d.lower().split())) for q, d in pairs]
+
+
+class TestLLMReranker:
+    """Test the LLM reranker."""
+
+    def test_orders_by_llm_response(self):
+        """Test that the LLM's numbering is mapped back to documents."""
+        reranker = LLMReranker(fake_client("2, 3, 1"))
+        ranked = reranker.rerank("tax credits", DOCS)
+        assert [d.metadata["id"] for d in ranked] == ["chunk_1", "chunk_2", "chunk_0"]
+
+    def test_async_path(self):
+        """Test that arerank uses the same parsing."""
+        reranker = LLMReranker(fake_client("3, 1"))
+        ranked = asyncio.run(reranker.arerank("payments", DOCS))
+        assert [d.metadata["id"] for d in ranked] == ["chunk_2", "chunk_0"]
+
+    def test_ignores_out_of_range_and_text(self):
+        """Test that junk in the LLM output is skipped."""
+        ranked = parse_rerank_response("Sure: 9, 2, x, 1", DOCS)
+        assert [d.metadata["id"] for d in ranked] == ["chunk_1", "chunk_0"]
+
+
+class TestCrossEncoderReranker:
+    """Test the cross-encoder reranker."""
+
+    def test_orders_by_score_in_one_batch(self):
+        """Test that all pairs are scored in a single forward pass."""
+        model = KeywordCrossEncoder()
+        reranker = CrossEncoderReranker(model=model)
+        ranked = reranker.rerank("r&d tax credits", DOCS)
+
+        assert ranked[0].metadata["id"] == "chunk_1"
+        assert model.batches == [3]
+
+    def test_scores_attached_without_mutating_input(self):
+        """Test that scores go on copies, never on shared retrieved docs."""
+        reranker = CrossEncoderReranker(model=KeywordCrossEncoder())
+        ranked = reranker.rerank("payment processing", DOCS)
+
+        assert "rerank_score" in ranked[0].metadata
+        assert all("rerank_score" not in d.metadata for d in DOCS)
+
+    def test_async_path(self):
+        """Test that arerank runs the model off the event loop."""
+        reranker = CrossEncoderReranker(model=KeywordCrossEncoder())
+        ranked = asyncio.run(reranker.arerank("office hours", DOCS))
+        assert ranked[0].metadata["id"] == "chunk_0"
+
+    def test_empty_input(self):
+        """Test that no documents means no model call."""
+        model = KeywordCrossEncoder()
+        assert CrossEncoderReranker(model=model).rerank("anything", []) == []
+        assert model.batches == []
+
+
+class TestAdaptiveRerank:
+    """Test the rerank skip decision and snippet truncation."""
+
+    def test_decisive_margin_skips(self):
+        """Test that a top chunk far ahead of the runner-up skips reranking."""
+        skip, margin = should_skip_rerank(fused(0.0164, 0.0113, 0.0110), margin=0.25)
+        assert skip
+        assert margin == pytest.approx(0.311, abs=0.001)
+
+    def test_close_scores_rerank(self):
+        """Test that close fused scores still go to the reranker."""
+        assert should_skip_rerank(fused(0.0164, 0.0161, 0.0150), margin=0.25)[0] is False
+
+    def test_unscored_documents_rerank(self):
+        """Test that documents without fusion scores are always reranked."""
+        assert should_skip_rerank(DOCS) == (False, None)
+
+    def test_truncate_snippet(self):
+        """Test that snippets are cut on a word boundary."""
+        text = "alpha beta gamma delta epsilon"
+        assert truncate_snippet(text, 14) == "alpha beta..."
+        assert truncate_snippet(text, 0) == text
+        assert truncate_snippet(text, 100) == text
+
+    def test_llm_reranker_sends_snippets(self):
+        """Test that the rerank prompt only carries the leading snippet of each chunk."""
+        client = RecordingClient("1")
+        long_doc = Document(page_content="word " * 500, metadata={"id": "long"})
+        LLMReranker(client, snippet_chars=100).rerank("q", [long_doc, DOCS[0]])
+        assert len(client.prompts[0]) < 1500
+        assert DOCS[0].page_content in client.prompts[0]
+
+    def test_engine_logs_and_counts_decisions(self, tmp_path):
+        """Test that the engine skips or reranks based on the margin and counts each decision."""
+        engine = RAGEngine(tmp_path / "knowledge.json", tmp_path / "index")
+        engine.rerank_mode = "adaptive"
+        engine.reranker = LLMReranker(fake_client("2, 1, 3"))
+
+        decisive = fused(0.0164, 0.0113, 0.0110)
+        assert engine.rerank_documents("q", decisive) == decisive
+        close = fused(0.0164, 0.0161, 0.0150)
+        assert engine.rerank_documents("q", close)[0] is close[1]
+        assert engine.rerank_decisions == {"skipped": 1, "reranked": 1}
+
+        engine.rerank_mode = "always"
+        assert engine.rerank_documents("q", decisive)[0] is decisive[1]
+        engine.shutdown()
+
+    def test_engine_keeps_order_when_rerank_is_unusable(self, tmp_path):
+        """Test that a rerank reply that cannot be parsed leaves the retrieved order instead of no documents."""
+        engine = RAGEngine(tmp_path / "knowledge.json", tmp_path / "index")
+        engine.rerank_mode = "always"
+        engine.reranker = LLMReranker(fake_client("1 3 2"))
+        docs = fused(0.0164, 0.0161, 0.0150)
+        assert engine.rerank_documents("q", docs) == docs
+        assert asyncio.run(engine.arerank_documents("q", docs)) == docs
+        engine.shutdown()
+
+
+class TestRerankerFactory:
+    """Test reranker selection."""
+
+    def test_selects_backend(self):
+        """Test that the config switch picks the implementation."""
+        assert isinstance(get_reranker("cross_encoder"), CrossEncoderReranker)
+        assert isinstance(get_reranker("llm", llm_client=fake_client("1")), LLMReranker)
+
+    def test_unknown_backend(self):
+        """Test that a typo in the config fails loudly."""
+        with pytest.raises(ValueError):
+            get_reranker("bm25")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
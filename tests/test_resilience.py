@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Tests for Provider Resilience
+==============================
+Tests the circuit breaker, bulkhead and the fail-fast fallback path.
+"""
+
+import sys
+import time
+import asyncio
+import threading
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from backend.resilience import (
+    CircuitBreaker, Bulkhead, ProviderGuard, ProviderUnavailableError,
+    CLOSED, OPEN, HALF_OPEN,
+)
+from backend.llm_client import LLMClient
+from backend.fallback import FALLBACK_RESPONSES
+from backend.routers.chat import router
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class RateLimitError(Exception):
+    """Named like the provider SDKs' 429 errors."""
+
+
+class FailingChatModel(FakeListChatModel):
+    """Chat model that always raises."""
+    error: type = RuntimeError
+
+    def _call(self, *args, **kwargs):
+        raise self.error("provider down")
+
+
+def make_breaker(clock: FakeClock, **kwargs) -> CircuitBreaker:
+    settings = dict(window_size=10, min_calls=4, failure_rate_threshold=0.5,
+                    slow_call_seconds=1.0, slow_call_rate_threshold=0.75, open_seconds=30, clock=clock)
+    settings.update(kwargs)
+    return CircuitBreaker("test", **settings)
+
+
+class TestCircuitBreaker:
+    """Test breaker state transitions."""
+
+    def test_opens_on_failure_rate(self):
+        """Test that the breaker opens once the failure rate crosses the threshold."""
+        breaker = make_breaker(FakeClock())
+        for _ in range(2):
+            breaker.on_success(0.1)
+        breaker.on_failure(RuntimeError(), 0.1)
+        assert breaker.state == CLOSED
+        breaker.on_failure(RuntimeError(), 0.1)
+        assert breaker.state == OPEN
+        assert breaker.open_reason == "api_error"
+
+        with pytest.raises(ProviderUnavailableError) as excinfo:
+            breaker.before_call()
+        assert excinfo.value.fallback_type == "api_error"
+
+    def test_rate_limit_reason(self):
+        """Test that an outage made of 429s selects the rate_limited fallback."""
+        breaker = make_breaker(FakeClock())
+        for _ in range(4):
+            breaker.on_failure(RateLimitError(), 0.1)
+        assert breaker.state == OPEN
+        assert breaker.open_reason == "rate_limited"
+
+    def test_opens_on_slow_calls(self):
+        """Test that mostly slow successes also open the breaker."""
+        breaker = make_breaker(FakeClock())
+        for _ in range(4):
+            breaker.on_success(2.0)
+        assert breaker.state == OPEN
+
+    def test_min_calls(self):
+        """Test that a few early failures do not open the breaker."""
+        breaker = make_breaker(FakeClock())
+        for _ in range(3):
+            breaker.on_failure(RuntimeError(), 0.1)
+        assert breaker.state == CLOSED
+
+    def test_half_open_probe(self):
+        """Test that one probe is admitted after the cool-down and decides the state."""
+        clock = FakeClock()
+        breaker = make_breaker(clock)
+        for _ in range(4):
+            breaker.on_failure(RuntimeError(), 0.1)
+
+        clock.now = 31
+        breaker.check()  # Does not claim the probe
+        breaker.before_call()
+        assert breaker.state == HALF_OPEN
+        with pytest.raises(ProviderUnavailableError):
+            breaker.before_call()  # Only one probe at a time
+
+        breaker.on_failure(RuntimeError(), 0.1)
+        assert breaker.state == OPEN
+
+        clock.now = 62
+        breaker.before_call()
+        breaker.on_success(0.1)
+        assert breaker.state == CLOSED
+
+    def test_aborted_probe_frees_slot(self):
+        """Test that a cancelled probe lets the next call probe."""
+        clock = FakeClock()
+        breaker = make_breaker(clock)
+        for _ in range(4):
+            breaker.on_failure(RuntimeError(), 0.1)
+        clock.now = 31
+        breaker.before_call()
+        breaker.on_abort()
+        breaker.before_call()
+
+
+class TestBulkhead:
+    """Test the concurrency cap."""
+
+    def test_sync_cap(self):
+        """Test that calls beyond the cap are rejected after the wait budget."""
+        guard = ProviderGuard("test", breaker=make_breaker(FakeClock()), bulkhead=Bulkhead("test", 2, max_wait_ms=20))
+        started = threading.Barrier(3)
+        release = threading.Event()
+
+        def slow_call():
+            started.wait()
+            release.wait()
+
+        threads = [threading.Thread(target=guard.call, args=(slow_call,)) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        started.wait()
+
+        with pytest.raises(ProviderUnavailableError) as excinfo:
+            guard.call(lambda: None)
+        assert excinfo.value.fallback_type == "rate_limited"
+
+        release.set()
+        for thread in threads:
+            thread.join()
+        assert guard.call(lambda: "ok") == "ok"
+
+    def test_async_cap(self):
+        """Test that the async path is capped by the same bulkhead."""
+        guard = ProviderGuard("test", breaker=make_breaker(FakeClock()), bulkhead=Bulkhead("test", 2, max_wait_ms=20))
+        in_flight = []
+
+        async def call():
+            in_flight.append(1)
+            await asyncio.sleep(0.1)
+
+        async def run():
+            return await asyncio.gather(*(guard.acall(call) for _ in range(3)), return_exceptions=True)
+
+        results = asyncio.run(run())
+        assert len(in_flight) == 2
+        assert sum(isinstance(r, ProviderUnavailableError) for r in results) == 1
+
+
+    def test_release_wakes_async_waiter(self):
+        """Test that a slot freed by another thread is handed straight to a waiting coroutine."""
+        bulkhead = Bulkhead("test", 1, max_wait_ms=2000)
+        assert bulkhead.acquire()
+
+        async def run():
+            threading.Timer(0.05, bulkhead.release).start()
+            started = time.perf_counter()
+            acquired = await bulkhead.aacquire()
+            return acquired, time.perf_counter() - started
+
+        acquired, waited = asyncio.run(run())
+        assert acquired and waited < 0.5
+        bulkhead.release()
+        assert bulkhead._available == 1
+
+    def test_timed_out_waiters_do_not_leak_slots(self):
+        """Test that waiters that give up leave every slot usable."""
+        bulkhead = Bulkhead("test", 2, max_wait_ms=20)
+
+        async def run():
+            assert await bulkhead.aacquire() and await bulkhead.aacquire()
+            waiting = [asyncio.create_task(bulkhead.aacquire()) for _ in range(3)]
+            await asyncio.sleep(0)
+            waiting[0].cancel()
+            results = await asyncio.gather(*waiting[1:])
+            bulkhead.release()
+            bulkhead.release()
+            await asyncio.sleep(0)
+            return results
+
+        assert asyncio.run(run()) == [False, False]
+        assert bulkhead._available == 2 and not bulkhead._waiters
+
+class TestGuardedClient:
+    """Test the breaker through LLMClient."""
+
+    def test_fails_fast_once_open(self):
+        """Test that an open circuit rejects calls without reaching the model."""
+        llm = FailingChatModel(responses=["unused"])
+        guard = ProviderGuard("fake", breaker=make_breaker(FakeClock()))
+        client = LLMClient(llm, provider="fake", model="fake", guard=guard)
+
+        for i in range(4):
+            with pytest.raises(RuntimeError):
+                client.invoke(f"prompt {i}")
+        assert guard.breaker.state == OPEN
+
+        with pytest.raises(ProviderUnavailableError):
+            client.check_available()
+        with pytest.raises(ProviderUnavailableError):
+            asyncio.run(client.ainvoke("prompt"))
+
+    def test_stream_records_success(self):
+        """Test that a completed stream counts as a success and releases its slot."""
+        guard = ProviderGuard("fake", breaker=make_breaker(FakeClock()), bulkhead=Bulkhead("fake", 1, max_wait_ms=0))
+        client = LLMClient(FakeListChatModel(responses=["hello", "again"]), provider="fake", model="fake", guard=guard)
+
+        async def run():
+            first = "".join([chunk async for chunk in client.astream("p1")])
+            second = "".join([chunk async for chunk in client.astream("p2")])
+            return first, second
+
+        assert asyncio.run(run()) == ("hello", "again")
+        assert guard.breaker.state == CLOSED
+
+
+class TestChatFallback:
+    """Test that a rejected provider turns into the right canned response."""
+
+    class RejectingEngine:
+        def __init__(self, fallback_type: str):
+            self.fallback_type = fallback_type
+
+        async def aanswer_query(self, query: str, deadline=None):
+            raise ProviderUnavailableError("openai", self.fallback_type, "circuit open")
+
+    def test_rate_limited_response(self):
+        """Test that a rate-limited breaker selects the rate_limited fallback."""
+        app = FastAPI()
+        app.include_router(router, prefix="/api")
+        app.state.rag_engine = self.RejectingEngine("rate_limited")
+
+        start = time.perf_counter()
+        response = TestClient(app).post("/api/chat", json={"message": "Explain payroll rules", "session_id": "s1"})
+        assert time.perf_counter() - start < 1
+        body = response.json()
+        assert body["response"] == FALLBACK_RESPONSES["rate_limited"]
+        assert body["route"] == "fallback:rate_limited"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
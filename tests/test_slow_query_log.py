@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Tests for the Slow-Query Log
+=============================
+Tests the threshold, the JSONL records, rotation and what a traced RAG
+query records.
+"""
+
+import sys
+import json
+import asyncio
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from backend.slow_query_log import SlowQueryLog, RequestTrace, trace_request, current_trace, trace_stage
+from backend.llm_client import LLMClient
+from backend.rerankers import LLMReranker
+from backend.rag import RAGEngine
+
+
+def read_records(path: Path) -> list[dict]:
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+class TestSlowQueryLog:
+    """Test the background writer."""
+
+    def test_only_slow_requests_are_written(self, tmp_path):
+        """Test that traces under the threshold are discarded."""
+        log = SlowQueryLog(tmp_path / "slow.jsonl", threshold_ms=1000)
+        with log.trace("chat") as trace:
+            trace.query = "fast question"
+        log.submit(RequestTrace("chat", "slow question", started=0.0))  # Started long ago
+        log.close()
+        records = read_records(tmp_path / "slow.jsonl")
+        assert [record["query"] for record in records] == ["slow question"]
+        assert records[0]["total_ms"] >= 1000
+
+    def test_rotation(self, tmp_path):
+        """Test that the file rotates by size and keeps a bounded number of backups."""
+        path = tmp_path / "slow.jsonl"
+        log = SlowQueryLog(path, threshold_ms=0, max_bytes=300, backups=2)
+        for i in range(20):
+            log.submit(RequestTrace("chat", f"question {i}"))
+        log.close()
+        assert path.with_name("slow.jsonl.1").exists()
+        assert path.with_name("slow.jsonl.2").exists()
+        assert not path.with_name("slow.jsonl.3").exists()
+        assert log.written == 20
+
+    def test_disabled_is_a_no_op(self):
+        """Test that no trace is active without a log."""
+        with trace_request(None, "chat") as trace:
+            trace_stage("retrieval", 0.5)
+            assert trace is None
+            assert current_trace() is None
+
+
+class TestTracedQuery:
+    """Test what one traced RAG query records."""
+
+    def test_record_contents(self, tmp_path):
+        """Test stages (including retrieval legs on worker threads), chunk ids and LLM calls."""
+        chunks = [
+            {"id": f"c{i}", "source_url": f"https://example.com/{i}", "category": "faq",
+             "title": f"Page {i}", "content": f"Chunk {i} explains tax credits for business number {i}."}
+            for i in range(6)
+        ]
+        knowledge_file = tmp_path / "knowledge.json"
+        knowledge_file.write_text(json.dumps({"chunks": chunks, "metadata": {"generated_at": "test"}}))
+        engine = RAGEngine(knowledge_file, tmp_path / "index", dense_backend="numpy", sparse_backend="inverted")
+        engine.answer_cache = None
+        engine.rerank_mode = "always"
+        engine.embeddings = DeterministicFakeEmbedding(size=16)
+        engine.answer_client = engine.rerank_client = LLMClient(
+            FakeListChatModel(responses=["Grounded answer."]), provider="fake", model="fake")
+        engine.reranker = LLMReranker(LLMClient(FakeListChatModel(responses=["1, 2"]), provider="fake", model="fake"))
+        engine.warm_up()
+        log = SlowQueryLog(tmp_path / "slow.jsonl", threshold_ms=0)
+
+        async def traced_query():
+            with log.trace("chat") as trace:
+                result = await engine.aanswer_query("How do tax credits work?")
+                trace.query, trace.route = "How do tax credits work?", result["route"]
+
+        try:
+            asyncio.run(traced_query())
+        finally:
+            engine.shutdown()
+            log.close()
+        record = read_records(tmp_path / "slow.jsonl")[0]
+        assert record["route"] == "rag"
+        for stage in ("retrieval", "dense_retrieval", "sparse_retrieval", "fusion", "rerank", "answer"):
+            assert stage in record["stages_ms"], stage
+        assert {doc["id"] for doc in record["retrieved"]} <= {f"c{i}" for i in range(6)}
+        assert "fusion_score" in record["retrieved"][0]
+        assert record["rerank_decision"] == "reranked"
+        assert [doc["id"] for doc in record["reranked"]][:2] == [doc["id"] for doc in record["retrieved"]][:2]
+        assert len(record["llm_calls"]) == 2  # Rerank and answer
+        assert all(call["prompt_chars"] > 0 for call in record["llm_calls"])
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Tests for the Inverted-Index BM25
+==================================
+Tests that precomputed postings score exactly like textbook BM25.
+"""
+
+import sys
+import math
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+import pytest
+from langchain_core.documents import Document
+from backend.sparse_index import InvertedBM25Index, InvertedBM25Retriever, tokenize
+
+
+TEXTS = [
+    "R&D tax credits help businesses offset income tax.",
+    "Employee retention credit eligibility and filing.",
+    "Payment processing and fintech solutions for merchants.",
+    "Capital markets and investment banking services.",
+    "Tax planning, tax filing and compliance services.",
+]
+DOCS = [Document(page_content=text, metadata={"id": f"chunk_{i}"}) for i, text in enumerate(TEXTS)]
+
+
+def reference_bm25(query: str, k1: float = 1.5, b: float = 0.75) -> list[float]:
+    """Straightforward per-document BM25 for comparison."""
+    corpus = [tokenize(text) for text in TEXTS]
+    avg_length = sum(len(tokens) for tokens in corpus) / len(corpus)
+    scores = []
+    for tokens in corpus:
+        score = 0.0
+        for term in tokenize(query):
+            df = sum(1 for doc in corpus if term in doc)
+            if df == 0:
+                continue
+            idf = math.log((len(corpus) - df + 0.5) / (df + 0.5) + 1.0)
+            tf = tokens.count(term)
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(tokens) / avg_length))
+        scores.append(score)
+    return scores
+
+
+class TestInvertedBM25Index:
+    """Test scoring and ranking."""
+
+    @pytest.mark.parametrize("query", ["tax credits", "tax services", "payment fintech", "credit tax tax"])
+    def test_scores_match_reference(self, query):
+        """Test that summed postings equal per-document BM25."""
+        index = InvertedBM25Index.from_documents(DOCS)
+        expected = reference_bm25(query)
+
+        for doc, score in index.search(query, k=len(DOCS)):
+            assert score == pytest.approx(expected[int(doc.metadata["id"].split("_")[1])], rel=1e-5)
+
+    def test_ranking_order(self):
+        """Test that the densest match ranks first."""
+        index = InvertedBM25Index.from_documents(DOCS)
+        results = index.search("tax filing", k=2)
+        assert results[0][0].metadata["id"] == "chunk_4"
+
+    def test_only_matching_documents_returned(self):
+        """Test that documents without any query term are not candidates."""
+        index = InvertedBM25Index.from_documents(DOCS)
+        assert [doc.metadata["id"] for doc, _ in index.search("merchants", k=10)] == ["chunk_2"]
+
+    def test_unknown_terms(self):
+        """Test that a query with no indexed terms returns nothing."""
+        index = InvertedBM25Index.from_documents(DOCS)
+        assert index.search("blockchain", k=5) == []
+
+    def test_case_and_punctuation_insensitive(self):
+        """Test that tokenization ignores case and punctuation."""
+        assert tokenize("Tax-Credits, R&D!") == ["tax", "credits", "r", "d"]
+
+
+class TestPersistence:
+    """Test saving and loading the index."""
+
+    def test_round_trip(self, tmp_path):
+        """Test that a loaded index scores identically."""
+        index = InvertedBM25Index.from_documents(DOCS)
+        index.save(tmp_path / "bm25_index.npz", fingerprint="abc")
+        loaded = InvertedBM25Index.load(tmp_path / "bm25_index.npz", DOCS, fingerprint="abc")
+
+        assert loaded is not None
+        assert loaded.search("tax credits") == index.search("tax credits")
+
+    def test_stale_index_is_rejected(self, tmp_path):
+        """Test that changed documents, fingerprint or parameters force a rebuild."""
+        InvertedBM25Index.from_documents(DOCS).save(tmp_path / "bm25_index.npz", fingerprint="abc")
+
+        assert InvertedBM25Index.load(tmp_path / "bm25_index.npz", DOCS, fingerprint="xyz") is None
+        assert InvertedBM25Index.load(tmp_path / "bm25_index.npz", DOCS[:4], fingerprint="abc") is None
+        assert InvertedBM25Index.load(tmp_path / "bm25_index.npz", DOCS, fingerprint="abc", k1=1.2) is None
+
+
+class TestInvertedBM25Retriever:
+    """Test the LangChain retriever wrapper."""
+
+    def test_invoke(self):
+        """Test that the retriever returns scored copies capped at k."""
+        retriever = InvertedBM25Retriever(index=InvertedBM25Index.from_documents(DOCS), k=2)
+        results = retriever.invoke("tax services")
+
+        assert len(results) == 2
+        assert all("sparse_score" in doc.metadata for doc in results)
+        assert all("sparse_score" not in doc.metadata for doc in DOCS)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Tests for the User Store
+=========================
+Tests the SQLite and JSON user repositories, the migration from
+users.json, and the onboarding endpoint on top of them.
+"""
+
+import sys
+import json
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from backend.user_store import SqliteUserRepository, JsonUserRepository
+from backend.routers.onboard import router
+from backend.write_behind import WriteBehindWriter
+
+
+def make_user(i: int, email: str | None = None) -> dict:
+    return {"id": f"id{i}", "name": f"User {i}", "email": email or f"user{i}@example.com", "phone": "123-456-7890",
+            "session_id": f"s{i}", "created_at": f"2024-01-01T00:00:{i % 60:02d}", "source": "chat_onboarding"}
+
+
+@pytest.fixture(params=["sqlite", "json"])
+def repository(request, tmp_path):
+    if request.param == "sqlite":
+        repo = SqliteUserRepository(tmp_path / "users.sqlite", legacy_json=None)
+    else:
+        repo = JsonUserRepository(tmp_path / "users.json")
+    yield repo
+    repo.close()
+
+
+class TestRepositories:
+    """Test behavior shared by both backends."""
+
+    def test_add_if_absent(self, repository):
+        """Test that a second user with the same email is not created."""
+        user, created = repository.add_if_absent(make_user(1))
+        assert created and repository.get_by_email("user1@example.com")["name"] == "User 1"
+        stored, created = repository.add_if_absent(make_user(2, email="user1@example.com"))
+        assert not created and stored["id"] == "id1"
+        assert repository.count() == 1
+        assert repository.get_by_email("nobody@example.com") is None
+
+    def test_concurrent_onboarding(self, repository):
+        """Test that concurrent inserts lose no users and create each email once."""
+        users = [make_user(i, email=f"user{i % 25}@example.com") for i in range(100)]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            created = list(pool.map(lambda user: repository.add_if_absent(user)[1], users))
+        assert sum(created) == 25
+        assert repository.count() == 25
+
+
+class TestSqlite:
+    """Test SQLite-specific behavior."""
+
+    def test_migrates_json_once(self, tmp_path):
+        """Test that legacy users are imported on first open only."""
+        legacy = tmp_path / "users.json"
+        legacy.write_text(json.dumps([make_user(1), make_user(2)]))
+        repo = SqliteUserRepository(tmp_path / "users.sqlite", legacy_json=legacy)
+        assert repo.count() == 2
+        assert repo.get_by_email("user2@example.com")["id"] == "id2"
+        repo.close()
+
+        legacy.write_text(json.dumps([make_user(1), make_user(2), make_user(3)]))
+        repo = SqliteUserRepository(tmp_path / "users.sqlite", legacy_json=legacy)
+        assert repo.count() == 2  # Not imported again
+        repo.close()
+
+    def test_close_closes_every_thread(self, tmp_path):
+        """Test that close() closes the connections opened by worker threads too."""
+        repo = SqliteUserRepository(tmp_path / "users.sqlite", legacy_json=None)
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            connections = list(pool.map(lambda _: repo._connection(), range(4)))
+        repo.close()
+        for conn in connections:
+            with pytest.raises(sqlite3.ProgrammingError):
+                conn.execute("SELECT 1")
+
+    def test_email_lookup_uses_index(self, tmp_path):
+        """Test that the email lookup is an index search, not a table scan."""
+        repo = SqliteUserRepository(tmp_path / "users.sqlite", legacy_json=None)
+        plan = repo._connection().execute("EXPLAIN QUERY PLAN SELECT * FROM users WHERE email = ?", ("a",)).fetchall()
+        assert "idx_users_email" in " ".join(str(tuple(row)) for row in plan)
+        repo.close()
+
+
+class TestOnboardEndpoint:
+    """Test /onboard and /users with the repository behind a write-through writer."""
+
+    def test_onboard_and_list(self, tmp_path):
+        """Test a new user, a returning user and the sanitized list."""
+        app = FastAPI()
+        app.include_router(router, prefix="/api")
+        repository = SqliteUserRepository(tmp_path / "users.sqlite", legacy_json=None)
+        app.state.writer = WriteBehindWriter(repository, None, enabled=False)
+        client = TestClient(app)
+        body = {"name": "Jane Doe", "email": "Jane@Example.com", "phone": "123-456-7890", "session_id": "s1"}
+
+        first = client.post("/api/onboard", json=body).json()
+        again = client.post("/api/onboard", json=body).json()
+        assert first["user_id"] == again["user_id"]
+        assert "Welcome back, Jane Doe" in again["message"]
+        users = client.get("/api/users").json()
+        assert users["count"] == 1
+        assert users["users"][0]["email"] == "jan***@example.com"
+        repository.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
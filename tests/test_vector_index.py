@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Tests for the NumPy Vector Index
+=================================
+Tests exact top-k search, metadata filtering and persistence.
+"""
+
+import sys
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from backend.vector_index import NumpyVectorIndex, NumpyRetriever
+
+
+def make_docs(n: int) -> list[Document]:
+    categories = ["faq", "blog", "services/tax-credits"]
+    return [
+        Document(page_content=f"chunk {i}", metadata={"id": f"chunk_{i}", "category": categories[i % 3],
+                                                      "source_url": f"https://example.com/{i}", "title": f"T{i}"})
+        for i in range(n)
+    ]
+
+
+class AxisEmbeddings:
+    """Fake embedder: document i points along axis i, queries are parsed as an axis number."""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def embed_documents(self, texts):
+        return [np.eye(self.dim)[int(t.split()[-1])] * 3.0 for t in texts]
+
+    def embed_query(self, text):
+        return np.eye(self.dim)[int(text)]
+
+
+class TestNumpyVectorIndex:
+    """Test exact search on the index."""
+
+    def test_matches_brute_force(self):
+        """Test that argpartition top-k equals a full sort."""
+        rng = np.random.default_rng(0)
+        vectors = rng.normal(size=(200, 16))
+        index = NumpyVectorIndex(make_docs(200), vectors)
+        query = rng.normal(size=16)
+
+        results = index.search(query, k=10)
+        normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        expected = np.argsort(-(normalized @ (query / np.linalg.norm(query))))[:10]
+
+        assert [doc.metadata["id"] for doc, _ in results] == [f"chunk_{i}" for i in expected]
+        assert all(a >= b for (_, a), (_, b) in zip(results, results[1:]))
+
+    def test_matrix_is_normalized_float32(self):
+        """Test that embeddings are stored as one contiguous normalized float32 matrix."""
+        index = NumpyVectorIndex(make_docs(3), np.array([[3.0, 4.0], [1.0, 0.0], [0.0, 2.0]]))
+        assert index.matrix.dtype == np.float32
+        assert index.matrix.flags["C_CONTIGUOUS"]
+        assert np.allclose(np.linalg.norm(index.matrix, axis=1), 1.0)
+
+    def test_metadata_filter(self):
+        """Test that filters restrict results to matching documents."""
+        rng = np.random.default_rng(1)
+        index = NumpyVectorIndex(make_docs(30), rng.normal(size=(30, 8)))
+
+        results = index.search(rng.normal(size=8), k=5, filter={"category": "faq"})
+        assert len(results) == 5
+        assert all(doc.metadata["category"] == "faq" for doc, _ in results)
+
+        results = index.search(rng.normal(size=8), k=30, filter={"category": ["faq", "blog"]})
+        assert len(results) == 20
+
+    def test_filter_with_no_matches(self):
+        """Test that an unmatched filter returns nothing."""
+        index = NumpyVectorIndex(make_docs(5), np.eye(5))
+        assert index.search(np.ones(5), k=3, filter={"category": "careers"}) == []
+
+    def test_k_larger_than_index(self):
+        """Test that k is capped at the index size."""
+        index = NumpyVectorIndex(make_docs(3), np.eye(3))
+        assert len(index.search(np.ones(3), k=10)) == 3
+
+    def test_unknown_filter_field(self):
+        """Test that filtering on an unindexed field fails loudly."""
+        index = NumpyVectorIndex(make_docs(3), np.eye(3))
+        with pytest.raises(ValueError):
+            index.search(np.ones(3), filter={"author": "x"})
+
+
+class TestPersistence:
+    """Test saving and loading the index."""
+
+    def test_round_trip(self, tmp_path):
+        """Test that a saved index loads back for the same documents."""
+        docs = make_docs(4)
+        index = NumpyVectorIndex(docs, np.eye(4))
+        index.save(tmp_path / "numpy_index.npz", fingerprint="abc")
+
+        loaded = NumpyVectorIndex.load(tmp_path / "numpy_index.npz", docs, fingerprint="abc")
+        assert loaded is not None
+        assert np.array_equal(loaded.matrix, index.matrix)
+
+    def test_stale_index_is_rejected(self, tmp_path):
+        """Test that a fingerprint or document mismatch forces a rebuild."""
+        docs = make_docs(4)
+        NumpyVectorIndex(docs, np.eye(4)).save(tmp_path / "numpy_index.npz", fingerprint="abc")
+
+        assert NumpyVectorIndex.load(tmp_path / "numpy_index.npz", docs, fingerprint="def") is None
+        assert NumpyVectorIndex.load(tmp_path / "numpy_index.npz", docs[:3], fingerprint="abc") is None
+
+
+class TestNumpyRetriever:
+    """Test the LangChain retriever wrapper."""
+
+    def test_invoke_returns_scored_copies(self):
+        """Test that the retriever embeds the query and attaches dense scores."""
+        docs = make_docs(6)
+        embedder = AxisEmbeddings(6)
+        retriever = NumpyRetriever(index=NumpyVectorIndex.from_documents(docs, embedder), embeddings=embedder, k=2)
+
+        results = retriever.invoke("4")
+        assert results[0].metadata["id"] == "chunk_4"
+        assert results[0].metadata["dense_score"] == pytest.approx(1.0)
+        assert "dense_score" not in docs[4].metadata
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
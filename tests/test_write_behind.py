@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Tests for Write-Behind Persistence
+===================================
+Tests that history writes are acknowledged without waiting on disk,
+coalesced, flushed in batches, retried, bounded, and drained on close, and
+that onboarding is written through.
+"""
+
+import sys
+import time
+import asyncio
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+import pytest
+from backend.write_behind import WriteBehindWriter
+from backend.history_store import JsonChatHistoryStore
+from backend.user_store import JsonUserRepository
+
+
+class SlowHistory:
+    """In-memory history store with a fixed disk latency per write."""
+
+    def __init__(self, latency: float = 0.0, failures: int = 0):
+        self.sessions = {}
+        self.calls = []
+        self.latency = latency
+        self.failures = failures
+
+    def get(self, session_id):
+        return list(self.sessions.get(session_id, []))
+
+    def append(self, session_id, messages):
+        self._write("append", session_id, messages)
+        self.sessions.setdefault(session_id, []).extend(messages)
+
+    def replace(self, session_id, messages):
+        self._write("replace", session_id, messages)
+        self.sessions[session_id] = list(messages)
+
+    def _write(self, kind, session_id, messages):
+        time.sleep(self.latency)
+        if self.failures:
+            self.failures -= 1
+            raise OSError("disk full")
+        self.calls.append((kind, session_id, [m["content"] for m in messages]))
+
+
+def msgs(*contents):
+    return [{"role": "user", "content": content, "timestamp": "t"} for content in contents]
+
+
+class TestWriteBehind:
+    """Test buffering, coalescing and flushing."""
+
+    def test_ack_without_waiting_on_disk(self):
+        """Test that a write returns before the slow store is touched, and is readable meanwhile."""
+        history = SlowHistory(latency=0.5)
+        writer = WriteBehindWriter(None, history, flush_interval_ms=50)
+
+        async def run():
+            started = time.perf_counter()
+            await writer.append_history("s1", msgs("a"))
+            acked = time.perf_counter() - started
+            assert await writer.get_history("s1") == msgs("a")  # Visible before it is written
+            await writer.close()
+            return acked
+
+        assert asyncio.run(run()) < 0.05
+        assert history.sessions["s1"] == msgs("a")
+
+    def test_reads_do_not_wait_for_other_sessions(self):
+        """Test that a slow flush only holds up reads of the sessions it is writing."""
+        history = SlowHistory(latency=0.5)
+        history.sessions["old"] = msgs("kept")
+        writer = WriteBehindWriter(None, history, flush_interval_ms=10_000)
+
+        async def run():
+            await writer.append_history("s1", msgs("a"))
+            flush = asyncio.create_task(writer.flush())
+            await asyncio.sleep(0.05)
+            assert writer.inflight
+            started = time.perf_counter()
+            assert await writer.get_history("old") == msgs("kept")
+            other = time.perf_counter() - started
+            assert await writer.get_history("s1") == msgs("a")  # Waits for its batch, no duplicate
+            await flush
+            await writer.close()
+            return other
+
+        assert asyncio.run(run()) < 0.2
+
+    def test_coalesces_per_session(self):
+        """Test that pending appends merge and a replace supersedes earlier writes."""
+        history = SlowHistory()
+        writer = WriteBehindWriter(None, history, flush_interval_ms=10_000)
+
+        async def run():
+            await writer.append_history("s1", msgs("a"))
+            await writer.append_history("s1", msgs("b"))
+            await writer.replace_history("s2", msgs("x"))
+            await writer.append_history("s2", msgs("y"))
+            await writer.replace_history("s3", msgs("old"))
+            await writer.replace_history("s3", msgs("new"))
+            await writer.close()
+
+        asyncio.run(run())
+        assert sorted(history.calls) == [
+            ("append", "s1", ["a", "b"]), ("replace", "s2", ["x", "y"]), ("replace", "s3", ["new"]),
+        ]
+
+    def test_flushes_at_batch_size(self):
+        """Test that reaching the batch size flushes before the interval."""
+        history = SlowHistory()
+        writer = WriteBehindWriter(None, history, flush_interval_ms=10_000, batch_size=3)
+
+        async def run():
+            for i in range(3):
+                await writer.append_history(f"s{i}", msgs("a"))
+            await asyncio.sleep(0.1)
+            flushed = len(history.calls)
+            await writer.close()
+            return flushed
+
+        assert asyncio.run(run()) == 3
+
+    def test_retries_in_order(self):
+        """Test that a failed write is retried ahead of newer writes to the same session."""
+        history = SlowHistory(failures=1)
+        writer = WriteBehindWriter(None, history, flush_interval_ms=20)
+
+        async def run():
+            await writer.append_history("s1", msgs("a"))
+            await writer.flush()
+            await writer.append_history("s1", msgs("b"))
+            assert [m["content"] for m in await writer.get_history("s1")] == ["a", "b"]
+            await writer.close()
+
+        asyncio.run(run())
+        assert history.sessions["s1"] == msgs("a", "b")
+        assert writer.dropped == 0
+
+    def test_bounded_buffer(self):
+        """Test that writers wait for a flush once the buffer is full."""
+        history = SlowHistory(latency=0.05)
+        writer = WriteBehindWriter(None, history, flush_interval_ms=10_000, max_pending=2, batch_size=100)
+
+        async def run():
+            await asyncio.gather(*(writer.append_history(f"s{i}", msgs("a")) for i in range(5)))
+            assert len(writer.pending) <= 2
+            await writer.close()
+
+        asyncio.run(run())
+        assert len(history.sessions) == 5
+
+    def test_users_and_real_stores(self, tmp_path):
+        """Test write-through onboarding dedup and draining history into the file-backed stores."""
+        users = JsonUserRepository(tmp_path / "users.json")
+        history = JsonChatHistoryStore(tmp_path / "history.json")
+        writer = WriteBehindWriter(users, history, flush_interval_ms=10_000)
+        user = {"id": "u1", "name": "Jane", "email": "jane@example.com"}
+
+        async def run():
+            assert (await writer.add_user(user))[1]
+            assert users.get_by_email("jane@example.com") is not None  # Written before the ack
+            assert not (await writer.add_user(dict(user, name="Other")))[1]
+            assert len(await writer.list_users()) == 1
+            await writer.append_history("s1", msgs("a"))
+            await writer.close()
+
+        asyncio.run(run())
+        assert users.get_by_email("jane@example.com")["name"] == "Jane"
+        assert history.get("s1") == msgs("a")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])